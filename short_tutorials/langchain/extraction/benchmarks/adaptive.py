@@ -0,0 +1,153 @@
+"""
+Fixed retry strategies against the adaptive one (pipeline/adaptive.py) on a simulated model.
+
+The simulated model breaks a share of the string fields of its first TranscriptSummary answer (a few
+fields for most runs, a large share for --large-share of them), takes --seconds-per-token for every
+token it emits, gets each JSONPatch operation right with --patch-accuracy (one wrong operation and the
+patch is rejected) and regenerates a valid call with --regen-accuracy. Every strategy sees the same
+sequence of runs; the adaptive rows reuse one policy, so it learns as the runs go.
+
+    python3 -m benchmarks.adaptive
+    python3 -m benchmarks.adaptive --runs 300 --large-share 0.5 --json
+"""
+from typing import Any, List, Optional
+import argparse
+import json
+import random
+import time
+
+from langchain_core.messages import (AIMessage, AnyMessage, ToolCall)
+from langchain_core.outputs import (ChatGeneration, ChatResult)
+from pydantic import PrivateAttr, ValidationError
+
+from benchmarks.common import report
+from benchmarks.fixtures import transcript_summary
+from extractor import TranscriptSummary
+from pipeline.adaptive import AdaptivePolicy, _generated, bind as bind_with_adaptive_retry
+from pipeline.patched import PatchAggregator, PatchFunctionParameters, bind as bind_with_patch_retry
+from pipeline.repair import LocalRepair, get_path, set_path
+from pipeline.retry import bind as bind_with_retry
+from pipeline.schema import pointer
+from utils.fake_llm import ScriptedChatModel
+
+
+def _string_paths(value: Any, path: tuple = ()) -> List[tuple]:
+    if isinstance(value, dict):
+        return [p for k, v in value.items() for p in _string_paths(v, path + (k,))]
+    if isinstance(value, list):
+        return [p for i, v in enumerate(value) for p in _string_paths(v, path + (i,))]
+    return [path] if isinstance(value, str) else []
+
+
+class SimulatedChatModel(ScriptedChatModel):
+    """ScriptedChatModel whose answers depend on the bound tool: first answer, regeneration or patch."""
+
+    valid: dict
+    seconds_per_token: float = 0.0001
+    patch_accuracy: float = 0.97
+    regen_accuracy: float = 0.85
+    large_share: float = 0.3
+    seed: int = 0
+    script: List[Any] = []
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    def _broken(self, large: bool) -> dict:
+        args = json.loads(json.dumps(self.valid))
+        paths = _string_paths(args)
+        count = self._rng.randint(len(paths) // 3, len(paths) * 2 // 3) if large else self._rng.randint(1, 3)
+        for path in self._rng.sample(paths, count):
+            set_path(args, path, {"unexpected": True})
+        return args
+
+    def _patches(self, messages: List[AnyMessage]) -> tuple:
+        current = PatchAggregator([TranscriptSummary])(_generated(messages)).tool_calls[-1]
+        try:
+            TranscriptSummary.model_validate(current["args"])
+            errors = []
+        except ValidationError as e:
+            errors = e.errors()
+        patches = []
+        for error in errors:
+            loc = tuple(error["loc"])
+            value = get_path(self.valid, loc)
+            if self._rng.random() > self.patch_accuracy:
+                loc = loc[:-1] + ("no_such_field",)
+            patches.append({"op": "replace", "path": pointer(loc), "value": value})
+        return current["id"], patches
+
+    def _generate(self, messages: List[AnyMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        with self._lock:
+            n = self._calls
+            self._calls += 1
+        tools = [t["function"]["name"] for t in kwargs.get("tools", [])]
+        if PatchFunctionParameters.__name__ in tools:
+            target, patches = self._patches(messages)
+            name = PatchFunctionParameters.__name__
+            args = {"tool_call_id": target, "reasoning": "Replace the fields that don't match the schema.", "patches": patches}
+        elif any(m.type == "ai" for m in messages):
+            name, args = "TranscriptSummary", self.valid if self._rng.random() < self.regen_accuracy else self._broken(False)
+        else:
+            name, args = "TranscriptSummary", self._broken(self._rng.random() < self.large_share)
+        tokens = len(json.dumps(args)) // 4
+        time.sleep(tokens * self.seconds_per_token)
+        message = AIMessage(
+            content="",
+            tool_calls=[ToolCall(name=name, args=json.loads(json.dumps(args)), id=f"call_{n}")],
+            usage_metadata={"input_tokens": 0, "output_tokens": tokens, "total_tokens": tokens},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def bench(args: argparse.Namespace) -> List[dict]:
+    valid = transcript_summary(participants=4, moments=args.moments)
+    policy = AdaptivePolicy([TranscriptSummary], explore=args.explore, seed=0)
+    strategies = {
+        "retry (regenerate)": bind_with_retry,
+        "patched (JSONPatch)": bind_with_patch_retry,
+        "adaptive": lambda llm, **kw: bind_with_adaptive_retry(llm, policy=policy, **kw),
+    }
+    rows = []
+    for name, bind in strategies.items():
+        llm = SimulatedChatModel(
+            valid=valid, seconds_per_token=args.seconds_per_token, patch_accuracy=args.patch_accuracy,
+            regen_accuracy=args.regen_accuracy, large_share=args.large_share,
+        )
+        graph = bind(llm, tools=[TranscriptSummary], repair=LocalRepair([TranscriptSummary]), max_attempts=args.max_attempts)
+        ok, start = 0, time.perf_counter()
+        for _ in range(args.runs):
+            try:
+                graph.invoke([("user", "Summarize the call.")])
+                ok += 1
+            except ValueError:
+                pass
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "strategy": name, "runs": args.runs, "success_rate": ok / args.runs,
+            "llm_calls_per_run": llm.calls / args.runs, "ms_per_run": elapsed / args.runs * 1e3,
+        })
+    rows[-1]["decisions"] = " ".join(f"{k}={v}" for k, v in sorted(policy.stats["decisions"].items()))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--moments", type=int, default=4, help="Key moments of each kind in the answer.")
+    parser.add_argument("--large-share", type=float, default=0.3, help="Share of runs with a mostly broken first answer.")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0001)
+    parser.add_argument("--patch-accuracy", type=float, default=0.97, help="Chance each patch operation is right.")
+    parser.add_argument("--regen-accuracy", type=float, default=0.85, help="Chance a regeneration is valid.")
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--explore", type=float, default=0.05, help="Share of random decisions of the adaptive policy.")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    report(f"retry strategies on a simulated model ({args.runs} runs, {args.large_share:.0%} mostly broken)",
+           bench(args), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cost of durable checkpoints (pipeline/checkpoint.py) on the validation graph.
+
+Runs the JSONPatch graph with a scripted retry (invalid first answer + patch) without a checkpointer,
+with LangGraph's in-memory saver, and with the SQLite checkpointer (queued / batched commits), every
+run under its own job id. Add --latency to see the overhead next to a modelled API call.
+
+    python3 -m benchmarks.checkpoint
+    python3 -m benchmarks.checkpoint --iterations 500 --tool Respond --json
+"""
+from typing import List, Optional
+import argparse
+import itertools
+import os
+import tempfile
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from benchmarks.common import report, summarize, timings
+from benchmarks.fixtures import script
+from extractor import TranscriptSummary
+from pipeline.checkpoint import SqliteCheckpointer, job_config
+from pipeline.patched import bind as bind_with_patch_retry
+from pipeline.retry import Respond
+from utils.fake_llm import ScriptedChatModel
+
+TOOLS = {"Respond": Respond, "TranscriptSummary": TranscriptSummary}
+
+
+def bench(tool: str, iterations: int, latency: float, tmp: str) -> List[dict]:
+    savers = {
+        "none": None,
+        "memory": MemorySaver(),
+        "sqlite": SqliteCheckpointer(os.path.join(tmp, f"{tool}.sqlite")),
+    }
+    rows = []
+    for name, saver in savers.items():
+        llm = ScriptedChatModel(script=script(tool, "patched", retry=True), latency=latency)
+        graph = bind_with_patch_retry(llm, tools=[TOOLS[tool]], checkpointer=saver)
+        jobs = itertools.count()
+        messages = [("user", "Summarize the call.")]
+        samples = timings(lambda: graph.invoke(messages, job_config(f"job-{next(jobs)}")), repeat=iterations)
+        row = {"tool": tool, "checkpointer": name, **summarize(samples), "runs_per_s": len(samples) / sum(samples)}
+        if isinstance(saver, SqliteCheckpointer):
+            saver.flush()
+            stats = saver.stats
+            row.update({
+                "checkpoints": stats["checkpoints"],
+                "commits": stats["commits"],
+                "bytes_per_checkpoint": stats["bytes"] / max(1, stats["checkpoints"]),
+            })
+            saver.close()
+        rows.append(row)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each scripted LLM call sleeps.")
+    parser.add_argument("--tool", choices=list(TOOLS), action="append")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [row for tool in args.tool or TOOLS for row in bench(tool, args.iterations, args.latency, tmp)]
+    report(f"checkpointed retry runs ({args.iterations} jobs, latency={args.latency}s)", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
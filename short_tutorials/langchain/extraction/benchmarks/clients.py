@@ -0,0 +1,155 @@
+"""
+Connection reuse benchmark: a ChatOpenAI per call vs the shared client registry (utils/clients.py).
+
+Runs a local OpenAI-compatible stub server (HTTP/1.1 keep-alive) that answers every chat completion
+with a canned Respond tool call and counts the TCP connections it accepts. --handshake-ms adds a
+delay to every new connection to stand in for the TCP + TLS setup of the real API.
+
+    python3 -m benchmarks.clients
+    python3 -m benchmarks.clients --calls 200 --handshake-ms 40 --concurrency 16 --json
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from langchain_openai import ChatOpenAI
+
+from benchmarks.common import report, summarize
+from utils.clients import ClientRegistry
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "tool_calls",
+        "message": {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_stub",
+                "type": "function",
+                "function": {"name": "Respond", "arguments": json.dumps({"reason": "stub", "answer": "llama"})},
+            }],
+        },
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handshake_ms: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.handshake = handshake_ms / 1000
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def get_request(self):
+        request = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return request
+
+    def process_request_thread(self, request, client_address):
+        # the "handshake" delays the first response on a new connection, like TLS would
+        time.sleep(self.handshake)
+        super().process_request_thread(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, Nagle + delayed ACKs would add ~40ms to each response
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+MESSAGES = [("user", "Say something about llamas.")]
+
+
+def _sync_run(server: StubServer, calls: int, model: Callable[[], ChatOpenAI]) -> dict:
+    before, samples = server.connections, []
+    for _ in range(calls):
+        start = time.perf_counter()
+        model().invoke(MESSAGES)
+        samples.append(time.perf_counter() - start)
+    return {"connections": server.connections - before, **summarize(samples)}
+
+
+async def _async_run(server: StubServer, calls: int, concurrency: int, model: Callable[[], ChatOpenAI]) -> dict:
+    before, samples = server.connections, []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await model().ainvoke(MESSAGES)
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    return {"connections": server.connections - before, **summarize(samples), "calls_per_s": calls / elapsed}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=20.0, help="Delay per new connection.")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    server = StubServer(args.handshake_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings = {"base_url": server.base_url, "api_key": "stub", "temperature": 0, "max_retries": 0}
+    registry = ClientRegistry()
+
+    def per_call() -> ChatOpenAI:
+        return ChatOpenAI(model="gpt-4o", **settings)
+
+    def shared() -> ChatOpenAI:
+        return registry.chat_model("gpt-4o", **settings)
+
+    rows = []
+    for name, factory in (("model per call", per_call), ("client registry", shared)):
+        factory().invoke(MESSAGES)  # import / first-call costs stay out of the numbers
+        rows.append({"mode": "sync", "clients": name, "calls": args.calls, **_sync_run(server, args.calls, factory)})
+
+    async def run_async():
+        for name, factory in (("model per call", per_call), ("client registry", shared)):
+            await factory().ainvoke(MESSAGES)
+            result = await _async_run(server, args.calls, args.concurrency, factory)
+            rows.append({"mode": f"async x{args.concurrency}", "clients": name, "calls": args.calls, **result})
+        await registry.aclose()
+
+    asyncio.run(run_async())
+    registry.close()
+    server.shutdown()
+    report(f"chat completions against a local stub (handshake={args.handshake_ms}ms)", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from typing import (Callable, Dict, List, Sequence)
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+
+
+def timings(fn: Callable[[], object], repeat: int, warmup: int = 3) -> List[float]:
+    """Wall time in seconds of `repeat` calls to `fn`, after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Median / p95 / mean of a list of second timings, in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "median_ms": statistics.median(ordered) * 1e3,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+        "mean_ms": statistics.fmean(ordered) * 1e3,
+    }
+
+
+def memory_growth(fn: Callable[[], object], repeat: int, warmup: int = 10) -> Dict[str, float]:
+    """Net traced memory left behind by `repeat` calls to `fn` (after warmup and a gc), and the peak."""
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(repeat):
+            fn()
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"growth_kb": (after - before) / 1024, "growth_per_call_b": (after - before) / repeat, "peak_kb": peak / 1024}
+
+
+def report(title: str, rows: List[Dict[str, object]], as_json: bool = False) -> None:
+    """Print benchmark rows as an aligned table (or JSON lines, for diffing between runs)."""
+    if as_json:
+        for row in rows:
+            print(json.dumps({"benchmark": title, **row}))
+        return
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    cells = [[_fmt(row.get(c, "")) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print(f"\n{title}")
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def _fmt(value: object) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}" if abs(value) < 1000 else f"{value:.0f}"
+    return str(value)
@@ -0,0 +1,91 @@
+"""
+Canned tool calls for the offline benchmarks: a valid first answer, an invalid one, and the
+JSONPatch that fixes it, for both the Respond and the TranscriptSummary tools.
+"""
+from typing import Dict, List
+
+from utils.fake_llm import patch_last_call
+
+
+def _output(content: str) -> dict:
+    return {"sources": f"Pete: ... {content} ...", "content": content}
+
+
+def _moment(quote: str) -> dict:
+    return {"quote": quote, "description": f"They discuss: {quote}", "expressed_preference": _output("Kendrick")}
+
+
+def _member(name: str, age: int) -> dict:
+    return {
+        "name": _output(name),
+        "role": "host",
+        "age": age,
+        "background_details": [
+            {"factoid": _output("follows the beef closely"), "professions": ["podcaster"], "why": "Sets the tone."},
+        ],
+    }
+
+
+def transcript_summary(participants: int = 3, moments: int = 2) -> dict:
+    """A valid TranscriptSummary call, roughly the size gpt-4o produces for the demo transcript."""
+    return {
+        "metadata": {"title": "Drake vs Kendrick", "location": _output("a video call"), "duration": "15 minutes"},
+        "participants": [_member(name, 30 + i) for i, name in enumerate(["Pete", "Xu", "Laura", "Sam"][:participants])],
+        "key_moments": [{
+            "topic": "The beef",
+            "happy_moments": [_moment(f"happy {i}") for i in range(moments)],
+            "tense_moments": [_moment(f"tense {i}") for i in range(moments)],
+            "sad_moments": [_moment(f"sad {i}") for i in range(moments)],
+            "background_info": [{"factoid": _output("Control verse"), "professions": ["rapper"], "why": "It started it."}],
+            "moments_summary": "Fans took sides.",
+        }],
+        "insightful_quotes": [{
+            "quote": _output("They've always been a thing"),
+            "speaker": "Xu",
+            "analysis": "Beefs push artists to step up their game.",
+        }],
+        "overall_summary": "Three friends break down the Drake and Kendrick beef.",
+        "next_steps": ["Listen to the new diss track."],
+        "other_stuff": [],
+    }
+
+
+def invalid_transcript_summary() -> dict:
+    """The typical long-output failure: the model stops before the last required fields."""
+    args = transcript_summary()
+    del args["overall_summary"]
+    del args["next_steps"]
+    return args
+
+
+TRANSCRIPT_SUMMARY_PATCHES = [
+    {"op": "add", "path": "/overall_summary", "value": "Three friends break down the Drake and Kendrick beef."},
+    {"op": "add", "path": "/next_steps", "value": ["Listen to the new diss track."]},
+]
+
+RESPOND_VALID = {"reason": "The user asked a question.", "answer": "Llama, llama, ask your llama! The answer is 42."}
+RESPOND_INVALID = {"reason": "The user asked a question.", "answer": "The answer is 42."}
+RESPOND_PATCHES = [{"op": "replace", "path": "/answer", "value": RESPOND_VALID["answer"]}]
+
+# tool -> valid answer, invalid first answer, JSONPatch ops that fix the invalid one
+SCENARIOS: Dict[str, dict] = {
+    "Respond": {
+        "valid": RESPOND_VALID,
+        "invalid": RESPOND_INVALID,
+        "patches": RESPOND_PATCHES,
+    },
+    "TranscriptSummary": {
+        "valid": transcript_summary(),
+        "invalid": invalid_transcript_summary(),
+        "patches": TRANSCRIPT_SUMMARY_PATCHES,
+    },
+}
+
+
+def script(tool: str, strategy: str, retry: bool) -> List:
+    """Turns for one graph run: the valid answer, or the invalid one followed by the strategy's fix."""
+    scenario = SCENARIOS[tool]
+    if not retry:
+        return [(tool, scenario["valid"])]
+    fix = patch_last_call(scenario["patches"]) if strategy == "patched" else (tool, scenario["valid"])
+    return [(tool, scenario["invalid"]), fix]
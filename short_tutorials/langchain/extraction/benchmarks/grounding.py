@@ -0,0 +1,105 @@
+"""
+Benchmark of the quote-grounding index (utils/grounding.py) on large synthetic transcripts.
+
+Builds a transcript of --megabytes from the demo transcript's turns (shuffled, deterministic), then
+looks up verbatim spans, lightly paraphrased spans and invented quotes, next to the naive
+"normalized quote in normalized transcript" scan the index replaces.
+
+    python3 -m benchmarks.grounding
+    python3 -m benchmarks.grounding --megabytes 8 --quotes 2000 --json
+"""
+from typing import List, Optional
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import report, summarize
+from utils.grounding import QuoteIndex, tokens
+from utils.transcript import format_turns, transcript
+
+
+def synthetic_transcript(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = sorted({w for _, text in transcript for w in text.split()})
+    speakers = sorted({speaker for speaker, _ in transcript})
+    turns, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        # mix real turns with new random ones so the n-grams aren't all repeats
+        if rng.random() < 0.3:
+            turn = rng.choice(transcript)
+        else:
+            turn = (rng.choice(speakers), " ".join(rng.choice(words) for _ in range(rng.randint(8, 40))))
+        turns.append(turn)
+        size += len(turn[0]) + len(turn[1]) + 3
+    return format_turns(turns)
+
+
+def quotes(text: str, count: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    words = text.split()
+    vocabulary = sorted(set(words))[:2000]
+    verbatim, paraphrased, invented = [], [], []
+    for _ in range(count):
+        start = rng.randrange(len(words) - 30)
+        span = words[start:start + rng.randint(8, 25)]
+        verbatim.append(" ".join(span))
+        changed = list(span)
+        changed[rng.randrange(len(changed))] = "definitely"
+        paraphrased.append(" ".join(changed))
+        invented.append(" ".join(rng.choice(vocabulary) for _ in range(len(span))))
+    return {"verbatim": verbatim, "paraphrased": paraphrased, "invented": invented}
+
+
+def bench(megabytes: float, count: int, threshold: float) -> List[dict]:
+    text = synthetic_transcript(megabytes)
+    start = time.perf_counter()
+    index = QuoteIndex(text)
+    build_s = time.perf_counter() - start
+    # second build under tracemalloc, which would skew the timing above
+    tracemalloc.start()
+    QuoteIndex(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    normalized = " " + " ".join(tokens(text)) + " "
+
+    rows = []
+    for kind, batch in quotes(text, count).items():
+        samples, accepted = [], 0
+        for quote in batch:
+            start = time.perf_counter()
+            accepted += not index.ungrounded(quote, threshold)
+            samples.append(time.perf_counter() - start)
+        naive = []
+        for quote in batch[:max(1, count // 10)]:
+            start = time.perf_counter()
+            _ = (" " + " ".join(tokens(quote)) + " ") in normalized
+            naive.append(time.perf_counter() - start)
+        rows.append({
+            "quotes": kind,
+            "text_mb": len(text) / 1024 / 1024,
+            "words": len(index),
+            "build_s": build_s,
+            "index_mb": peak / 1024 / 1024,
+            "lookup_us": summarize(samples)["median_ms"] * 1e3,
+            "lookup_p95_us": summarize(samples)["p95_ms"] * 1e3,
+            "accepted": accepted / len(batch),
+            "naive_scan_us": summarize(naive)["median_ms"] * 1e3,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=float, action="append", help="Transcript size(s). Default: 1 and 4.")
+    parser.add_argument("--quotes", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    rows = [row for mb in args.megabytes or [1, 4] for row in bench(mb, args.quotes, args.threshold)]
+    report(f"quote grounding ({args.quotes} quotes per kind, threshold={args.threshold})", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
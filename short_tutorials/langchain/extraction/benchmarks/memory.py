@@ -0,0 +1,110 @@
+"""
+Per-turn cost of a long run_1 chat session: the whole history on every turn vs ConversationMemory (utils/memory.py).
+
+Both sessions go through the same validation graph (pipeline/retry.py, Respond tool) with a
+ScriptedChatModel, so the numbers are the prompt formatting + graph cost of the history. --latency
+models a fixed API round trip, --ms-per-1k-tokens the prefill time that grows with the prompt. The
+memory's summarizer is scripted too and pays the same latency model for its own prompt.
+
+    python3 -m benchmarks.memory
+    python3 -m benchmarks.memory --turns 500 --keep-turns 12 --ms-per-1k-tokens 20 --json
+"""
+from typing import List, Optional, Sequence
+import argparse
+import random
+import time
+
+from langchain_core.messages import AIMessage, AnyMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from benchmarks.common import report, summarize
+from pipeline.retry import Respond, bind as bind_with_retry
+from utils.fake_llm import ScriptedChatModel
+from utils.memory import ConversationMemory
+from utils.tokens import count_tokens
+from utils.transcript import transcript
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Respond directly by calling the Respond function."),
+    ("placeholder", "{messages}"),
+])
+
+
+def _prompt_tokens(messages: Sequence[AnyMessage]) -> int:
+    return sum(count_tokens(str(m.content)) for m in messages)
+
+
+def _prefill(ms_per_1k_tokens: float, messages: Sequence[AnyMessage]) -> None:
+    if ms_per_1k_tokens:
+        time.sleep(_prompt_tokens(messages) / 1000 * ms_per_1k_tokens / 1000)
+
+
+def session(turns: int, memory: Optional[ConversationMemory], latency: float, ms_per_1k_tokens: float) -> dict:
+    rng = random.Random(0)
+
+    def answer(messages: Sequence[AnyMessage]):
+        _prefill(ms_per_1k_tokens, messages)
+        return "Respond", {"reason": "Scripted.", "answer": f"Llamas again, {rng.choice(transcript)[1]}"}
+
+    llm = ScriptedChatModel(script=[answer], latency=latency)
+    chain = PROMPT | bind_with_retry(llm, tools=[Respond])
+    history: List[tuple] = []
+    samples, tokens = [], []
+    for turn in range(turns):
+        question = f"({turn}) {rng.choice(transcript)[1]}"
+        start = time.perf_counter()
+        if memory is None:
+            history.append(("user", question))
+            messages = history
+        else:
+            memory.add_user(question)
+            messages = memory.messages()
+        prompt = PROMPT.invoke({"messages": messages}).to_messages()
+        result = chain.invoke({"messages": messages})
+        reply = result.tool_calls[0]["args"]["answer"]
+        if memory is None:
+            history.append(("assistant", reply))
+        else:
+            memory.add_ai(reply)
+        samples.append(time.perf_counter() - start)
+        tokens.append(_prompt_tokens(prompt))
+
+    last = summarize(samples[-max(1, turns // 10):])
+    return {
+        "turns": turns,
+        **summarize(samples),
+        "last_10pct_ms": last["median_ms"],
+        "first_turn_tokens": tokens[0],
+        "last_turn_tokens": tokens[-1],
+        "total_prompt_tokens": sum(tokens),
+        "llm_calls": llm.calls,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--keep-turns", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each scripted LLM call sleeps.")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=10.0, help="Modelled prefill time per prompt token.")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    def summarize_turn(messages: Sequence[AnyMessage]) -> AIMessage:
+        _prefill(args.ms_per_1k_tokens, messages)
+        return AIMessage(content="The user keeps asking about the Drake / Kendrick beef, the assistant answers about llamas.")
+
+    summarizer = ScriptedChatModel(script=[summarize_turn], latency=args.latency)
+    memory = ConversationMemory(llm=summarizer, keep_turns=args.keep_turns, max_tokens=args.max_tokens)
+
+    rows = [
+        {"history": "full", **session(args.turns, None, args.latency, args.ms_per_1k_tokens)},
+        {"history": "memory", **session(args.turns, memory, args.latency, args.ms_per_1k_tokens)},
+    ]
+    rows[1]["summaries"] = summarizer.calls
+    report(f"run_1 chat session ({args.turns} turns, {args.ms_per_1k_tokens}ms per 1k prompt tokens)", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
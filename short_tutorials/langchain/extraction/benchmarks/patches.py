@@ -0,0 +1,91 @@
+"""
+Cost of folding JSONPatch rounds into the tool call (pipeline/patched.PatchAggregator).
+
+Replays a retry loop on a large TranscriptSummary: every round appends one patch (and its tool
+message) and aggregates the history the way the graph does, several times per round. The baseline
+is the previous aggregator, which rescanned every message and ran `jsonpatch.apply_patch` (a deep
+copy of the whole arguments) for every patch on every call.
+
+    python3 -m benchmarks.patches
+    python3 -m benchmarks.patches --moments 500 --rounds 20 --json
+"""
+from typing import Dict, List, Optional, Sequence
+import argparse
+
+import jsonpatch
+from langchain_core.messages import (AIMessage, AnyMessage, ToolCall, ToolMessage)
+
+from benchmarks.common import report, summarize, timings
+from benchmarks.fixtures import transcript_summary
+from extractor import TranscriptSummary
+from pipeline.patched import PatchAggregator
+
+PATCH_TOOL = "PatchFunctionParameters"
+# repair, validator, finalizer: the places the graph aggregates the messages in one round
+CALLS_PER_ROUND = 3
+
+
+def rescan(messages: Sequence[AnyMessage]) -> AIMessage:
+    """The aggregator before PatchAggregator, for comparison."""
+    resolved: Dict[str, ToolCall] = {}
+    for m in messages:
+        if m.type != "ai":
+            continue
+        for tc in m.tool_calls:
+            if tc["name"] == PATCH_TOOL:
+                target = resolved[tc["args"]["tool_call_id"]]
+                target["args"] = jsonpatch.apply_patch(target["args"], tc["args"]["patches"])
+                target["id"] = tc["id"]
+            else:
+                resolved[tc["id"]] = tc.copy()
+    return AIMessage(content="", tool_calls=list(resolved.values()))
+
+
+def history(moments: int, rounds: int) -> List[AnyMessage]:
+    args = transcript_summary(participants=4, moments=moments)
+    messages: List[AnyMessage] = [AIMessage(content="", id="ai-0", tool_calls=[
+        ToolCall(name="TranscriptSummary", args=args, id="call_0"),
+    ])]
+    for i in range(rounds):
+        patch = {"op": "replace", "path": f"/key_moments/0/tense_moments/{i % moments}/description", "value": f"Fixed {i}"}
+        messages.append(ToolMessage(content="1 validation error", tool_call_id="call_0", id=f"tool-{i}"))
+        messages.append(AIMessage(content="", id=f"ai-{i + 1}", tool_calls=[ToolCall(
+            name=PATCH_TOOL, args={"tool_call_id": "call_0", "reasoning": "Fix the description.", "patches": [patch]},
+            id=f"call_{i + 1}",
+        )]))
+    return messages
+
+
+def replay(aggregate, messages: List[AnyMessage]) -> None:
+    """Aggregate every prefix a retry loop over `messages` would, CALLS_PER_ROUND times each."""
+    for end in range(1, len(messages) + 1, 2):
+        for _ in range(CALLS_PER_ROUND):
+            aggregate(messages[:end])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--moments", type=int, default=100, help="Key moments of each kind in the patched summary.")
+    parser.add_argument("--rounds", type=int, default=10, help="Patch rounds per retry loop.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    messages = history(args.moments, args.rounds)
+    aggregators = {
+        "rescan + jsonpatch": lambda: rescan,
+        "PatchAggregator": lambda: PatchAggregator([TranscriptSummary]),
+    }
+    rows = []
+    for name, make in aggregators.items():
+        # a fresh aggregator per loop, so nothing is reused between iterations
+        samples = timings(lambda: replay(make(), messages), repeat=args.iterations)
+        rows.append({"aggregator": name, "rounds": args.rounds, **summarize(samples)})
+    aggregator = PatchAggregator([TranscriptSummary])
+    replay(aggregator, messages)
+    rows[-1].update(aggregator.stats)
+    report(f"patch aggregation, {args.moments * 3} moments x {args.rounds} rounds", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Offline benchmark of the validation graph plumbing (pipeline/retry.py and pipeline/patched.py).
+
+The LLM is a ScriptedChatModel replaying canned tool calls (benchmarks/fixtures.py), so the numbers
+are the cost of the graph itself: compiling it, one clean pass through it, a retry round trip, and
+the memory left behind by many runs. Add --latency to see the overhead next to a modelled API call.
+
+    python3 -m benchmarks.retry_graph
+    python3 -m benchmarks.retry_graph --iterations 500 --stream --json
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import time
+
+from benchmarks.common import memory_growth, report, summarize, timings
+from benchmarks.fixtures import script
+from extractor import TranscriptSummary
+from pipeline.patched import bind as bind_with_patch_retry
+from pipeline.retry import Respond, bind as bind_with_retry
+from utils.fake_llm import ScriptedChatModel
+
+STRATEGIES: Dict[str, Callable] = {"retry": bind_with_retry, "patched": bind_with_patch_retry}
+TOOLS = {"Respond": Respond, "TranscriptSummary": TranscriptSummary}
+
+
+def _graph(strategy: str, tool: str, retry: bool, latency: float, stream: bool):
+    llm = ScriptedChatModel(script=script(tool, strategy, retry), latency=latency)
+    graph = STRATEGIES[strategy](llm, tools=[TOOLS[tool]], validate_stream=stream)
+    messages = [("user", "Summarize the call.")]
+    return llm, lambda: graph.invoke(messages)
+
+
+def bench(strategy: str, tool: str, iterations: int, latency: float, stream: bool) -> Dict[str, object]:
+    row: Dict[str, object] = {"strategy": strategy, "tool": tool}
+
+    llm = ScriptedChatModel(script=script(tool, strategy, retry=False))
+    compile_times = timings(
+        lambda: STRATEGIES[strategy](llm, tools=[TOOLS[tool]], validate_stream=stream),
+        repeat=max(5, iterations // 10),
+    )
+    row["compile_ms"] = summarize(compile_times)["median_ms"]
+
+    llm, invoke = _graph(strategy, tool, retry=False, latency=latency, stream=stream)
+    clean = summarize(timings(invoke, repeat=iterations))
+    row["invoke_ms"] = clean["median_ms"]
+    row["invoke_p95_ms"] = clean["p95_ms"]
+    row["overhead_ms"] = clean["median_ms"] - latency * 1e3
+
+    llm, invoke = _graph(strategy, tool, retry=True, latency=latency, stream=stream)
+    llm.reset()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        invoke()
+    elapsed = time.perf_counter() - start
+    # every run is one failed first answer plus one fix
+    row["retry_invoke_ms"] = elapsed / iterations * 1e3
+    row["retries_per_s"] = iterations / elapsed
+    row["llm_calls"] = llm.calls
+
+    growth = memory_growth(invoke, repeat=iterations)
+    row["mem_growth_kb"] = growth["growth_kb"]
+    row["mem_peak_kb"] = growth["peak_kb"]
+    return row
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each scripted LLM call sleeps.")
+    parser.add_argument("--stream", action="store_true", help="Validate tool call arguments while streaming.")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), action="append")
+    parser.add_argument("--tool", choices=list(TOOLS), action="append")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    rows = [
+        bench(strategy, tool, args.iterations, args.latency, args.stream)
+        for strategy in args.strategy or STRATEGIES
+        for tool in args.tool or TOOLS
+    ]
+    report(f"retry graph ({args.iterations} iterations, latency={args.latency}s, stream={args.stream})", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Prompt tokens of the tool schemas sent on every request: `bind_tools` default vs `compact_tool`.
+
+    python3 -m benchmarks.schema
+    python3 -m benchmarks.schema --budget 0 --budget 100 --json
+"""
+from typing import List, Optional
+import argparse
+import time
+
+from benchmarks.common import report
+from extractor import Member, TranscriptSummary
+from pipeline.retry import Respond
+from pipeline.schema import compact_tool, schema_savings
+
+TOOLS = [Respond, Member, TranscriptSummary]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=int, action="append", help="Description token budget(s). Default: none, 100, 0.")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for tool in TOOLS:
+        for budget in args.budget or [None, 100, 0]:
+            compact_tool.cache_clear()
+            start = time.perf_counter()
+            compact_tool(tool, budget)
+            compile_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            compact_tool(tool, budget)
+            cached_us = (time.perf_counter() - start) * 1e6
+            savings = schema_savings(tool, budget)
+            rows.append({
+                "tool": tool.__name__,
+                "description_budget": "all" if budget is None else budget,
+                **savings,
+                "saved_pct": 100 * savings["saved_tokens"] / savings["default_tokens"],
+                "compile_ms": compile_ms,
+                "cached_us": cached_us,
+            })
+    report("tool schema tokens per request", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Startup cost of the extraction package: what `import main` / `import llm` load, and how long it takes.
+
+Every measurement runs in a fresh interpreter, without OPENAI_API_KEY and with stdin closed, so an
+import that prompts for the key (or has any other side effect that needs a terminal) fails here.
+Reports the cold-start wall time (median of --repeat runs, next to a bare interpreter), the
+`-X importtime` cumulative time of the module and its heaviest imports, and the cost of building a
+chain, where the langchain / langgraph / openai imports are paid now. --max-ms makes it exit non-zero
+when an import gets slower than the budget, to keep regressions out.
+
+    python3 -m benchmarks.startup
+    python3 -m benchmarks.startup --module main --top 10 --max-ms 300 --json
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import report
+
+BUILD_CHAIN = (
+    "from langchain_core.prompts import ChatPromptTemplate\n"
+    "from extractor import TranscriptSummary\n"
+    "from llm import LLMChainPatched\n"
+    "LLMChainPatched(ChatPromptTemplate.from_messages([('placeholder', '{messages}')]), [TranscriptSummary])\n"
+)
+
+
+def _run(code: str, args: Tuple[str, ...] = (), env: Optional[Dict[str, str]] = None) -> subprocess.CompletedProcess:
+    environment = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    environment.update(env or {})
+    return subprocess.run(
+        [sys.executable, *args, "-c", code], env=environment, stdin=subprocess.DEVNULL,
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+
+def wall_ms(code: str, repeat: int, env: Optional[Dict[str, str]] = None) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _run(code, env=env)
+        samples.append(time.perf_counter() - start)
+        if result.returncode:
+            raise RuntimeError(f"{code!r} failed:\n{result.stderr[-2000:]}")
+    return statistics.median(samples) * 1e3
+
+
+def import_times(module: str) -> List[Tuple[str, int, float]]:
+    """(module, nesting level, cumulative ms) for every import `import module` triggers."""
+    result = _run(f"import {module}", args=("-X", "importtime"))
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), level, int(cumulative) / 1e3))
+    return rows
+
+
+def bench(modules: List[str], repeat: int, top: int) -> List[dict]:
+    baseline = wall_ms("pass", repeat)
+    rows = [{"what": "python -c pass", "wall_ms": baseline}]
+    for module in modules:
+        times = import_times(module)
+        total = next((ms for name, level, ms in reversed(times) if name == module and level == 0), 0.0)
+        heaviest = sorted(((ms, name) for name, level, ms in times if level == 1), reverse=True)[:top]
+        rows.append({
+            "what": f"import {module}",
+            "wall_ms": wall_ms(f"import {module}", repeat),
+            "importtime_ms": total,
+            "modules": len(times),
+            "heaviest": ", ".join(f"{name} {ms:.0f}ms" for ms, name in heaviest),
+        })
+    rows.append({"what": "build LLMChainPatched", "wall_ms": wall_ms(BUILD_CHAIN, repeat, env={"OPENAI_API_KEY": "sk-startup"})})
+    for row in rows[1:]:
+        row["over_interpreter_ms"] = row["wall_ms"] - baseline
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", action="append", help="Module to import (default: main and llm).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Heaviest direct imports to list per module.")
+    parser.add_argument("--max-ms", type=float, help="Fail if an import takes longer than this (over a bare interpreter).")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    rows = bench(args.module or ["main", "llm"], args.repeat, args.top)
+    report(f"cold start ({args.repeat} runs each)", rows, args.json)
+    if args.max_ms is not None:
+        slow = [row["what"] for row in rows if row["what"].startswith("import ") and row["over_interpreter_ms"] > args.max_ms]
+        if slow:
+            sys.exit(f"over the {args.max_ms:g}ms startup budget: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of the TranscriptSummary result store (utils/store.py) against plain JSON lines dumps.
+
+Writes --summaries synthetic summaries (varied speakers, names and professions) both ways, then runs
+the filtered reads the store is for: quotes by speaker and members by profession. The JSON side has
+to parse every line to answer them; both sides return validated pydantic models.
+
+    python3 -m benchmarks.store
+    python3 -m benchmarks.store --summaries 200000 --batch-size 2000 --json
+"""
+from typing import Callable, List, Optional
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import report, summarize
+from benchmarks.fixtures import transcript_summary
+from extractor import InsightfulQuote, Member, TranscriptSummary
+from utils.store import ResultStore
+
+SPEAKERS = ["Pete", "Xu", "Laura", "Sam", "Ana", "Kofi", "Mei", "Ravi"]
+PROFESSIONS = ["podcaster", "rapper", "producer", "journalist", "manager", "engineer", "lawyer", "teacher"]
+
+
+def summaries(count: int, seed: int = 0) -> List[TranscriptSummary]:
+    rng = random.Random(seed)
+    template = TranscriptSummary.model_validate(transcript_summary(participants=4))
+    out = []
+    for i in range(count):
+        summary = template.model_copy(deep=True)
+        summary.metadata.title = f"Call {i}"
+        for member in summary.participants:
+            member.name.content = rng.choice(SPEAKERS)
+            for info in member.background_details:
+                info.professions = rng.sample(PROFESSIONS, 2)
+        for quote in summary.insightful_quotes:
+            quote.speaker = rng.choice(SPEAKERS)
+        out.append(summary)
+    return out
+
+
+def _timed(fn: Callable[[], object]) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def _scan_quotes(path: str, speaker: str) -> List[InsightfulQuote]:
+    with open(path) as f:
+        return [
+            InsightfulQuote.model_validate(quote)
+            for line in f
+            for quote in json.loads(line)["insightful_quotes"]
+            if quote["speaker"].casefold() == speaker.casefold()
+        ]
+
+
+def _scan_members(path: str, profession: str) -> List[Member]:
+    with open(path) as f:
+        return [
+            Member.model_validate(member)
+            for line in f
+            for member in json.loads(line)["participants"]
+            if any(profession in info["professions"] for info in member["background_details"])
+        ]
+
+
+def bench(count: int, batch_size: int, repeat: int) -> List[dict]:
+    data = summaries(count)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = os.path.join(tmp, "results.jsonl")
+
+        def dump_json():
+            with open(jsonl, "w") as f:
+                for summary in data:
+                    f.write(summary.model_dump_json() + "\n")
+
+        store_path = os.path.join(tmp, "results.sqlite")
+
+        def write_store():
+            with ResultStore(store_path, batch_size=batch_size) as store:
+                store.extend(data)
+
+        json_write, _ = _timed(dump_json)
+        store_write, _ = _timed(write_store)
+        rows.append({"op": "bulk write", "backend": "jsonl", "summaries": count, "ms": json_write * 1e3,
+                     "per_s": count / json_write, "file_mb": os.path.getsize(jsonl) / 1024 / 1024})
+        rows.append({"op": "bulk write", "backend": "sqlite", "summaries": count, "ms": store_write * 1e3,
+                     "per_s": count / store_write, "file_mb": os.path.getsize(store_path) / 1024 / 1024})
+
+        store = ResultStore(store_path, batch_size=batch_size)
+        queries = [
+            ("quotes by speaker", lambda: _scan_quotes(jsonl, "Laura"), lambda: store.quotes(speaker="laura")),
+            ("members by profession", lambda: _scan_members(jsonl, "lawyer"), lambda: store.members(profession="lawyer")),
+            ("first 20 members by profession", lambda: _scan_members(jsonl, "lawyer")[:20],
+             lambda: store.members(profession="lawyer", limit=20)),
+        ]
+        for op, scan, query in queries:
+            for backend, fn in (("jsonl", scan), ("sqlite", query)):
+                samples, found = [], None
+                for _ in range(repeat):
+                    elapsed, found = _timed(fn)
+                    samples.append(elapsed)
+                rows.append({"op": op, "backend": backend, "summaries": count, "ms": summarize(samples)["median_ms"],
+                             "rows": len(found)})
+        store.close()
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--summaries", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+
+    rows = bench(args.summaries, args.batch_size, args.repeat)
+    report(f"result store vs JSON lines ({args.summaries} summaries)", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,59 @@
-from typing import List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
 from pydantic import BaseModel, Field, field_validator
 
+from utils.grounding import QuoteIndex, index_for
+
+# (index, threshold) of the transcript being extracted, see `grounded`
+_grounding: ContextVar[Optional[Tuple[QuoteIndex, float]]] = ContextVar("grounding", default=None)
+
+
+@contextmanager
+def grounded(transcript: str, threshold: float = 0.6) -> Iterator[QuoteIndex]:
+    """
+    Check every quote / source extracted inside this block against `transcript`.
+
+    While active, `OutputFormat.sources` (so also `InsightfulQuote.quote`) and `Moment.quote` reject text that
+    isn't in the transcript, so the ValidationNode sends hallucinated citations back for a retry.
+    The index is built once per transcript (utils/grounding.py). Being validated fields, they're never
+    filled in by `pipeline/repair.LocalRepair`: a citation has to come from the model.
+    """
+    index = index_for(transcript)
+    token = _grounding.set((index, threshold))
+    try:
+        yield index
+    finally:
+        _grounding.reset(token)
+
+
+def in_transcript(value: str) -> str:
+    current = _grounding.get()
+    if current is None:
+        return value
+    index, threshold = current
+    missing = index.ungrounded(value, threshold)
+    if missing:
+        raise ValueError(
+            f"Not found in the transcript: {missing}. Cite the transcript verbatim (an ellipsis may join spans)."
+        )
+    return value
+
 
 class OutputFormat(BaseModel):
     sources: str = Field(..., description="The raw transcript / span you could cite to justify the choice.", )
     content: str = Field(..., description="The chosen value.")
 
+    _sources_in_transcript = field_validator("sources")(in_transcript)
+
 
 class Moment(BaseModel):
     quote: str = Field(..., description="The relevant quote from the transcript.")
     description: str = Field(..., description="A description of the moment.")
     expressed_preference: OutputFormat = Field(..., description="The preference expressed in the moment.")
 
+    _quote_in_transcript = field_validator("quote")(in_transcript)
+
 
 class BackgroundInfo(BaseModel):
     factoid: OutputFormat = Field(..., description="Important factoid about the member.")
@@ -1,27 +1,177 @@
+"""
+The extraction chains. Importing this module is cheap and has no side effects: langchain, langgraph and
+the pipeline modules are loaded, and OPENAI_API_KEY is asked for, only when a chain is built.
+"""
 import getpass
 from os import getenv, environ
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from pipeline.retry import bind as bind_with_retry
-from pipeline.patched import bind as bind_with_patch_retry
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import Runnable
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from pipeline.adaptive import AdaptivePolicy
+    from pipeline.cache import ResponseCache
+    from pipeline.telemetry import GraphTelemetry
 
 
 def _set_env(var: str):
-    api_key = getenv("OPENAI_API_KEY")
+    api_key = getenv(var)
     if not api_key:
-        environ.setdefault("OPENAI_API_KEY", getpass.getpass("OPENAI_API_KEY:"))
+        environ.setdefault(var, getpass.getpass(f"{var}:"))
+
+
+def _chat_model() -> "BaseChatModel":
+    """The model every chain runs on, created (and the API key asked for) on first use."""
+    from utils.clients import chat_model
+
+    _set_env("OPENAI_API_KEY")
+    return chat_model("gpt-4o", temperature=0, streaming=True, stream_usage=True)
+
+
+class _LLMChain:
+    """
+    Shared batch and async helpers for the chains below.
+
+    Every input runs through its own ValidateWithRetries graph, so the retry / patch loop of
+    one item never waits on another. Results come back in input order; an item that failed
+    (e.g. ran out of attempts) is returned as its exception instead of raising for the batch.
+    """
+    chain: "Runnable"
+
+    @staticmethod
+    def _configs(count: int, max_concurrency: int, job_ids: Optional[Sequence[str]]) -> Union[dict, List[dict]]:
+        from pipeline.checkpoint import job_config
+
+        if job_ids is None:
+            return {"max_concurrency": max_concurrency}
+        if len(job_ids) != count:
+            raise ValueError(f"Got {len(job_ids)} job ids for {count} inputs")
+        return [job_config(job_id, max_concurrency=max_concurrency) for job_id in job_ids]
+
+    def batch(
+            self, inputs: Sequence[dict], max_concurrency: int = 8, job_ids: Optional[Sequence[str]] = None
+    ) -> List[Union["AIMessage", Exception]]:
+        """With a checkpointer, `job_ids` (one per input) make a rerun of the batch resume where it stopped."""
+        inputs = list(inputs)
+        return self.chain.batch(inputs, config=self._configs(len(inputs), max_concurrency, job_ids), return_exceptions=True)
+
+    async def abatch(
+            self, inputs: Sequence[dict], max_concurrency: int = 8, job_ids: Optional[Sequence[str]] = None
+    ) -> List[Union["AIMessage", Exception]]:
+        inputs = list(inputs)
+        return await self.chain.abatch(
+            inputs, config=self._configs(len(inputs), max_concurrency, job_ids), return_exceptions=True
+        )
+
+    async def abatch_as_completed(
+            self, inputs: Sequence[dict], max_concurrency: int = 8
+    ) -> AsyncIterator[Tuple[int, Union["AIMessage", Exception]]]:
+        """Yield (input index, result) pairs as soon as each item finishes."""
+        async for index, result in self.chain.abatch_as_completed(
+                list(inputs), config={"max_concurrency": max_concurrency}, return_exceptions=True
+        ):
+            yield index, result
 
-_set_env("OPENAI_API_KEY")
+    async def ainvoke(self, input: dict) -> "AIMessage":
+        return await self.chain.ainvoke(input)
 
-class LLMChainSimple:
-    def __init__(self, prompt: ChatPromptTemplate, tools: list):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4o", streaming=True)
-        bound_llm = bind_with_retry(self.llm, tools=tools)
+    async def astream(self, input: dict) -> AsyncIterator[Union["AIMessageChunk", "AIMessage"]]:
+        """
+        Yield the model's AIMessageChunks as they are generated (every attempt, including
+        fallback / patch calls), then the validated AIMessage as the last item.
+        """
+        async for event in self.chain.astream_events(input, version="v2"):
+            if event["event"] == "on_chat_model_stream":
+                yield event["data"]["chunk"]
+            elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                yield event["data"]["output"]
+
+
+class LLMChainSimple(_LLMChain):
+    def __init__(
+            self,
+            prompt: "ChatPromptTemplate",
+            tools: list,
+            cache: Optional["ResponseCache"] = None,
+            telemetry: Optional["GraphTelemetry"] = None,
+            checkpointer: Optional["BaseCheckpointSaver"] = None,
+    ):
+        from pipeline.repair import LocalRepair
+        from pipeline.retry import bind as bind_with_retry
+
+        self.llm = _chat_model()
+        self.repair = LocalRepair(tools)
+        bound_llm = bind_with_retry(
+            self.llm, tools=tools, validate_stream=True, repair=self.repair, cache=cache, compact_schema=True,
+            telemetry=telemetry, checkpointer=checkpointer,
+        )
+        self.chain = prompt | bound_llm
+
+
+class LLMChainPatched(_LLMChain):
+    def __init__(
+            self,
+            prompt: "ChatPromptTemplate",
+            tools: list,
+            cache: Optional["ResponseCache"] = None,
+            telemetry: Optional["GraphTelemetry"] = None,
+            checkpointer: Optional["BaseCheckpointSaver"] = None,
+    ):
+        from pipeline.patched import bind as bind_with_patch_retry, ScopedSchemaErrors
+        from pipeline.repair import LocalRepair
+
+        self.llm = _chat_model()
+        self.repair = LocalRepair(tools)
+        self.error_format = ScopedSchemaErrors()
+        bound_llm = bind_with_patch_retry(
+            self.llm, tools=tools, validate_stream=True, repair=self.repair, format_error=self.error_format,
+            cache=cache, telemetry=telemetry, compact_schema=True, checkpointer=checkpointer,
+        )
+        self.chain = prompt | bound_llm
+
+
+class LLMChainTargeted(_LLMChain):
+    def __init__(
+            self,
+            prompt: "ChatPromptTemplate",
+            tools: list,
+            cache: Optional["ResponseCache"] = None,
+            telemetry: Optional["GraphTelemetry"] = None,
+            checkpointer: Optional["BaseCheckpointSaver"] = None,
+    ):
+        from pipeline.repair import LocalRepair
+        from pipeline.targeted import bind as bind_with_targeted_retry
+
+        self.llm = _chat_model()
+        self.repair = LocalRepair(tools)
+        bound_llm = bind_with_targeted_retry(
+            self.llm, tools=tools, validate_stream=True, repair=self.repair, cache=cache, compact_schema=True,
+            telemetry=telemetry, checkpointer=checkpointer,
+        )
         self.chain = prompt | bound_llm
 
 
-class LLMChainPatched:
-    def __init__(self, prompt: ChatPromptTemplate, tools: list):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4o", streaming=True)
-        bound_llm = bind_with_patch_retry(self.llm, tools=tools)
+class LLMChainAdaptive(_LLMChain):
+    def __init__(
+            self,
+            prompt: "ChatPromptTemplate",
+            tools: list,
+            cache: Optional["ResponseCache"] = None,
+            telemetry: Optional["GraphTelemetry"] = None,
+            checkpointer: Optional["BaseCheckpointSaver"] = None,
+            policy: Optional["AdaptivePolicy"] = None,
+    ):
+        from pipeline.adaptive import AdaptivePolicy, bind as bind_with_adaptive_retry
+        from pipeline.repair import LocalRepair
+
+        self.llm = _chat_model()
+        self.repair = LocalRepair(tools)
+        self.policy = policy or AdaptivePolicy(tools)
+        bound_llm = bind_with_adaptive_retry(
+            self.llm, tools=tools, validate_stream=True, repair=self.repair, policy=self.policy, cache=cache,
+            telemetry=telemetry, compact_schema=True, checkpointer=checkpointer,
+        )
         self.chain = prompt | bound_llm
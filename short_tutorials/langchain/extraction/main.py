@@ -1,5 +1,3 @@
-from llm import LLMChainSimple, LLMChainPatched
-from langchain_core.prompts import ChatPromptTemplate
 from loguru import logger
 
 
@@ -11,11 +9,19 @@ In the BIND of each setup (LLMChainSimple, LLMChainPatched) there are 3 main par
      - a retry strategy - to know how to deal with invalid results
      - a validator node - to check out results.
 
-In run_1, we use a simple tool to respond to user input (adds style).
+In run_1, we use a simple tool to respond to user input (adds style), with a token-bounded chat memory (utils/memory.py).
 In run_2, we introduce tools to extract parts (view extractor.py) of a transcript.
 In run_3, we introduce the JSONPatch to fix the error response in from the nested conversation.
+In run_4, we push several transcripts through the JSONPatch chain concurrently (each one retries on its own).
+In run_5, we split one long transcript into speaker-turn chunks, extract them in parallel and merge the results.
 
 View more in llm.py for how each chain is setup with functions from retry.py and patched.py in the pipeline folder.
+Each run imports what it needs, so importing this file (or running only run_1) doesn't load every pipeline.
+
+Runs 2-5 share an on-disk response cache (.cache/responses.sqlite), so rerunning this file doesn't pay for the same calls twice.
+Run 4 stores its summaries in a queryable SQLite store (.cache/results.sqlite, utils/store.py) and checkpoints
+every transcript's retry loop (.cache/checkpoints.sqlite, pipeline/checkpoint.py), so a crashed run resumes.
+Run 4 also reports per-node timing, attempts and validation errors (pipeline/telemetry.py) in prometheus format.
 
 """
 
@@ -24,7 +30,11 @@ def run_1():
     """
     This will run and correct itself. (but struggles on reasoning)
     """
+    from langchain_core.prompts import ChatPromptTemplate
+    from llm import LLMChainSimple
     from pipeline.retry import Respond
+    from utils.clients import chat_model
+    from utils.memory import ConversationMemory
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "Respond directly by calling the Respond function."),
@@ -32,9 +42,8 @@ def run_1():
     ])
 
     llm_chain = LLMChainSimple(prompt=prompt, tools=[Respond])
-    # invoke a question
-    # Initialize conversation history
-    conversation = []
+    # the last few turns verbatim, older ones folded into a running summary, so long chats don't resend everything
+    memory = ConversationMemory(llm=chat_model("gpt-4o-mini", temperature=0))
 
     logger.info("Welcome to the real-time chat! Type 'exit' to end the conversation.\n")
     user_name = input("Hey, before we get started let's get your name: ")
@@ -49,16 +58,19 @@ def run_1():
             break
 
         # Add user message to conversation history
-        conversation.append(("user", user_input))
+        memory.add_user(user_input)
 
         try:
-            # Invoke the LLMChain with the current conversation
-            results = llm_chain.chain.invoke({"messages": conversation})
+            # Invoke the LLMChain with the summary + recent turns
+            results = llm_chain.chain.invoke({"messages": memory.messages()})
             results.pretty_print()
+            memory.add_ai(results.tool_calls[0]["args"]["answer"])
 
         except Exception as e:
             print(f"An error occurred: {e}\n")
 
+    logger.info(f"memory: {memory.stats}")
+
 
 def run_2():
     """
@@ -72,7 +84,10 @@ def run_2():
     We expect this to struggle due to the nested nature of the conversation.
     Depending on the model, it may fail (like older gpt-3 turbo models) and gpt-4o will struggle to be correct itself.
     """
+    from langchain_core.prompts import ChatPromptTemplate
     from extractor import TranscriptSummary
+    from llm import LLMChainSimple
+    from pipeline.cache import ResponseCache
     from utils.transcript import formatted
 
     # start out class
@@ -80,7 +95,7 @@ def run_2():
         ("system", "Respond directly using the TranscriptSummary function."),
         ("placeholder", "{messages}"),
     ])
-    llm_chain = LLMChainSimple(prompt=prompt, tools=[TranscriptSummary])
+    llm_chain = LLMChainSimple(prompt=prompt, tools=[TranscriptSummary], cache=ResponseCache())
 
     try:
         results = llm_chain.chain.invoke({
@@ -102,21 +117,106 @@ def run_3():
     This dynamically patches answers while it uses the TranscriptSummary tool to correct itself.
 
     """
-    from extractor import TranscriptSummary
+    from langchain_core.prompts import ChatPromptTemplate
+    from extractor import TranscriptSummary, grounded
+    from llm import LLMChainPatched
+    from pipeline.cache import ResponseCache
     from utils.transcript import formatted
     prompt = ChatPromptTemplate.from_messages([
         ("system", "Respond directly using the TranscriptSummary function."),
         ("placeholder", "{messages}"),
     ])
-    llm_chain = LLMChainPatched(prompt=prompt, tools=[TranscriptSummary])
+    llm_chain = LLMChainPatched(prompt=prompt, tools=[TranscriptSummary], cache=ResponseCache())
+
+    # quotes / sources that aren't in the transcript fail validation and get patched
+    with grounded(formatted):
+        results = llm_chain.chain.invoke({
+            "messages": [(
+                "user",
+                f"Extract the summary from the following conversation:\n\n<convo>\n{formatted}\n</convo>",
+            )]
+        })
+    results.pretty_print()
+    logger.info(f"local repairs: {llm_chain.repair.stats}")
+    logger.info(f"correction prompt tokens: {llm_chain.error_format.stats}")
+
 
-    results = llm_chain.chain.invoke({
+def run_4(max_concurrency: int = 4):
+    """
+    Batch version of run_3: every transcript gets its own validation graph, so one transcript stuck
+    on a retry never holds up the rest. Results come back in input order, failures as exceptions.
+    """
+    import asyncio
+    from langchain_core.prompts import ChatPromptTemplate
+    from extractor import TranscriptSummary
+    from llm import LLMChainPatched
+    from pipeline.cache import ResponseCache
+    from pipeline.checkpoint import SqliteCheckpointer
+    from pipeline.telemetry import GraphTelemetry
+    from utils.store import ResultStore
+    from utils.transcript import transcript
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "Respond directly using the TranscriptSummary function."),
+        ("placeholder", "{messages}"),
+    ])
+    telemetry = GraphTelemetry()
+    # every window is a job: if this run dies mid-retry, rerunning it resumes each job after its last completed node
+    llm_chain = LLMChainPatched(
+        prompt=prompt, tools=[TranscriptSummary], cache=ResponseCache(), telemetry=telemetry,
+        checkpointer=SqliteCheckpointer(),
+    )
+
+    # stand-in for a night's worth of calls: a few overlapping windows of the demo transcript
+    windows = [transcript[i:i + 12] for i in range(0, len(transcript), 6)]
+    inputs = [{
         "messages": [(
             "user",
-            f"Extract the summary from the following conversation:\n\n<convo>\n{formatted}\n</convo>",
+            "Extract the summary from the following conversation:\n\n<convo>\n"
+            + "\n".join(f"{speaker}: {text}" for speaker, text in window)
+            + "\n</convo>",
         )]
-    })
+    } for window in windows]
+
+    job_ids = [f"run_4-window-{i}" for i in range(len(inputs))]
+    results = asyncio.run(llm_chain.abatch(inputs, max_concurrency=max_concurrency, job_ids=job_ids))
+    # the extracted summaries go to a queryable store (utils/store.py)
+    with ResultStore() as store:
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"transcript {i} failed: {result!r}")
+            else:
+                summary_id = store.append(result.tool_calls[0]["args"], source=f"window-{i}")
+                logger.info(f"transcript {i} extracted, stored as summary {summary_id}")
+        logger.info(f"stored summaries: {len(store)}, quotes by Xu: {len(store.quotes(speaker='Xu'))}")
+    logger.info(f"local repairs: {llm_chain.repair.stats}")
+    logger.info(f"correction prompt tokens: {llm_chain.error_format.stats}")
+    logger.info(f"graph telemetry:\n{telemetry.to_prometheus()}")
+
+
+def run_5(max_tokens: int = 300):
+    """
+    Map-reduce version of run_3 for transcripts that don't fit (or are too slow) in one tool call.
+    The demo transcript is short, so a small token budget is used to force a few chunks.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from extractor import TranscriptSummary, grounded
+    from llm import LLMChainPatched
+    from pipeline.cache import ResponseCache
+    from pipeline.mapreduce import MapReduceExtractor
+    from utils.transcript import formatted, transcript
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "Respond directly using the TranscriptSummary function."),
+        ("placeholder", "{messages}"),
+    ])
+    llm_chain = LLMChainPatched(prompt=prompt, tools=[TranscriptSummary], cache=ResponseCache())
+    extractor = MapReduceExtractor(llm_chain, max_tokens=max_tokens)
+
+    with grounded(formatted):
+        results = extractor.invoke(transcript)
     results.pretty_print()
+    logger.info(f"local repairs: {llm_chain.repair.stats}")
 
 
 if __name__ == "__main__":
@@ -126,3 +226,7 @@ if __name__ == "__main__":
     run_2()
     logger.info("Running DEMO3")
     run_3()
+    logger.info("Running DEMO4")
+    run_4()
+    logger.info("Running DEMO5")
+    run_5()
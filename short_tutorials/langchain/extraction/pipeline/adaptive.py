@@ -0,0 +1,475 @@
+from collections import Counter, OrderedDict
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessage, AnyMessage)
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.prebuilt import ValidationNode
+from pathlib import Path
+from typing import (Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type, Union)
+from pydantic import BaseModel, ValidationError
+import json
+import logging
+import random
+import threading
+import time
+
+from pipeline.cache import ResponseCache
+from pipeline.patched import PatchAggregator, PatchFunctionParameters, ScopedSchemaErrors
+from pipeline.repair import LocalRepair, MISSING, REPAIRABLE_ERRORS, get_path
+from pipeline.retry import _bind_validator_with_retries, RetryStrategy
+from pipeline.schema import compact_tools
+from pipeline.streaming import StreamingToolCallValidator
+from pipeline.telemetry import GraphTelemetry
+
+logger = logging.getLogger("extraction")
+
+REPAIR, PATCH, REGENERATE = "repair", "patch", "regenerate"
+STRATEGIES = (REPAIR, PATCH, REGENERATE)
+
+# error fraction (failing paths / leaf values) up to which a retry counts as "small" / "medium"
+FRACTION_BUCKETS = ((0.05, "small"), (0.25, "medium"))
+# priors until an arm has its own measurements: ~50 output tokens/s, a few ms for a local repair
+SECONDS_PER_TOKEN = 0.02
+REPAIR_SECONDS = 0.005
+PATCH_OVERHEAD_TOKENS = 60
+PATCH_TOKENS_PER_PATH = 25
+
+
+def _leaves(value: Any) -> int:
+    if isinstance(value, dict):
+        return sum(_leaves(v) for v in value.values()) or 1
+    if isinstance(value, list):
+        return sum(_leaves(v) for v in value) or 1
+    return 1
+
+
+class ErrorShape(NamedTuple):
+    """How much of a tool call is wrong, the input of the policy."""
+    tool: str
+    failing: int
+    size: int
+    output_tokens: int
+    patch_tokens: int
+    repairable: bool
+
+    @property
+    def fraction(self) -> float:
+        return self.failing / max(1, self.size)
+
+    @property
+    def bucket(self) -> str:
+        return next((name for bound, name in FRACTION_BUCKETS if self.fraction <= bound), "large")
+
+
+class Decision(NamedTuple):
+    strategy: str
+    shape: ErrorShape
+    expected: Dict[str, float]
+    explored: bool
+
+
+class _Arm:
+    __slots__ = ("tries", "successes", "seconds", "rate")
+
+    def __init__(self):
+        self.tries = 0
+        self.successes = 0
+        self.seconds: Optional[float] = None
+        self.rate: Optional[float] = None
+
+
+class AdaptivePolicy:
+    """
+    Picks the cheapest way to fix an invalid tool call: local repair, a JSONPatch or a full regeneration.
+
+    Every retry is described by its `ErrorShape`: failing paths against the leaf values of the arguments
+    (bucketed into small / medium / large error fractions), the tokens a regeneration would emit (the
+    whole arguments) and the tokens a JSONPatch would (the failing values plus the patch overhead).
+    For each (tool, strategy, bucket) the policy keeps the success rate and an EWMA of the seconds per
+    emitted token (seconds for repair), and picks the strategy with the lowest expected time to a valid
+    call, `seconds / success rate` (a repair that fails still pays for the next strategy). Until an arm
+    has measurements the priors above are used.
+
+    Every decision is logged (`extraction` logger, debug) with its outcome, and with `log_path` appended
+    as a JSON line; an existing log is replayed on start, so the stats carry over between runs. With
+    `explore` > 0 that share of decisions picks another strategy at random, to keep measuring them.
+    """
+
+    def __init__(
+            self,
+            tools: Sequence[Type[BaseModel]],
+            alpha: float = 0.2,
+            explore: float = 0.0,
+            log_path: Optional[str] = None,
+            seed: Optional[int] = None,
+    ):
+        self.tools: Dict[str, Type[BaseModel]] = {
+            tool.__name__: tool
+            for tool in tools
+            if isinstance(tool, type) and issubclass(tool, BaseModel)
+        }
+        self.alpha = alpha
+        self.explore = explore
+        self.log_path = log_path
+        self._rng = random.Random(seed)
+        self._arms: Dict[Tuple[str, str, str], _Arm] = {}
+        self._decisions: Counter = Counter()
+        self._lock = threading.Lock()
+        if log_path is not None:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            self._replay(log_path)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            arms = {
+                f"{tool}/{strategy}/{bucket}": {
+                    "tries": arm.tries,
+                    "successes": arm.successes,
+                    "success_rate": arm.successes / arm.tries if arm.tries else None,
+                    "seconds": arm.seconds,
+                }
+                for (tool, strategy, bucket), arm in sorted(self._arms.items())
+            }
+            return {"decisions": dict(self._decisions), "arms": arms}
+
+    def shape(self, message: AIMessage) -> Optional[ErrorShape]:
+        """The error shape of `message`'s tool calls, or None if they all validate (or use unknown tools)."""
+        tool, failing, size, output_chars, patch_tokens, repairable = None, 0, 0, 0, PATCH_OVERHEAD_TOKENS, True
+        for tc in message.tool_calls:
+            schema = self.tools.get(tc["name"])
+            if schema is None:
+                continue
+            args = tc["args"]
+            size += _leaves(args)
+            output_chars += len(json.dumps(args, default=str))
+            try:
+                schema.model_validate(args)
+                continue
+            except ValidationError as e:
+                errors = e.errors()
+            tool = tool or tc["name"]
+            failing += len(errors)
+            for error in errors:
+                repairable = repairable and error["type"] in REPAIRABLE_ERRORS
+                value = get_path(args, error["loc"])
+                patch_tokens += PATCH_TOKENS_PER_PATH
+                if value is not MISSING:
+                    patch_tokens += len(json.dumps(value, default=str)) // 4
+        if tool is None:
+            return None
+        return ErrorShape(tool, failing, size, max(1, output_chars // 4), patch_tokens, repairable)
+
+    def estimate(self, shape: ErrorShape, strategy: str) -> Tuple[float, float]:
+        """(success probability, seconds) of `strategy` for a retry of this shape."""
+        with self._lock:
+            arm = self._arms.get((shape.tool, strategy, shape.bucket)) or _Arm()
+            tries, successes, seconds, rate = arm.tries, arm.successes, arm.seconds, arm.rate
+        probability = (successes + 1) / (tries + 2)
+        if strategy == REPAIR:
+            return probability, REPAIR_SECONDS if seconds is None else seconds
+        tokens = shape.output_tokens if strategy == REGENERATE else shape.patch_tokens
+        return probability, (SECONDS_PER_TOKEN if rate is None else rate) * tokens
+
+    def plan(self, shape: ErrorShape, options: Sequence[str] = STRATEGIES) -> Decision:
+        """The decision for a retry of this shape, without counting or logging it (see `commit`)."""
+        options = [s for s in options if s != REPAIR or shape.repairable] or [REGENERATE]
+        expected = {}
+        for strategy in options:
+            if strategy == REPAIR:
+                continue
+            probability, seconds = self.estimate(shape, strategy)
+            expected[strategy] = seconds / probability
+        if REPAIR in options:
+            probability, seconds = self.estimate(shape, REPAIR)
+            expected[REPAIR] = seconds + (1 - probability) * min(expected.values(), default=0.0)
+        strategy = min(expected, key=expected.get)
+        explored = False
+        if self.explore and len(options) > 1 and self._rng.random() < self.explore:
+            strategy = self._rng.choice([s for s in options if s != strategy])
+            explored = True
+        return Decision(strategy, shape, expected, explored)
+
+    def commit(self, decision: Decision) -> Decision:
+        """Count and log `decision` as taken."""
+        shape = decision.shape
+        with self._lock:
+            self._decisions[decision.strategy] += 1
+        logger.debug(
+            f"Adaptive retry for {shape.tool}: {decision.strategy} ({shape.failing}/{shape.size} failing, "
+            f"expected seconds {', '.join(f'{k}={v:.3f}' for k, v in decision.expected.items())})"
+        )
+        return decision
+
+    def choose(self, shape: ErrorShape, options: Sequence[str] = STRATEGIES) -> Decision:
+        """`plan` and `commit` the decision for a retry of this shape."""
+        return self.commit(self.plan(shape, options))
+
+    def record(self, decision: Decision, ok: bool, seconds: Optional[float]) -> None:
+        """Feed back the outcome of `decision`; `seconds` is None for answers that didn't cost a call (cache hits)."""
+        self._update(decision.shape.tool, decision.strategy, decision.shape.bucket, ok, seconds, self._tokens(decision))
+        logger.debug(f"Adaptive retry for {decision.shape.tool}: {decision.strategy} {'succeeded' if ok else 'failed'}")
+        if self.log_path is None:
+            return
+        record = {
+            "ts": time.time(),
+            "tool": decision.shape.tool,
+            "strategy": decision.strategy,
+            "bucket": decision.shape.bucket,
+            "failing": decision.shape.failing,
+            "size": decision.shape.size,
+            "tokens": self._tokens(decision),
+            "expected": decision.expected,
+            "explored": decision.explored,
+            "ok": ok,
+            "seconds": seconds,
+        }
+        with self._lock:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    @staticmethod
+    def _tokens(decision: Decision) -> int:
+        if decision.strategy == REGENERATE:
+            return decision.shape.output_tokens
+        return decision.shape.patch_tokens if decision.strategy == PATCH else 0
+
+    def _update(self, tool: str, strategy: str, bucket: str, ok: bool, seconds: Optional[float], tokens: int) -> None:
+        with self._lock:
+            arm = self._arms.setdefault((tool, strategy, bucket), _Arm())
+            arm.tries += 1
+            arm.successes += bool(ok)
+            if seconds is None:
+                return
+            arm.seconds = seconds if arm.seconds is None else arm.seconds + self.alpha * (seconds - arm.seconds)
+            if tokens:
+                rate = seconds / tokens
+                arm.rate = rate if arm.rate is None else arm.rate + self.alpha * (rate - arm.rate)
+
+    def _replay(self, path: str) -> None:
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                        self._update(r["tool"], r["strategy"], r["bucket"], r["ok"], r.get("seconds"), r.get("tokens", 0))
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+
+def _generated(messages: Sequence[AnyMessage]) -> List[AnyMessage]:
+    """The messages of the current retry loop: the trailing AI / tool / validation error messages."""
+    start = len(messages)
+    while start > 0:
+        m = messages[start - 1]
+        if m.type not in ("ai", "tool") and not m.additional_kwargs.get("is_error"):
+            break
+        start -= 1
+    return list(messages[start:])
+
+
+class AdaptiveRetry:
+    """
+    The fallback, repair and validator hooks that let an `AdaptivePolicy` drive the retry graph.
+
+    The repair step only runs LocalRepair when the policy picks it; the fallback step asks the policy
+    to choose between a JSONPatch (`patch`) and a full regeneration (`regenerate`) and calls that model.
+    Every answer is remembered by its tool call ids until the validator has seen it, which settles the
+    outcome (and the latency of the call) of the decision.
+    """
+
+    def __init__(
+            self,
+            policy: AdaptivePolicy,
+            *,
+            regenerate: Runnable,
+            patch: Runnable,
+            aggregator: PatchAggregator,
+            repair: Optional[LocalRepair] = None,
+            max_pending: int = 1024,
+    ):
+        self.policy = policy
+        self.runnables = {REGENERATE: regenerate, PATCH: patch}
+        self.aggregator = aggregator
+        self._repair = repair
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Tuple[Decision, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def repair(self, message: AIMessage) -> Optional[AIMessage]:
+        """The graph's repair step: LocalRepair, if the policy thinks it's worth a try."""
+        shape = self.policy.shape(message)
+        if self._repair is None or shape is None or not shape.repairable:
+            return None
+        # a patch / regenerate pick isn't taken here: the fallback step makes (and counts) its own
+        decision = self.policy.plan(shape)
+        if decision.strategy != REPAIR:
+            return None
+        self.policy.commit(decision)
+        start = time.perf_counter()
+        repaired = self._repair(message)
+        self.policy.record(decision, ok=repaired is not None, seconds=time.perf_counter() - start)
+        return repaired
+
+    def __call__(self, messages: Sequence[AnyMessage]) -> AIMessage:
+        """The graph's fallback step."""
+        shape = self.policy.shape(self.aggregator(_generated(messages)))
+        if shape is None:
+            # no call to fix (e.g. the model answered without a tool call): ask again
+            return self.runnables[REGENERATE].invoke(messages)
+        decision = self.policy.choose(shape, (PATCH, REGENERATE))
+        start = time.perf_counter()
+        message = self.runnables[decision.strategy].invoke(messages)
+        seconds = None if message.response_metadata.get("cache_hit") else time.perf_counter() - start
+        if not message.tool_calls:
+            self.policy.record(decision, ok=False, seconds=seconds)
+            return message
+        with self._lock:
+            for tc in message.tool_calls:
+                self._pending[tc["id"]] = (decision, seconds)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+        return message
+
+    def observe(self, validator: Runnable) -> Runnable:
+        """Wrap the validator so the outcome of every pending decision is recorded."""
+
+        def _settle(messages: Sequence[AnyMessage], results: Sequence[AnyMessage]) -> None:
+            with self._lock:
+                settled = [
+                    self._pending.pop(tc["id"])
+                    for m in messages if m.type == "ai"
+                    for tc in m.tool_calls if tc["id"] in self._pending
+                ]
+            ok = not any(r.additional_kwargs.get("is_error") for r in results)
+            for decision, seconds in settled[:1]:
+                self.policy.record(decision, ok=ok, seconds=seconds)
+
+        def _validate(messages: Sequence[AnyMessage], config: RunnableConfig) -> Any:
+            results = validator.invoke(messages, config)
+            _settle(messages, results)
+            return results
+
+        async def _avalidate(messages: Sequence[AnyMessage], config: RunnableConfig) -> Any:
+            results = await validator.ainvoke(messages, config)
+            _settle(messages, results)
+            return results
+
+        return RunnableLambda(_validate, afunc=_avalidate, name="validator")
+
+
+def bind(
+        llm: BaseChatModel,
+        *,
+        tools: list,
+        tool_choice: Optional[str] = None,
+        max_attempts: int = 3,
+        validate_stream: bool = False,
+        repair: Optional[LocalRepair] = None,
+        policy: Optional[AdaptivePolicy] = None,
+        hedge: int = 1,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[GraphTelemetry] = None,
+        compact_schema: bool = False,
+        description_budget: Optional[int] = None,
+        format_error: Optional[ScopedSchemaErrors] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
+    """
+    Binds a language model to a set of tools, choosing the retry strategy per retry from the error shape.
+
+    Where `retry.bind` always regenerates and `patched.bind` always asks for a JSONPatch, every retry
+    here goes to local repair, a JSONPatch or a full regeneration, whichever the `AdaptivePolicy`
+    expects to give a valid call soonest for this tool and this share of failing fields. Patches and
+    regenerations are folded into the tool calls by a `PatchAggregator`.
+
+    Parameters
+    ----------
+    llm : BaseChatModel
+        The language model to be bound with tools.
+    tools : list
+        A list of tools to be bound with the language model.
+    tool_choice : Optional[str], optional
+        Specifies the selected tool if more than one exists. Default is None.
+    max_attempts : int
+        Maximum number of attempts (the first generation plus the retries). Default is 3.
+    validate_stream : bool
+        Validate tool-call arguments (and patches) while they stream in (see `pipeline/streaming.py`).
+        Default is False.
+    repair : Optional[LocalRepair]
+        Rule-based repair, one of the strategies the policy can pick. Default is None (never repair).
+    policy : Optional[AdaptivePolicy]
+        The policy making the decisions; share one between chains to pool their stats, read its
+        `stats` or give it a `log_path`. Default is a fresh AdaptivePolicy.
+    hedge : int
+        Candidate generations per attempt; the first one that validates wins. Default is 1.
+    hedge_delay : Optional[float]
+        Start the extra candidates one by one after this many seconds without an answer
+        instead of all at once. Default is None.
+    cache : Optional[ResponseCache]
+        On-disk response cache for the llm, patch and regeneration calls. Default is None.
+    telemetry : Optional[GraphTelemetry]
+        Collects per-node timing and retry metrics. Default is None.
+    compact_schema : bool
+        Send the token-compact tool schemas (`pipeline/schema.compact_tool`). Default is False.
+    description_budget : Optional[int]
+        With compact_schema, the token budget for field descriptions. Default is None (keep all).
+    format_error : Optional[ScopedSchemaErrors]
+        Formats validation errors for the correction prompt. Default is a fresh ScopedSchemaErrors.
+    checkpointer : Optional[BaseCheckpointSaver]
+        Durable State checkpoints for runs with a job id, so a rerun resumes
+        (`pipeline/checkpoint.SqliteCheckpointer`). Default is None.
+    Returns
+    -------
+    Runnable[Union[List[AnyMessage], PromptValue], AIMessage]
+        A callable object that integrates the bound language model, validator, and retry strategy.
+    """
+    bound_llm = llm.bind_tools(
+        compact_tools(tools, description_budget) if compact_schema else tools,
+        tool_choice=tool_choice,
+    )
+    patch_llm = llm.bind_tools(
+        compact_tools([PatchFunctionParameters], description_budget) if compact_schema else [PatchFunctionParameters]
+    )
+    stream_validator = StreamingToolCallValidator(tools + [PatchFunctionParameters], repair) if validate_stream else None
+
+    def _wrap(runnable: Runnable) -> Runnable:
+        wrapped = stream_validator.wrap(runnable) if stream_validator is not None else runnable
+        return cache.wrap(wrapped, source=runnable) if cache is not None else wrapped
+
+    aggregator = PatchAggregator(tools)
+    if telemetry is not None:
+        telemetry.track(aggregator)
+    adaptive = AdaptiveRetry(
+        policy or AdaptivePolicy(tools),
+        regenerate=_wrap(bound_llm),
+        patch=_wrap(patch_llm),
+        aggregator=aggregator,
+        repair=repair,
+    )
+    validator = ValidationNode(
+        tools + [PatchFunctionParameters],
+        format_error=aggregator.explaining(format_error or ScopedSchemaErrors()),
+    )
+    retry_strategy = RetryStrategy(
+        max_attempts=max_attempts,
+        fallback=adaptive,
+        aggregate_messages=aggregator,
+        repair=adaptive.repair if repair is not None else None,
+        hedge=hedge,
+        hedge_delay=hedge_delay,
+    )
+    return _bind_validator_with_retries(
+        bound_llm,
+        validator=adaptive.observe(validator),
+        retry_strategy=retry_strategy,
+        tool_choice=tool_choice,
+        stream_validator=stream_validator,
+        cache=cache,
+        telemetry=telemetry,
+        checkpointer=checkpointer,
+    ).with_config(metadata={"retry_strategy": "adaptive"})
@@ -0,0 +1,148 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessage, AnyMessage, message_to_dict, messages_from_dict)
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from pathlib import Path
+from typing import (Any, Dict, Optional, Sequence)
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("extraction")
+
+
+def _identity(runnable: Runnable) -> Optional[dict]:
+    """Model + bound kwargs (tools, tool_choice, ...) of a chat model runnable, or None if it isn't one."""
+    kwargs: Dict[str, Any] = {}
+    while hasattr(runnable, "bound") and hasattr(runnable, "kwargs"):
+        kwargs = {**runnable.kwargs, **kwargs}
+        runnable = runnable.bound
+    if not isinstance(runnable, BaseChatModel):
+        return None
+    params = {k: v for k, v in runnable._identifying_params.items() if k not in ("streaming", "stream_usage")}
+    return {"model": type(runnable).__name__, "params": params, "kwargs": kwargs}
+
+
+def _normalize(message: AnyMessage) -> dict:
+    """The parts of a message that reach the model (ids and metadata left out)."""
+    normalized = {"type": message.type, "content": message.content}
+    if getattr(message, "tool_calls", None):
+        normalized["tool_calls"] = [
+            {"name": tc["name"], "args": tc["args"], "id": tc["id"]} for tc in message.tool_calls
+        ]
+    if message.type == "tool":
+        normalized["tool_call_id"] = message.tool_call_id
+    return normalized
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of chat model responses (SQLite).
+
+    The key hashes the model and its settings, the bound tool schemas / tool_choice and the normalized
+    messages, so at temperature=0 a rerun over the same inputs (including the fallback / patch calls for
+    the same invalid outputs) is served from disk. The file is capped at `max_bytes` with LRU eviction;
+    `stats` reports hits and misses.
+    """
+
+    def __init__(self, path: str = ".cache/responses.sqlite", max_bytes: int = 256 * 1024 * 1024):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size}
+
+    @staticmethod
+    def key(identity: dict, messages: Sequence[AnyMessage]) -> str:
+        payload = json.dumps(
+            {**identity, "messages": [_normalize(m) for m in messages]},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        message = messages_from_dict([json.loads(row[0])])[0]
+        message.response_metadata["cache_hit"] = True
+        return message
+
+    def put(self, key: str, message: AIMessage) -> None:
+        value = json.dumps(message_to_dict(message)).encode()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._size += len(value) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is back under 90% of its cap."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.debug(f"Evicted {len(evicted)} cached responses")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._size = 0
+
+    def wrap(self, runnable: Runnable, source: Optional[Runnable] = None) -> Runnable:
+        """
+        Serve `runnable` from the cache. `source` is the chat model (binding) the key is derived from,
+        when `runnable` wraps it (e.g. a stream validator). Runnables that aren't chat models are returned as is.
+        """
+        identity = _identity(source if source is not None else runnable)
+        if identity is None:
+            return runnable
+
+        def _call(messages: Sequence[AnyMessage], config: RunnableConfig) -> AIMessage:
+            key = self.key(identity, messages)
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            message = runnable.invoke(messages, config)
+            self.put(key, message)
+            return message
+
+        async def _acall(messages: Sequence[AnyMessage], config: RunnableConfig) -> AIMessage:
+            key = self.key(identity, messages)
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            message = await runnable.ainvoke(messages, config)
+            self.put(key, message)
+            return message
+
+        return RunnableLambda(_call, afunc=_acall, name="CachedModel")
@@ -0,0 +1,336 @@
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    get_checkpoint_id,
+)
+from pathlib import Path
+from typing import (Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple)
+from collections import Counter
+import asyncio
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import zlib
+
+logger = logging.getLogger("extraction")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# serialized payloads above this size are zlib-compressed (the message history compresses ~4x)
+_COMPRESS_ABOVE = 512
+_STOP = object()
+
+
+def job_config(job_id: str, **config: Any) -> RunnableConfig:
+    """The run config that ties a chain invocation to `job_id`, so a rerun with the same id resumes it."""
+    return {**config, "configurable": {**config.get("configurable", {}), "thread_id": job_id}}
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """
+    Durable LangGraph checkpointer for the validation graph (local SQLite, WAL).
+
+    With it the graph saves its State (messages, attempt_number, initial_num_messages) after every node,
+    keyed by the run's job id (`thread_id`, see `job_config`). A rerun with the same job id resumes after the
+    last completed node instead of paying for the earlier generations and patches again (the graph checks
+    that the input is unchanged and deletes the job once it finishes, see `retry._bind_validator_with_retries`).
+
+    Writes are cheap on the hot path: `put` / `put_writes` only serialize (msgpack, zlib above 512 bytes)
+    and queue the rows; a background thread commits everything queued in one transaction every
+    `flush_interval` seconds. A crash loses at most that window, i.e. the resumed job redoes at most
+    the last node. A transaction that fails loses its rows too, so its error is raised again to the jobs
+    it held rows for (from their next `put` / `put_writes` / `get_tuple`) and to `flush()` callers.
+    Reading a job with queued rows flushes first. Only the latest `keep` checkpoints of a job are kept.
+    """
+
+    def __init__(self, path: str = ".cache/checkpoints.sqlite", flush_interval: float = 0.05, keep: int = 1, **kwargs: Any):
+        super().__init__(**kwargs)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.keep = keep
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._wake = threading.Event()
+        # job id -> rows queued but not committed yet, so reads of other jobs never wait on the writer
+        self._queued: Counter = Counter()
+        # job id -> the error of a failed commit that dropped some of its rows, until it's raised
+        self._failed: Dict[str, sqlite3.Error] = {}
+        self._stats = {"checkpoints": 0, "writes": 0, "commits": 0, "bytes": 0}
+        self._writer = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) > _COMPRESS_ABOVE:
+            return type_ + "+zlib", zlib.compress(data, 1)
+        return type_, data
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        if type_.endswith("+zlib"):
+            type_, data = type_[:-len("+zlib")], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is not _STOP and not isinstance(batch[0], threading.Event):
+                # let a node's worth of puts / writes pile up, then commit them together (a flush cuts it short)
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if isinstance(item, tuple)]
+            if rows:
+                self._commit(rows)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in batch):
+                return
+
+    def _commit(self, rows: List[tuple]) -> None:
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                for kind, params in rows:
+                    if kind == "checkpoint":
+                        self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", params)
+                        thread_id, checkpoint_ns = params[0], params[1]
+                        # keep the newest `keep` checkpoints of the job, and only their writes
+                        self._conn.execute(
+                            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+                            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                            "ORDER BY checkpoint_id DESC LIMIT ?)",
+                            (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep),
+                        )
+                        self._conn.execute(
+                            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+                            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                            (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                        )
+                    elif kind == "write":
+                        self._conn.execute("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", params)
+                    else:
+                        self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", params)
+                        self._conn.execute("DELETE FROM writes WHERE thread_id = ?", params)
+                self._conn.execute("COMMIT")
+                self._stats["commits"] += 1
+            except sqlite3.Error as e:
+                logger.exception(f"Could not save {len(rows)} checkpoint rows")
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self._failed.update((params[0], e) for kind, params in rows)
+            self._queued.subtract(params[0] for kind, params in rows if kind != "delete")
+            self._queued += Counter()
+
+    def _raise_failed(self, thread_id: Optional[str] = None) -> None:
+        """Raise the error of a failed commit: of `thread_id`'s rows, or of any job's if None."""
+        with self._lock:
+            if thread_id is not None:
+                error = self._failed.pop(thread_id, None)
+            else:
+                errors = list(self._failed.values())
+                self._failed.clear()
+                error = errors[0] if errors else None
+        if error is not None:
+            raise error
+
+    def _flush(self) -> None:
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        self._wake.set()
+        done.wait()
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed; raises if a commit failed since the last flush."""
+        self._flush()
+        self._raise_failed()
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._wake.set()
+            self._writer.join()
+
+    def put(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        self._raise_failed(thread_id)
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self._dump(checkpoint)
+        # "writes" repeats the node outputs that are already in the checkpoint
+        meta_type, meta = self._dump({k: v for k, v in metadata.items() if k != "writes"})
+        self._queue.put(("checkpoint", (
+            thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+            type_, data, meta_type, meta,
+        )))
+        with self._lock:
+            self._queued[thread_id] += 1
+            self._stats["checkpoints"] += 1
+            self._stats["bytes"] += len(data) + len(meta)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        self._raise_failed(configurable["thread_id"])
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            self._queue.put(("write", (
+                configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"],
+                task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path,
+            )))
+        with self._lock:
+            self._queued[configurable["thread_id"]] += len(writes)
+            self._stats["writes"] += len(writes)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._queue.put(("delete", (thread_id,)))
+        self._flush()
+        self._raise_failed(thread_id)
+
+    def _tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, data, meta_type, meta = row
+        with self._lock:
+            writes = self._conn.execute(
+                "SELECT task_id, channel, type, value FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self._load(type_, data),
+            metadata=self._load(meta_type, meta),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._load(t, v)) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        with self._lock:
+            pending = self._queued[configurable["thread_id"]] > 0
+        if pending:
+            self._flush()
+        self._raise_failed(configurable["thread_id"])
+        params: tuple = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        sql = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        if checkpoint_id := get_checkpoint_id(config):
+            sql += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+        return self._tuple(row) if row else None
+
+    def list(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush()
+        sql, clauses, params = "SELECT * FROM checkpoints", [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY checkpoint_id DESC", params).fetchall()
+        count = 0
+        for row in rows:
+            found = self._tuple(row)
+            if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield found
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for found in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield found
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # only serializes and queues, the commit happens on the writer thread
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,193 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessage, ToolCall)
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union)
+import logging
+
+from utils.transcript import format_turns, iter_chunks
+
+logger = logging.getLogger("extraction")
+
+Turn = Tuple[str, str]
+
+REDUCE_PROMPT = (
+    "Below are summaries of consecutive parts of one interview, in order. "
+    "Write a single overall summary of the whole interview in one paragraph. Respond with the summary only."
+)
+
+
+def _key(value: Any) -> str:
+    """Dedupe key for an OutputFormat-like dict or a plain string."""
+    if isinstance(value, dict):
+        value = value.get("content", "")
+    return " ".join(str(value).lower().split())
+
+
+def _unique(items: Iterable[Any], key: Callable[[Any], str]) -> List[Any]:
+    seen, kept = set(), []
+    for item in items:
+        k = key(item)
+        if k not in seen:
+            seen.add(k)
+            kept.append(item)
+    return kept
+
+
+def _merge_participants(partials: Sequence[dict]) -> List[dict]:
+    merged: Dict[str, dict] = {}
+    for member in (m for p in partials for m in p.get("participants", [])):
+        name = _key(member.get("name"))
+        if name not in merged:
+            merged[name] = {**member, "background_details": list(member.get("background_details", []))}
+            continue
+        known = merged[name]
+        for field in ("role", "age"):
+            if known.get(field) is None and member.get(field) is not None:
+                known[field] = member[field]
+        known["background_details"] = _unique(
+            known["background_details"] + list(member.get("background_details", [])),
+            key=lambda b: _key(b.get("factoid")),
+        )
+    return list(merged.values())
+
+
+def _merge_key_moments(partials: Sequence[dict]) -> List[dict]:
+    merged: Dict[str, dict] = {}
+    for moments in (km for p in partials for km in p.get("key_moments", [])):
+        topic = _key(moments.get("topic"))
+        if topic not in merged:
+            merged[topic] = {**moments}
+            continue
+        known = merged[topic]
+        for field in ("happy_moments", "tense_moments", "sad_moments"):
+            known[field] = _unique(known.get(field, []) + moments.get(field, []), key=lambda m: _key(m.get("quote")))
+        known["background_info"] = _unique(
+            known.get("background_info", []) + moments.get("background_info", []),
+            key=lambda b: _key(b.get("factoid")),
+        )
+        known["moments_summary"] = " ".join(
+            s for s in (known.get("moments_summary"), moments.get("moments_summary")) if s
+        )
+    return list(merged.values())
+
+
+def merge_summaries(partials: Sequence[dict]) -> dict:
+    """
+    Deterministically merge partial TranscriptSummary arguments, in transcript order.
+
+    Participants are deduped by name (role / age filled from the first chunk that has them, background
+    details unioned), key moments with the same topic are folded together, quotes / next steps / other
+    stuff are concatenated without duplicates and the metadata comes from the first chunk.
+    `overall_summary` is left as the chunk summaries joined together; `MapReduceExtractor` rewrites it.
+    """
+    if not partials:
+        raise ValueError("Nothing to merge: every chunk failed.")
+    return {
+        "metadata": partials[0].get("metadata"),
+        "participants": _merge_participants(partials),
+        "key_moments": _merge_key_moments(partials),
+        "insightful_quotes": _unique(
+            (q for p in partials for q in p.get("insightful_quotes", [])), key=lambda q: _key(q.get("quote"))
+        ),
+        "overall_summary": "\n".join(p["overall_summary"] for p in partials if p.get("overall_summary")),
+        "next_steps": _unique((s for p in partials for s in p.get("next_steps", [])), key=_key),
+        "other_stuff": _unique((o for p in partials for o in p.get("other_stuff", [])), key=_key),
+    }
+
+
+class _Reduction:
+    """The running merge of the partial summaries, folded in window by window in transcript order."""
+
+    def __init__(self, tool_name: str):
+        self.tool_name = tool_name
+        self.merged: Optional[dict] = None
+        self.summaries: List[str] = []
+        self.chunks = 0
+        self.error: Optional[Exception] = None
+
+    def add(self, results: Sequence[Union[AIMessage, Exception]]) -> None:
+        partials = []
+        for result in results:
+            self.chunks += 1
+            if isinstance(result, Exception):
+                logger.warning(f"Chunk {self.chunks - 1} failed: {result!r}")
+                self.error = self.error or result
+                continue
+            partials.extend(tc["args"] for tc in result.tool_calls if tc["name"] == self.tool_name)
+        if partials:
+            self.summaries.extend(p.get("overall_summary", "") for p in partials)
+            self.merged = merge_summaries(([self.merged] if self.merged is not None else []) + partials)
+
+    def result(self) -> dict:
+        if self.merged is None:
+            raise self.error or ValueError("Nothing to merge: no chunk returned a summary.")
+        logger.debug(f"Merged {len(self.summaries)} partial summaries from {self.chunks} chunk(s)")
+        return self.merged
+
+    def reduce_messages(self) -> list:
+        summaries = "\n\n".join(f"Part {i + 1}: {summary}" for i, summary in enumerate(self.summaries))
+        return [("system", REDUCE_PROMPT), ("user", summaries)]
+
+
+class MapReduceExtractor:
+    """
+    Chunked TranscriptSummary extraction for transcripts too long for one tool call.
+
+    The transcript is split on speaker-turn boundaries into chunks of at most `max_tokens`, and the chunks
+    are extracted through the chain's own validation graph (`batch` / `abatch`), `max_concurrency` at a
+    time. Each window of partial summaries is merged (`merge_summaries`) into the running result as it
+    arrives, so `turns` can be a stream (utils/loaders.py) that never sits in memory whole. One plain LLM
+    call then writes the `overall_summary`. Latency follows the size of a chunk instead of the whole
+    transcript. Chunks that fail are logged and left out; the call only raises when all of them fail.
+    """
+
+    def __init__(
+            self,
+            llm_chain,
+            llm: Optional[BaseChatModel] = None,
+            max_tokens: int = 6000,
+            max_concurrency: int = 8,
+            tool_name: str = "TranscriptSummary",
+    ):
+        self.llm_chain = llm_chain
+        self.llm = llm if llm is not None else llm_chain.llm
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.tool_name = tool_name
+
+    def _windows(self, turns: Iterable[Turn]) -> Iterator[List[dict]]:
+        """Chain inputs for the chunks of `turns`, `max_concurrency` at a time."""
+        window: List[dict] = []
+        for i, chunk in enumerate(iter_chunks(turns, self.max_tokens)):
+            window.append({
+                "messages": [(
+                    "user",
+                    f"Extract the summary from the following conversation (part {i + 1} of a longer one):"
+                    f"\n\n<convo>\n{format_turns(chunk)}\n</convo>",
+                )]
+            })
+            if len(window) == self.max_concurrency:
+                yield window
+                window = []
+        if window:
+            yield window
+
+    def _message(self, merged: dict) -> AIMessage:
+        return AIMessage(content="", tool_calls=[ToolCall(name=self.tool_name, args=merged, id="mapreduce")])
+
+    def invoke(self, turns: Iterable[Turn]) -> AIMessage:
+        reduction = _Reduction(self.tool_name)
+        for window in self._windows(turns):
+            reduction.add(self.llm_chain.batch(window, max_concurrency=self.max_concurrency))
+        merged = reduction.result()
+        if len(reduction.summaries) > 1:
+            merged["overall_summary"] = self.llm.invoke(reduction.reduce_messages()).content
+        return self._message(merged)
+
+    async def ainvoke(self, turns: Iterable[Turn]) -> AIMessage:
+        reduction = _Reduction(self.tool_name)
+        for window in self._windows(turns):
+            reduction.add(await self.llm_chain.abatch(window, max_concurrency=self.max_concurrency))
+        merged = reduction.result()
+        if len(reduction.summaries) > 1:
+            merged["overall_summary"] = (await self.llm.ainvoke(reduction.reduce_messages())).content
+        return self._message(merged)
@@ -2,22 +2,390 @@ from langchain_core.messages import (AIMessage, AnyMessage, ToolCall)
 from langchain_core.prompt_values import PromptValue
 from langchain_core.runnables import (Runnable, RunnableLambda)
 from langchain_core.language_models import BaseChatModel
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.prebuilt import ValidationNode
-from typing import (Any, Dict, List, Literal, Optional, Sequence, Type, Union)
-from pydantic import BaseModel, Field
+from typing import (Any, Callable, Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple, Type, Union)
+from collections import OrderedDict
+from functools import lru_cache
+from pydantic import BaseModel, Field, ValidationError
+import json
 import logging
+import threading
 
+from pipeline.cache import ResponseCache
+from pipeline.repair import LocalRepair
 from pipeline.retry import _bind_validator_with_retries, RetryStrategy
+from pipeline.schema import compact_tools, schema_excerpt, tool_schema_json
+from pipeline.streaming import StreamingToolCallValidator
+from pipeline.telemetry import GraphTelemetry
+from utils.tokens import count_tokens
 
 logger = logging.getLogger("extraction")
 
 
+def _full_schema_block(schema: Type[BaseModel]) -> str:
+    return f"Expected Parameter Schema:\n\n```json\n{tool_schema_json(schema)}\n```\n"
+
+
+@lru_cache(maxsize=None)
+def _full_schema_tokens(schema: Type[BaseModel], model: str) -> int:
+    return count_tokens(_full_schema_block(schema), model)
+
+
+class ScopedSchemaErrors:
+    """
+    `format_error` for the ValidationNode that only quotes the parts of the schema that failed.
+
+    Instead of the full tool schema, the correction prompt carries the resolved sub-schemas of the
+    JSON pointers pydantic reported. The full schema JSON is generated once per tool and only used
+    when the error has no locations. `stats` compares the prompt tokens against the full-schema prompt.
+    """
+
+    def __init__(self, model: str = "gpt-4o"):
+        self.model = model
+        self.errors = 0
+        self.full_schema_tokens = 0
+        self.scoped_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "errors": self.errors,
+            "full_schema_tokens": self.full_schema_tokens,
+            "scoped_tokens": self.scoped_tokens,
+            "saved_tokens": self.full_schema_tokens - self.scoped_tokens,
+        }
+
+    def __call__(self, error: BaseException, call: ToolCall, schema: Type[BaseModel]) -> str:
+        locs = [e["loc"] for e in error.errors()] if isinstance(error, ValidationError) else []
+        head = f"Error:\n\n```\n{repr(error)}\n```\n"
+        tail = f"Please respond with a JSONPatch to correct the error for tool_call_id=[{call['id']}]."
+        if locs:
+            excerpt = json.dumps(schema_excerpt(schema, locs), separators=(",", ":"))
+            body = f"Expected Parameter Schema (only the failing fields, keyed by JSON pointer):\n\n```json\n{excerpt}\n```\n"
+        else:
+            body = _full_schema_block(schema)
+        message = head + body + tail
+        before = count_tokens(head + tail, self.model) + _full_schema_tokens(schema, self.model)
+        after = count_tokens(message, self.model)
+        with self._lock:
+            self.errors += 1
+            self.full_schema_tokens += before
+            self.scoped_tokens += after
+        logger.debug(f"Correction prompt for {schema.__name__}: {after} tokens (full schema: {before})")
+        return message
+
+
+class JsonPatch(BaseModel):
+    """A JSON Patch document represents an operation to be performed on a JSON document.
+
+    Note that the op and path are ALWAYS required. Value is required for ALL operations except 'remove'.
+    Examples:
+
+    ```json
+    {"op": "add", "path": "/a/b/c", "patch_value": 1}
+    {"op": "replace", "path": "/a/b/c", "patch_value": 2}
+    {"op": "remove", "path": "/a/b/c"}
+    ```
+    """
+
+    op: Literal["add", "remove", "replace"] = Field(
+        ...,
+        description="The operation to be performed. Must be one of 'add', 'remove', 'replace'.", )
+    path: str = Field(
+        ...,
+        description="A JSON Pointer path that references a location within the target document where the operation is performed.",
+    )
+    value: Any = Field(
+        ...,
+        description="The value to be used within the operation. REQUIRED for 'add', 'replace', and 'test' operations.",
+    )
+
+
+class PatchFunctionParameters(BaseModel):
+    """Respond with all JSONPatch operation to correct validation errors caused by passing in incorrect or incomplete parameters in a previous tool call."""
+
+    tool_call_id: str = Field(
+        ...,
+        description="The ID of the original tool call that generated the error. Must NOT be an ID of a PatchFunctionParameters tool call.",
+    )
+    reasoning: str = Field(
+        ...,
+        description="Think step-by-step, listing each validation error and the"
+                    " JSONPatch operation needed to correct it. "
+                    "Cite the fields in the JSONSchema you referenced in developing this plan.",
+    )
+    patches: list[JsonPatch] = Field(
+        ...,
+        description="A list of JSONPatch operations to be applied to the previous tool call's response.",
+    )
+
+
+class PatchError(ValueError):
+    """A JSONPatch operation that can't be applied to the document."""
+
+
+def _pointer(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"{path!r} is not a JSON pointer (must start with '/')")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def _index(container: list, token: str, op: str) -> int:
+    if token == "-" and op == "add":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise PatchError(f"{token!r} is not an array index")
+    index = int(token)
+    if index > len(container) or (index == len(container) and op != "add"):
+        raise PatchError(f"index {index} is out of range (length {len(container)})")
+    return index
+
+
+def _apply_op(doc: Any, tokens: List[str], op: str, value: Any) -> Any:
+    """Apply one operation, copying only the containers on the path; everything else is shared with `doc`."""
+    if not tokens:
+        if op == "remove":
+            raise PatchError("can't remove the whole document")
+        return value
+    token, rest = tokens[0], tokens[1:]
+    if isinstance(doc, dict):
+        if rest or op != "add":
+            if token not in doc:
+                raise PatchError(f"member {token!r} not found")
+        copied = dict(doc)
+        if rest:
+            copied[token] = _apply_op(doc[token], rest, op, value)
+        elif op == "remove":
+            del copied[token]
+        else:
+            copied[token] = value
+        return copied
+    if isinstance(doc, list):
+        index = _index(doc, token, op if not rest else "replace")
+        copied = list(doc)
+        if rest:
+            copied[index] = _apply_op(doc[index], rest, op, value)
+        elif op == "add":
+            copied.insert(index, value)
+        elif op == "remove":
+            del copied[index]
+        else:
+            copied[index] = value
+        return copied
+    raise PatchError(f"can't descend into {type(doc).__name__} at {token!r}")
+
+
+def apply_patches(doc: Any, patches: Sequence[dict]) -> Any:
+    """
+    Apply JSONPatch add / remove / replace operations without touching `doc`.
+
+    Only the containers along each operation's path are copied, the rest of the new document is
+    shared with the old one, so a patch round costs O(path depth) instead of a copy of the whole
+    output. The patch is atomic: the first operation that can't be applied raises PatchError.
+    """
+    for number, patch in enumerate(patches):
+        if not isinstance(patch, dict) or patch.get("op") not in ("add", "remove", "replace"):
+            raise PatchError(f"operation {number}: expected an add / remove / replace operation, got {patch!r}")
+        try:
+            doc = _apply_op(doc, _pointer(str(patch.get("path", ""))), patch["op"], patch.get("value"))
+        except PatchError as e:
+            raise PatchError(f"operation {number} ({patch['op']} {patch.get('path')}): {e}") from None
+    return doc
+
+
+class _Resolved(NamedTuple):
+    ids: Tuple[str, ...]
+    content: Any
+    calls: Dict[str, ToolCall]
+    # earlier ids of a patched call -> its current id (the id of the last patch applied to it)
+    aliases: Dict[str, str]
+
+
+class PatchAggregator:
+    """
+    `aggregate_messages` for the JSONPatch strategy: folds the generated messages into the current tool calls.
+
+    The graph calls the aggregator with every message of the loop so far, several times per round (repair,
+    validator, hedged candidates, finalizer). Results are remembered per message-id prefix, so each call
+    only folds in the messages that are new since the longest known prefix; and patches are applied with
+    structural sharing (`apply_patches`), never by copying the whole arguments dict.
+
+    Every patch is dry-run before it is accepted. It is rejected (the call keeps its previous arguments)
+    when an operation can't be applied, when its `tool_call_id` isn't one of the calls being fixed, or when
+    the patched arguments fail `schema` validation with more errors than before. The rejection reason is
+    prepended to the next correction prompt (see `explain`), so the model learns why in the same round trip.
+    A patch may name the original call or any patch applied to it since; a new full tool call (a
+    regeneration) replaces the calls being fixed.
+    """
+
+    def __init__(self, schemas: Sequence[Type[BaseModel]], patch_tool: str = "PatchFunctionParameters", max_entries: int = 64):
+        self.schemas = {
+            schema.__name__: schema for schema in schemas if isinstance(schema, type) and issubclass(schema, BaseModel)
+        }
+        self.patch_tool = patch_tool
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Resolved]" = OrderedDict()
+        self._errors: List[Tuple[str, Any, int]] = []
+        self._rejections: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "reused_messages": 0, "folded_messages": 0, "applied": 0, "rejected": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def explain(self, tool_call_id: str) -> Optional[str]:
+        """Why the patch `tool_call_id` was rejected, if it was."""
+        with self._lock:
+            return self._rejections.get(tool_call_id)
+
+    def __call__(self, messages: Sequence[AnyMessage]) -> AIMessage:
+        ids = tuple(m.id or "" for m in messages)
+        start, resolved = 0, _Resolved((), "", {}, {})
+        with self._lock:
+            self._stats["calls"] += 1
+            for end in range(len(messages), 0, -1):
+                found = self._entries.get(ids[end - 1])
+                if found is not None and found.ids == ids[:end]:
+                    start, resolved = end, found
+                    self._entries.move_to_end(ids[end - 1])
+                    break
+            self._stats["reused_messages"] += start
+            self._stats["folded_messages"] += len(messages) - start
+        for i in range(start, len(messages)):
+            resolved = self._fold(resolved, messages[i])
+            if ids[i]:
+                resolved = resolved._replace(ids=ids[:i + 1])
+                self._remember(resolved)
+        return AIMessage(content=resolved.content, tool_calls=[ToolCall(**tc) for tc in resolved.calls.values()])
+
+    def explaining(self, format_error: Callable[[BaseException, ToolCall, Type[BaseModel]], str]) -> Callable:
+        """Wrap a ValidationNode `format_error` so the error of a rejected patch starts with the reason."""
+
+        def _format(error: BaseException, call: ToolCall, schema: Type[BaseModel]) -> str:
+            message = format_error(error, call, schema)
+            rejected = self.explain(call["id"])
+            if rejected is None:
+                return message
+            return f"Your JSONPatch was rejected and not applied: {rejected}\n\n" + message
+
+        return _format
+
+    def _remember(self, resolved: _Resolved) -> None:
+        with self._lock:
+            self._entries[resolved.ids[-1]] = resolved
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fold(self, resolved: _Resolved, message: AnyMessage) -> _Resolved:
+        if message.type != "ai":
+            return resolved
+        content = resolved.content or message.content
+        if message.additional_kwargs.get("local_repair"):
+            # a local repair carries the full, already patched tool calls
+            return _Resolved(resolved.ids, content, {tc["id"]: tc for tc in message.tool_calls}, {})
+        if not message.tool_calls:
+            return resolved._replace(content=content)
+        regenerated = [tc for tc in message.tool_calls if tc["name"] != self.patch_tool]
+        if regenerated:
+            # a regeneration replaces the calls being fixed
+            calls, aliases = {tc["id"]: tc for tc in regenerated}, {}
+        else:
+            calls, aliases = dict(resolved.calls), dict(resolved.aliases)
+        for tc in message.tool_calls:
+            if tc["name"] == self.patch_tool:
+                self._patch(calls, aliases, tc)
+        return _Resolved(resolved.ids, content, calls, aliases)
+
+    def _patch(self, calls: Dict[str, ToolCall], aliases: Dict[str, str], patch_call: ToolCall) -> None:
+        if not calls:
+            self._reject(patch_call, "there is no previous tool call to patch.")
+            return
+        target_id = patch_call["args"].get("tool_call_id")
+        target_id = aliases.get(target_id, target_id)
+        if target_id in calls:
+            target = calls.pop(target_id)
+            reason = None
+        else:
+            # keep the conversation well-formed: the first call answers for this patch, unchanged
+            target = calls.pop(next(iter(calls)))
+            reason = f"tool_call_id {patch_call['args'].get('tool_call_id')!r} is not one of the calls to fix {[target['id'], *calls]}."
+        args = target["args"]
+        if reason is None:
+            try:
+                patched = apply_patches(args, patch_call["args"].get("patches") or [])
+                reason = self._regression(target["name"], args, patched)
+                if reason is None:
+                    args = patched
+            except PatchError as e:
+                reason = f"{e}."
+        if reason is None:
+            with self._lock:
+                self._stats["applied"] += 1
+        else:
+            self._reject(patch_call, reason)
+        calls[patch_call["id"]] = ToolCall(name=target["name"], args=args, id=patch_call["id"])
+        for old, new in aliases.items():
+            if new == target["id"]:
+                aliases[old] = patch_call["id"]
+        aliases[target["id"]] = patch_call["id"]
+
+    def _reject(self, patch_call: ToolCall, reason: str) -> None:
+        logger.debug(f"Rejected JSONPatch {patch_call['id']}: {reason}")
+        with self._lock:
+            self._stats["rejected"] += 1
+            self._rejections[patch_call["id"]] = reason
+            while len(self._rejections) > self.max_entries:
+                self._rejections.popitem(last=False)
+
+    def _error_count(self, name: str, args: Any) -> int:
+        with self._lock:
+            for known_name, known_args, count in self._errors:
+                if known_name == name and known_args is args:
+                    return count
+        try:
+            self.schemas[name].model_validate(args)
+            count = 0
+        except ValidationError as e:
+            count = e.error_count()
+        except (TypeError, ValueError):
+            count = 1
+        with self._lock:
+            # the arguments being patched now, and the ones before them, are all that is worth keeping
+            self._errors = [(name, args, count), *self._errors[:1]]
+        return count
+
+    def _regression(self, name: str, before: Any, after: Any) -> Optional[str]:
+        if name not in self.schemas:
+            return None
+        errors_before, errors_after = self._error_count(name, before), self._error_count(name, after)
+        if errors_after > errors_before:
+            return f"the patched arguments have {errors_after} validation errors, {errors_before} before the patch."
+        return None
+
+
 def bind(
         llm: BaseChatModel,
         *,
         tools: list,
         tool_choice: Optional[str] = None,
         max_attempts: int = 3,
+        validate_stream: bool = False,
+        repair: Optional[LocalRepair] = None,
+        hedge: int = 1,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[GraphTelemetry] = None,
+        compact_schema: bool = False,
+        description_budget: Optional[int] = None,
+        format_error: Optional[ScopedSchemaErrors] = None,
+        aggregator: Optional[PatchAggregator] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
 ) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
     """
     Binds a language model to a set of tools with enhanced JSONPatch-based retry capabilities,
@@ -37,122 +405,70 @@ def bind(
         Specifies the selected tool if more than one exists. Default is None.
     max_attempts : int
         Maximum number of retry attempts for validation corrections. Default is 3.
-
+    validate_stream : bool
+        Validate tool-call arguments (and patches) while they stream in, cutting the generation short
+        at the first unrecoverable violation. Default is False.
+    repair : Optional[LocalRepair]
+        Rule-based repair tried before asking the LLM for a JSONPatch; its `stats` count the
+        retries that never reached the LLM. Default is None.
+    hedge : int
+        Candidate generations (or patches) per attempt; the first one that validates wins. Default is 1.
+    hedge_delay : Optional[float]
+        Start the extra candidates one by one after this many seconds without an answer
+        instead of all at once. Default is None.
+    cache : Optional[ResponseCache]
+        On-disk response cache for the llm and JSONPatch fallback calls. Default is None.
+    telemetry : Optional[GraphTelemetry]
+        Collects per-node timing and retry metrics. Default is None.
+    compact_schema : bool
+        Send the token-compact tool schemas (`pipeline/schema.compact_tool`). Default is False.
+    description_budget : Optional[int]
+        With compact_schema, the token budget for field descriptions. Default is None (keep all).
+    format_error : Optional[ScopedSchemaErrors]
+        Formats validation errors for the correction prompt (only the failing sub-schemas are quoted).
+        Pass one in to read its token `stats`. Default is a fresh ScopedSchemaErrors.
+    aggregator : Optional[PatchAggregator]
+        Folds the patches into the tool calls, dry-running each one first; pass one in to read its
+        `stats` (patches applied / rejected, messages reused). Default is a fresh PatchAggregator.
+    checkpointer : Optional[BaseCheckpointSaver]
+        Durable State checkpoints for runs with a job id, so a rerun resumes
+        (`pipeline/checkpoint.SqliteCheckpointer`). Default is None.
     Returns
     -------
     Runnable[Union[List[AnyMessage], PromptValue], AIMessage]
         A callable object that integrates the bound language model, validator, and retry strategy.
-
-    Raises
-    ------
-    ImportError
-        If the 'jsonpatch' library is not installed, which is required for JSONPatch-based retries.
     """
 
-    try:
-        # type: ignore[import-untyped]
-        import jsonpatch
-    except ImportError:
-        raise ImportError("The 'jsonpatch' library is required for JSONPatch-based retries.")
-
-    class JsonPatch(BaseModel):
-        """A JSON Patch document represents an operation to be performed on a JSON document.
-
-        Note that the op and path are ALWAYS required. Value is required for ALL operations except 'remove'.
-        Examples:
-
-        ```json
-        {"op": "add", "path": "/a/b/c", "patch_value": 1}
-        {"op": "replace", "path": "/a/b/c", "patch_value": 2}
-        {"op": "remove", "path": "/a/b/c"}
-        ```
-        """
-
-        op: Literal["add", "remove", "replace"] = Field(
-            ...,
-            description="The operation to be performed. Must be one of 'add', 'remove', 'replace'.", )
-        path: str = Field(
-            ...,
-            description="A JSON Pointer path that references a location within the target document where the operation is performed.",
-        )
-        value: Any = Field(
-            ...,
-            description="The value to be used within the operation. REQUIRED for 'add', 'replace', and 'test' operations.",
-        )
-
-    class PatchFunctionParameters(BaseModel):
-        """Respond with all JSONPatch operation to correct validation errors caused by passing in incorrect or incomplete parameters in a previous tool call."""
-
-        tool_call_id: str = Field(
-            ...,
-            description="The ID of the original tool call that generated the error. Must NOT be an ID of a PatchFunctionParameters tool call.",
-        )
-        reasoning: str = Field(
-            ...,
-            description="Think step-by-step, listing each validation error and the"
-                        " JSONPatch operation needed to correct it. "
-                        "Cite the fields in the JSONSchema you referenced in developing this plan.",
-        )
-        patches: list[JsonPatch] = Field(
-            ...,
-            description="A list of JSONPatch operations to be applied to the previous tool call's response.",
-        )
-
-    bound_llm = llm.bind_tools(tools, tool_choice=tool_choice)
-    fallback_llm = llm.bind_tools([PatchFunctionParameters])
-
-    def aggregate_messages(messages: Sequence[AnyMessage]) -> AIMessage:
-        # Get all the AI messages and apply json patches
-        resolved_tool_calls: Dict[Union[str, None], ToolCall] = {}
-        content: Union[str, List[Union[str, dict]]] = ""
-        for m in messages:
-            if m.type != "ai":
-                continue
-            if not content:
-                content = m.content
-            for tc in m.tool_calls:
-                if tc["name"] == PatchFunctionParameters.__name__:
-                    tcid = tc["args"]["tool_call_id"]
-                    if tcid not in resolved_tool_calls:
-                        logger.debug(
-                            f"JsonPatch tool call ID {tc['args']['tool_call_id']} not found."
-                            f"Valid tool call IDs: {list(resolved_tool_calls.keys())}"
-                        )
-                        tcid = next(iter(resolved_tool_calls.keys()), None)
-                    orig_tool_call = resolved_tool_calls[tcid]
-                    current_args = orig_tool_call["args"]
-                    patches = tc["args"].get("patches") or []
-                    orig_tool_call["args"] = jsonpatch.apply_patch(
-                        current_args,
-                        patches,
-                    )
-                    orig_tool_call["id"] = tc["id"]
-                else:
-                    resolved_tool_calls[tc["id"]] = tc.copy()
-        return AIMessage(
-            content=content,
-            tool_calls=list(resolved_tool_calls.values()),
-        )
-
-    def format_exception(error: BaseException, call: ToolCall, schema: Type[BaseModel]):
-        return (
-                f"Error:\n\n```\n{repr(error)}\n```\n"
-                "Expected Parameter Schema:\n\n" + f"```json\n{schema.schema_json()}\n```\n"
-                                                   f"Please respond with a JSONPatch to correct the error for tool_call_id=[{call['id']}]."
-        )
+    bound_llm = llm.bind_tools(
+        compact_tools(tools, description_budget) if compact_schema else tools,
+        tool_choice=tool_choice,
+    )
+    fallback_llm = llm.bind_tools(
+        compact_tools([PatchFunctionParameters], description_budget) if compact_schema else [PatchFunctionParameters]
+    )
 
+    aggregate_messages = aggregator or PatchAggregator(tools)
+    if telemetry is not None:
+        telemetry.track(aggregate_messages)
     validator = ValidationNode(
         tools + [PatchFunctionParameters],
-        format_error=format_exception,
+        format_error=aggregate_messages.explaining(format_error or ScopedSchemaErrors()),
     )
     retry_strategy = RetryStrategy(
         max_attempts=max_attempts,
         fallback=fallback_llm,
         aggregate_messages=aggregate_messages,
+        repair=repair,
+        hedge=hedge,
+        hedge_delay=hedge_delay,
     )
     return _bind_validator_with_retries(
         bound_llm,
         validator=validator,
         retry_strategy=retry_strategy,
         tool_choice=tool_choice,
+        stream_validator=StreamingToolCallValidator(tools + [PatchFunctionParameters], repair) if validate_stream else None,
+        cache=cache,
+        telemetry=telemetry,
+        checkpointer=checkpointer,
     ).with_config(metadata={"retry_strategy": "jsonpatch"})
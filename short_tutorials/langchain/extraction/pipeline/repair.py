@@ -0,0 +1,188 @@
+from copy import deepcopy
+from langchain_core.messages import (AIMessage, ToolCall)
+from typing import (Any, Dict, List, Optional, Sequence, Set, Tuple, Type, get_args)
+from pydantic import BaseModel, ValidationError
+import logging
+import re
+import threading
+
+from pipeline.schema import allows_null, branches, subschema
+
+logger = logging.getLogger("extraction")
+
+MISSING = object()
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+# pydantic error types the rules of LocalRepair cover
+_TO_OBJECT = ("model_type", "model_attributes_type", "dict_type")
+_TO_NUMBER = ("int_parsing", "int_from_float", "float_parsing")
+REPAIRABLE_ERRORS = frozenset(("missing", *_TO_OBJECT, *_TO_NUMBER, "string_type", "list_type"))
+
+
+def get_path(doc: Any, loc: Sequence[Any]) -> Any:
+    for part in loc:
+        try:
+            doc = doc[part]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+    return doc
+
+
+def _validated_fields(tools: Sequence[Type[BaseModel]]) -> Set[Tuple[str, str]]:
+    """(model name, field) of every field with its own field_validator, in `tools` and their nested models."""
+    fields: Set[Tuple[str, str]] = set()
+    seen: Set[type] = set()
+    todo = list(tools)
+    while todo:
+        model = todo.pop()
+        if not (isinstance(model, type) and issubclass(model, BaseModel)) or model in seen:
+            continue
+        seen.add(model)
+        for decorator in model.__pydantic_decorators__.field_validators.values():
+            fields.update((model.__name__, field) for field in decorator.info.fields)
+        for field in model.model_fields.values():
+            todo.append(field.annotation)
+            todo.extend(get_args(field.annotation))
+    return fields
+
+
+def set_path(doc: Any, loc: Sequence[Any], value: Any) -> bool:
+    parent = get_path(doc, loc[:-1])
+    if isinstance(parent, dict) and isinstance(loc[-1], str):
+        parent[loc[-1]] = value
+        return True
+    if isinstance(parent, list) and isinstance(loc[-1], int) and loc[-1] < len(parent):
+        parent[loc[-1]] = value
+        return True
+    return False
+
+
+class LocalRepair:
+    """
+    Rule-based repair of invalid tool calls, tried before paying for an LLM fallback round trip.
+
+    Every failing path reported by pydantic is matched against a handful of schema-driven coercions:
+
+    - a plain string where an object with a single required field, a string, is expected fills that field
+      (e.g. "Pete" -> {"name": "Pete"}); objects with more required fields aren't guessed, and neither is a
+      field with its own validator (e.g. the transcript check on `sources` / `quote`, see extractor.grounded)
+    - a string that is a number as a whole where an int / float is expected (-> that number); text around
+      the number ("born 1982, age 42", "mid 40s", "1,200") is left to the fallback, and a fractional number
+      is never rounded to an int
+    - a number / bool where a string is expected (7 -> "7")
+    - a single value where a list is expected (x -> [x])
+    - a missing field that is nullable in the schema (-> None)
+
+    The result is validated again locally; only when that still fails does the graph go to the fallback.
+    `stats` counts how many retries were handled without the LLM.
+    """
+
+    def __init__(self, tools: Sequence[Type[BaseModel]], max_rounds: int = 3):
+        self.tools: Dict[str, Type[BaseModel]] = {
+            tool.__name__: tool
+            for tool in tools
+            if isinstance(tool, type) and issubclass(tool, BaseModel)
+        }
+        self.schemas = {name: tool.model_json_schema() for name, tool in self.tools.items()}
+        self._validated = _validated_fields(list(self.tools.values()))
+        self.max_rounds = max_rounds
+        self.attempted = 0
+        self.repaired = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"attempted": self.attempted, "repaired": self.repaired, "sent_to_llm": self.attempted - self.repaired}
+
+    def __call__(self, message: AIMessage) -> Optional[AIMessage]:
+        """Return a repaired copy of `message` if every failing tool call could be fixed locally, else None."""
+        if not message.tool_calls:
+            return None
+        with self._lock:
+            self.attempted += 1
+        tool_calls: List[ToolCall] = []
+        for tc in message.tool_calls:
+            tool = self.tools.get(tc["name"])
+            if tool is None:
+                return None
+            args = self.repair_args(tool, tc["args"])
+            if args is None:
+                return None
+            tool_calls.append(ToolCall(name=tc["name"], args=args, id=tc["id"]))
+        with self._lock:
+            self.repaired += 1
+        logger.debug(f"Repaired tool call locally ({self.repaired}/{self.attempted} without the LLM)")
+        return AIMessage(
+            content=message.content,
+            tool_calls=tool_calls,
+            additional_kwargs={"local_repair": True},
+        )
+
+    def repair_args(self, tool: Type[BaseModel], args: dict) -> Optional[dict]:
+        """Coerce `args` until `tool` accepts them. Returns None if the rules run out first."""
+        root = self.schemas[tool.__name__]
+        args = deepcopy(args)
+        for _ in range(self.max_rounds):
+            try:
+                tool.model_validate(args)
+                return args
+            except ValidationError as e:
+                errors = e.errors()
+            if not all(self._fix(args, root, error) for error in errors):
+                return None
+        try:
+            tool.model_validate(args)
+            return args
+        except ValidationError:
+            return None
+
+    def _fix(self, args: dict, root: dict, error: dict) -> bool:
+        loc = error["loc"]
+        kind = error["type"]
+        value = get_path(args, loc)
+        if kind == "missing":
+            if value is MISSING and allows_null(subschema(root, loc), root):
+                return set_path(args, loc, None)
+            return False
+        if value is MISSING:
+            return False
+        fixed = self._coerce(kind, value, subschema(root, loc), root)
+        return fixed is not MISSING and set_path(args, loc, fixed)
+
+    _KIND_FOR_TYPE = {
+        "object": "model_type",
+        "array": "list_type",
+        "string": "string_type",
+        "integer": "int_parsing",
+        "number": "float_parsing",
+    }
+
+    def coercible(self, schema: Optional[dict], value: Any, root: dict) -> bool:
+        """Whether one of the rules above would turn `value` into something `schema` accepts."""
+        for branch in branches(schema, root):
+            kind = self._KIND_FOR_TYPE.get(branch.get("type"))
+            if kind and self._coerce(kind, value, schema, root) is not MISSING:
+                return True
+        return False
+
+    def _coerce(self, kind: str, value: Any, schema: Optional[dict], root: dict) -> Any:
+        if kind in _TO_OBJECT and isinstance(value, str):
+            for branch in branches(schema, root):
+                required = branch.get("required", [])
+                properties = branch.get("properties", {})
+                if (len(required) == 1 and properties.get(required[0], {}).get("type") == "string"
+                        and (branch.get("title"), required[0]) not in self._validated):
+                    return {required[0]: value}
+        elif kind in _TO_NUMBER:
+            match = _NUMBER.fullmatch(value.strip()) if isinstance(value, str) else None
+            number = float(match.group()) if match else value
+            if isinstance(number, (int, float)) and not isinstance(number, bool):
+                if kind == "float_parsing":
+                    return number
+                if float(number).is_integer():
+                    return int(number)
+        elif kind == "string_type" and isinstance(value, (int, float, bool)):
+            return str(value)
+        elif kind == "list_type" and value is not None:
+            return [value]
+        return MISSING
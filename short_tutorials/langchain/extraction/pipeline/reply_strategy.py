@@ -18,3 +18,10 @@ class RetryStrategy(TypedDict, total=False):
     ]
     """The function to use once validation fails."""
     aggregate_messages: Optional[Callable[[Sequence[AnyMessage]], AIMessage]]
+    """Collapse the generated messages into the final AI message (e.g. by applying JSON patches)."""
+    repair: Optional[Callable[[AIMessage], Optional[AIMessage]]]
+    """Local, LLM-free repair tried before the fallback. Returns None when it cannot fix the message."""
+    hedge: int
+    """Candidate generations per llm / fallback step; the first that validates wins (default 1, no hedging)."""
+    hedge_delay: Optional[float]
+    """Seconds to wait before starting each extra candidate. None starts all `hedge` candidates at once."""
@@ -1,16 +1,27 @@
+import asyncio
+import contextvars
+import hashlib
+import json
 import operator
+import threading
 import uuid
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import (AIMessage, AnyMessage, BaseMessage, HumanMessage)
+from langchain_core.messages import (AIMessage, AnyMessage, BaseMessage, HumanMessage, convert_to_messages)
 from langchain_core.prompt_values import PromptValue
-from langchain_core.runnables import (Runnable, RunnableLambda)
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ValidationNode
 from pydantic import BaseModel, Field, field_validator
-from typing import (Annotated, Callable, List, Literal, Optional, Sequence, Union)
+from typing import (Annotated, Any, Awaitable, Callable, List, Literal, Optional, Sequence, Union)
 from typing_extensions import TypedDict
+from pipeline.cache import ResponseCache
+from pipeline.repair import LocalRepair
 from pipeline.reply_strategy import RetryStrategy
+from pipeline.schema import compact_tools
+from pipeline.streaming import StreamingToolCallValidator
+from pipeline.telemetry import GraphTelemetry
 
 
 def _default_aggregator(messages: Sequence[AnyMessage]) -> AIMessage:
@@ -20,6 +31,99 @@ def _default_aggregator(messages: Sequence[AnyMessage]) -> AIMessage:
     raise ValueError("No AI message found in the sequence.")
 
 
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop (on a daemon thread) that runs hedged nodes of synchronous graph runs."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hedged-candidates", daemon=True).start()
+        return _loop
+
+
+async def _in_context(context: contextvars.Context, coroutine: Awaitable) -> Any:
+    # carry the caller's context variables (e.g. `extractor.grounded`) over to the loop thread
+    for var, value in context.items():
+        var.set(value)
+    return await coroutine
+
+
+class _Hedged:
+    """
+    Graph node that runs up to `n` candidate generations for one step and keeps the first that validates.
+
+    With `delay=None` all candidates start at once; otherwise a new candidate is only started each time
+    the previous ones run past the `delay` deadline. The remaining candidates are cancelled as soon as
+    one is accepted, which closes their in-flight requests; synchronous runs go through the same async
+    implementation on a background event loop, since a running thread can't be stopped. Every started
+    candidate counts as an attempt, and only the winner (or the last invalid candidate, if none
+    validated) is added to the state, together with its validation result so the validator node
+    doesn't validate it a second time.
+    """
+
+    def __init__(
+            self,
+            runnable: Runnable,
+            *,
+            n: int,
+            delay: Optional[float],
+            accept: Callable[[dict, AIMessage], Optional[list]],
+            max_attempts: int,
+    ):
+        self.runnable = runnable
+        self.n = n
+        self.delay = delay
+        self.accept = accept
+        self.max_attempts = max_attempts
+
+    def _budget(self, state: dict) -> int:
+        return max(1, min(self.n, self.max_attempts - state.get("attempt_number", 0)))
+
+    def __call__(self, state: dict, config: RunnableConfig) -> dict:
+        coroutine = _in_context(contextvars.copy_context(), self.acall(state, config))
+        future = asyncio.run_coroutine_threadsafe(coroutine, _background_loop())
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def acall(self, state: dict, config: RunnableConfig) -> dict:
+        budget = self._budget(state)
+        start = lambda: asyncio.ensure_future(self.runnable.ainvoke(state["messages"], config))
+        pending = {start() for _ in range(budget if self.delay is None else 1)}
+        started, last, validated, error = len(pending), None, None, None
+        try:
+            while pending:
+                timeout = self.delay if started < budget else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # deadline passed without an answer: hedge with one more candidate
+                    pending.add(start())
+                    started += 1
+                    continue
+                for task in done:
+                    try:
+                        candidate = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    last, validated = candidate, self.accept(state, candidate)
+                    if validated is not None and not any(m.additional_kwargs.get("is_error") for m in validated):
+                        return {"messages": [candidate], "attempt_number": started, "validated": validated}
+        finally:
+            # cancelling the tasks also closes their in-flight requests
+            for task in pending:
+                task.cancel()
+        if last is None:
+            raise error
+        return {"messages": [last], "attempt_number": started, "validated": validated}
+
+
 def _bind_validator_with_retries(
         llm: Union[
             Runnable[Sequence[AnyMessage], AIMessage],
@@ -29,6 +133,10 @@ def _bind_validator_with_retries(
         validator: ValidationNode,
         retry_strategy: RetryStrategy,
         tool_choice: Optional[str] = None,
+        stream_validator: Optional[StreamingToolCallValidator] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[GraphTelemetry] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
 ) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
     """
     Bind a validator with retries to process messages through an LLM and validator chain.
@@ -45,6 +153,20 @@ def _bind_validator_with_retries(
     tool_choice (Optional[str]):
         An optional tool name used within the validation phase to generate specific
         tool-related responses.
+    stream_validator (Optional[StreamingToolCallValidator]):
+        When set, the llm and fallback nodes stream their response and stop generating at the
+        first unrecoverable schema violation in the tool-call arguments, so the validator can
+        hand the partial call to the fallback without waiting for the rest of the output.
+    cache (Optional[ResponseCache]):
+        When set, the llm and fallback nodes are served from this on-disk response cache.
+    telemetry (Optional[GraphTelemetry]):
+        When set, every node is timed and attempts, validation errors, patches and tokens are recorded.
+    checkpointer (Optional[BaseCheckpointSaver]):
+        When set, runs with a job id (`thread_id` in the config, see `pipeline/checkpoint.job_config`)
+        save their State after every node, along with a hash of the input messages and tool schemas.
+        A rerun of an unfinished job with the same input resumes after the last completed node; when the
+        input changed, the job starts over. A job's checkpoints are deleted once it finishes successfully.
+        Runs without a job id aren't checkpointed.
 
     Returns:
     Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
@@ -61,6 +183,8 @@ def _bind_validator_with_retries(
             initial_num_messages: Holds the initial number of messages
                 before retrying.
             input_format: Tracks input format as either "list" or "dict".
+            validated: The validator output of a hedged candidate, if it was already validated.
+            input_hash: With a checkpointer, the hash of the input messages and tool schemas.
 
     Finalizer:
         A callable wrapper for aggregating generated messages at the final step.
@@ -86,14 +210,18 @@ def _bind_validator_with_retries(
         attempt_number: Annotated[int, operator.add]
         initial_num_messages: int
         input_format: Literal["list", "dict"]
+        validated: Optional[list]
+        input_hash: Optional[str]
 
     builder = StateGraph(State)
 
+    def add_node(name: str, node) -> None:
+        builder.add_node(name, telemetry.node(name, node) if telemetry is not None else node)
+
     def dedict(x: State) -> list:
         """Get the messages from the state."""
         return x["messages"]
 
-    model = dedict | llm | (lambda msg: {"messages": [msg], "attempt_number": 1})
     fbrunnable = retry_strategy.get("fallback")
     if fbrunnable is None:
         fb_runnable = llm
@@ -101,22 +229,54 @@ def _bind_validator_with_retries(
         fb_runnable = fbrunnable  # type: ignore
     else:
         fb_runnable = RunnableLambda(fbrunnable)
-    fallback = (
-            dedict | fb_runnable | (lambda msg: {"messages": [msg], "attempt_number": 1})
-    )
-
-    def count_messages(state: State) -> dict:
-        return {"initial_num_messages": len(state.get("messages", []))}
-
-    builder.add_node("count_messages", count_messages)
-    builder.add_node("llm", model)
-    builder.add_node("fallback", fallback)
+    raw_llm, raw_fb_runnable = llm, fb_runnable
+    if stream_validator is not None:
+        llm = stream_validator.wrap(llm)
+        if isinstance(fbrunnable, Runnable) or fbrunnable is None:
+            fb_runnable = stream_validator.wrap(fb_runnable)
+    if cache is not None:
+        llm = cache.wrap(llm, source=raw_llm)
+        fb_runnable = cache.wrap(fb_runnable, source=raw_fb_runnable)
 
     # To support patch-based retries, we need to be able to
     # aggregate the messages over multiple turns.
     # The next sequence selects only the relevant messages
     # and then applies the validator
     select_messages = retry_strategy.get("aggregate_messages") or _default_aggregator
+    max_attempts = retry_strategy.get("max_attempts", 3)
+    hedge = retry_strategy.get("hedge", 1)
+
+    def accept(state: State, candidate: AIMessage) -> Optional[list]:
+        """
+        Validate a hedged candidate as if it had been added to the state: the validator's messages,
+        or None if it can't be validated here (the validator node then reports it).
+        """
+        if not candidate.tool_calls:
+            return [] if tool_choice is None else None
+        generated = state["messages"][state["initial_num_messages"]:] + [candidate]
+        try:
+            return validator.invoke([select_messages(generated)])
+        except Exception:
+            # e.g. a patch that can't be applied; let the next candidate have a go
+            return None
+
+    def as_node(runnable: Runnable):
+        if hedge <= 1:
+            return dedict | runnable | (lambda msg: {"messages": [msg], "attempt_number": 1})
+        hedged = _Hedged(
+            runnable, n=hedge, delay=retry_strategy.get("hedge_delay"), accept=accept, max_attempts=max_attempts
+        )
+        return RunnableLambda(hedged, afunc=hedged.acall)
+
+    model = as_node(llm)
+    fallback = as_node(fb_runnable)
+
+    def count_messages(state: State) -> dict:
+        return {"initial_num_messages": len(state.get("messages", []))}
+
+    add_node("count_messages", count_messages)
+    add_node("llm", model)
+    add_node("fallback", fallback)
 
     def select_generated_messages(state: State) -> list:
         """Select only the messages generated within this loop."""
@@ -135,8 +295,20 @@ def _bind_validator_with_retries(
             }
         return {"messages": x}
 
-    validator_runnable = select_generated_messages | validator | endict_validator_output
-    builder.add_node("validator", validator_runnable)
+    def validate(state: State, config: RunnableConfig) -> dict:
+        # a hedged node already validated its candidate
+        validated = state.get("validated")
+        if validated is None:
+            validated = validator.invoke(select_generated_messages(state), config)
+        return {**endict_validator_output(validated), "validated": None}
+
+    async def avalidate(state: State, config: RunnableConfig) -> dict:
+        validated = state.get("validated")
+        if validated is None:
+            validated = await validator.ainvoke(select_generated_messages(state), config)
+        return {**endict_validator_output(validated), "validated": None}
+
+    add_node("validator", RunnableLambda(validate, afunc=avalidate))
 
     class Finalizer:
 
@@ -154,7 +326,7 @@ def _bind_validator_with_retries(
             }
 
     # We only want to emit the final message
-    builder.add_node("finalizer", Finalizer(retry_strategy.get("aggregate_messages")))
+    add_node("finalizer", Finalizer(retry_strategy.get("aggregate_messages")))
 
     # Define the connectivity
     builder.add_edge(START, "count_messages")
@@ -163,25 +335,54 @@ def _bind_validator_with_retries(
     def route_validator(state: State):
         if state["messages"][-1].tool_calls or tool_choice is not None:
             return "validator"
+        # a reply without a tool call ends the run here, never reaching the finalizer
+        if telemetry is not None:
+            telemetry.record_run(state["attempt_number"], ok=True)
         return END
 
     builder.add_conditional_edges("llm", route_validator, ["validator", END])
     builder.add_edge("fallback", "validator")
-    max_attempts = retry_strategy.get("max_attempts", 3)
+
+    # Optional local repair: cheap, rule-based fixes tried before paying for the fallback LLM call.
+    repair = retry_strategy.get("repair")
+
+    def repair_messages(state: State) -> dict:
+        selected = state["messages"][state["initial_num_messages"]:]
+        repaired = repair(select_messages(selected))
+        return {"messages": [repaired]} if repaired is not None else {}
+
+    def route_repair(state: State):
+        return "validator" if state["messages"][-1].type == "ai" else "fallback"
+
+    if repair is not None:
+        add_node("repair", repair_messages)
+        builder.add_conditional_edges("repair", route_repair, ["validator", "fallback"])
 
     def route_validation(state: State):
         if state["attempt_number"] > max_attempts:
+            if telemetry is not None:
+                telemetry.record_run(state["attempt_number"], ok=False)
             raise ValueError(
                 f"Could not extract a valid value in {max_attempts} attempts."
             )
+        failed = False
+        last_ai = None
         for m in state["messages"][::-1]:
             if m.type == "ai":
+                last_ai = m
                 break
             if m.additional_kwargs.get("is_error"):
-                return "fallback"
-        return "finalizer"
-
-    builder.add_conditional_edges("validator", route_validation, ["finalizer", "fallback"])
+                failed = True
+        if not failed:
+            return "finalizer"
+        # don't try to repair our own repair a second time
+        if repair is not None and not (last_ai and last_ai.additional_kwargs.get("local_repair")):
+            return "repair"
+        return "fallback"
+
+    builder.add_conditional_edges(
+        "validator", route_validation, ["finalizer", "fallback"] + (["repair"] if repair is not None else [])
+    )
 
     builder.add_edge("finalizer", END)
 
@@ -199,8 +400,87 @@ def _bind_validator_with_retries(
         """Ensure the output is in the expected format."""
         return x["messages"][-1]
 
+    graph = builder.compile()
+    if checkpointer is None:
+        # stream full states (not per-node updates) so `decode` also works for .stream() / .astream()
+        return ((encode |
+                 graph.bind(stream_mode="values").with_config(run_name="ValidationGraph")
+                 | decode)
+                .with_config(run_name="ValidateWithRetries"))
+
+    durable = builder.compile(checkpointer=checkpointer)
+    # a job id says which job this is, not what it's given: the hash ties the checkpoints to the input
+    schemas = json.dumps(
+        [
+            {
+                name: schema.model_json_schema() if isinstance(schema, type) and issubclass(schema, BaseModel)
+                else repr(schema)
+                for name, schema in getattr(validator, "schemas_by_name", {}).items()
+            },
+            getattr(raw_llm, "kwargs", {}).get("tools"),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+    def input_hash(messages: Sequence[AnyMessage]) -> str:
+        # message ids are left out: they're assigned per run
+        payload = [(m.type, m.content, m.name, getattr(m, "tool_calls", None) or []) for m in convert_to_messages(messages)]
+        digest = hashlib.sha256(schemas.encode())
+        digest.update(json.dumps(payload, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _job(config: RunnableConfig) -> Optional[str]:
+        return config.get("configurable", {}).get("thread_id")
+
+    def _stored(snapshot, state: dict) -> Literal["resume", "done", "stale", "new"]:
+        if not snapshot.values:
+            return "new"
+        if snapshot.values.get("input_hash") != state["input_hash"]:
+            # the transcript, prompt, window or tools changed since the job was checkpointed
+            return "stale"
+        return "resume" if snapshot.next else "done"
+
+    def run(state: dict, config: RunnableConfig) -> dict:
+        job = _job(config)
+        if job is None:
+            return graph.invoke(state, config)
+        state = {**state, "input_hash": input_hash(state["messages"])}
+        snapshot = durable.get_state(config)
+        stored = _stored(snapshot, state)
+        if stored == "resume":
+            # interrupted mid-run: continue from the last checkpoint
+            result = durable.invoke(None, config)
+        elif stored == "done":
+            # finished, but the checkpoints weren't deleted yet
+            result = snapshot.values
+        else:
+            if stored == "stale":
+                checkpointer.delete_thread(job)
+            result = durable.invoke(state, config)
+        checkpointer.delete_thread(job)
+        return result
+
+    async def arun(state: dict, config: RunnableConfig) -> dict:
+        job = _job(config)
+        if job is None:
+            return await graph.ainvoke(state, config)
+        state = {**state, "input_hash": input_hash(state["messages"])}
+        snapshot = await durable.aget_state(config)
+        stored = _stored(snapshot, state)
+        if stored == "resume":
+            result = await durable.ainvoke(None, config)
+        elif stored == "done":
+            result = snapshot.values
+        else:
+            if stored == "stale":
+                await checkpointer.adelete_thread(job)
+            result = await durable.ainvoke(state, config)
+        await checkpointer.adelete_thread(job)
+        return result
+
     return ((encode |
-             builder.compile().with_config(run_name="ValidationGraph")
+             RunnableLambda(run, afunc=arun, name="ValidationGraph")
              | decode)
             .with_config(run_name="ValidateWithRetries"))
 
@@ -224,7 +504,16 @@ def bind(
         llm: BaseChatModel, *,
         tools: list,
         tool_choice: Optional[str] = None,
-        max_attempts: int = 3) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
+        max_attempts: int = 3,
+        validate_stream: bool = False,
+        repair: Optional[LocalRepair] = None,
+        hedge: int = 1,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[GraphTelemetry] = None,
+        compact_schema: bool = False,
+        description_budget: Optional[int] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
     """
         Binds an LLM (Language Learning Model) with a set of tools and establishes a retry mechanism
         and validation logic for executing tasks. This function connects tools to the LLM while
@@ -235,13 +524,29 @@ def bind(
         tools (list): A list of tools to associate with the LLM for task execution.
         tool_choice (Optional[str]): Identifier or selection rule for tool usage, if any. Default is None.
         max_attempts (int): Maximum number of retry attempts for executing tasks. Default is 3.
+        validate_stream (bool): Validate tool-call arguments while they stream in and cut the generation
+            short at the first unrecoverable violation. Default is False.
+        repair (Optional[LocalRepair]): Rule-based repair tried before each regeneration; its `stats`
+            count the retries that never reached the LLM. Default is None.
+        hedge (int): Candidate generations per attempt; the first one that validates wins. Default is 1.
+        hedge_delay (Optional[float]): Start the extra candidates one by one after this many seconds
+            without an answer instead of all at once. Default is None.
+        cache (Optional[ResponseCache]): On-disk response cache for the llm and fallback calls. Default is None.
+        telemetry (Optional[GraphTelemetry]): Collects per-node timing and retry metrics. Default is None.
+        compact_schema (bool): Send the token-compact tool schemas (`pipeline/schema.compact_tool`). Default is False.
+        description_budget (Optional[int]): With compact_schema, the token budget for field descriptions. Default is None (keep all).
+        checkpointer (Optional[BaseCheckpointSaver]): Durable State checkpoints for runs with a job id, so a rerun
+            resumes (`pipeline/checkpoint.SqliteCheckpointer`). Default is None.
 
         Returns:
         Runnable[Union[List[AnyMessage], PromptValue], AIMessage]: A configured runnable object that
         integrates the LLM with the specified tools, retry strategy, and validation logic.
     """
-    bound_llm = llm.bind_tools(tools, tool_choice=tool_choice)
-    retry_strategy = RetryStrategy(max_attempts=max_attempts)
+    bound_llm = llm.bind_tools(
+        compact_tools(tools, description_budget) if compact_schema else tools,
+        tool_choice=tool_choice,
+    )
+    retry_strategy = RetryStrategy(max_attempts=max_attempts, repair=repair, hedge=hedge, hedge_delay=hedge_delay)
     validator = ValidationNode(tools)
 
     return _bind_validator_with_retries(
@@ -249,4 +554,8 @@ def bind(
         validator=validator,
         tool_choice=tool_choice,
         retry_strategy=retry_strategy,
+        stream_validator=StreamingToolCallValidator(tools, repair) if validate_stream else None,
+        cache=cache,
+        telemetry=telemetry,
+        checkpointer=checkpointer,
     ).with_config(metadata={"retry_strategy": "default"})
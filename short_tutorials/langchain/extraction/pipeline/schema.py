@@ -0,0 +1,247 @@
+from functools import lru_cache
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+from typing import (Any, Dict, List, Optional, Sequence, Type, get_args)
+import json
+import logging
+
+from utils.tokens import count_tokens
+
+logger = logging.getLogger("extraction")
+
+# Caches keyed by tool class are bounded: the chains mint new pydantic classes per bind (and targeted
+# regeneration builds wrapper models), so an unbounded cache would keep every one of them alive.
+_CACHE_SIZE = 256
+
+
+def resolve_ref(schema: Optional[dict], root: dict) -> Optional[dict]:
+    """Follow local `$ref`s (pydantic puts nested models under `$defs`)."""
+    while schema and "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        schema = root.get("$defs", {}).get(name)
+    return schema
+
+
+def branches(schema: Optional[dict], root: dict) -> List[dict]:
+    """Flatten `anyOf` / `oneOf` into the list of concrete schemas a value may match."""
+    schema = resolve_ref(schema, root)
+    if not schema:
+        return []
+    options = schema.get("anyOf") or schema.get("oneOf")
+    if not options:
+        return [schema]
+    return [b for option in options for b in branches(option, root)]
+
+
+def subschema(root: dict, loc: Sequence[Any]) -> Optional[dict]:
+    """
+    Walk a pydantic error location (or JSON pointer parts) down the schema.
+    Returns the schema of the value at `loc`, or None once the path leaves the schema.
+    """
+    schema: Optional[dict] = root
+    for part in loc:
+        following = None
+        for branch in branches(schema, root):
+            if isinstance(part, int) and isinstance(branch.get("items"), dict):
+                following = branch["items"]
+            elif isinstance(part, str) and part in branch.get("properties", {}):
+                following = branch["properties"][part]
+            if following is not None:
+                break
+        if following is None:
+            return None
+        schema = following
+    return schema
+
+
+def allows_null(schema: Optional[dict], root: dict) -> bool:
+    return any(b.get("type") == "null" for b in branches(schema, root))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def tool_schema(tool: Type[BaseModel]) -> dict:
+    """The JSON schema of a tool, generated once per class (treat the result as read-only)."""
+    return tool.model_json_schema()
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def tool_schema_json(tool: Type[BaseModel]) -> str:
+    """Same as the (deprecated) `tool.schema_json()`, but only computed once per class."""
+    return json.dumps(tool_schema(tool), indent=2)
+
+
+def inline_refs(schema: Any, root: dict, depth: int = 8) -> Any:
+    """Copy of `schema` with every local `$ref` replaced by its definition (recursive models stop at `depth`)."""
+    if isinstance(schema, list):
+        return [inline_refs(s, root, depth) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        if depth == 0:
+            return {"type": "object"}
+        return inline_refs(resolve_ref(schema, root), root, depth - 1)
+    return {k: inline_refs(v, root, depth) for k, v in schema.items() if k != "$defs"}
+
+
+def pointer(loc: Sequence[Any]) -> str:
+    return "/" + "/".join(str(part).replace("~", "~0").replace("/", "~1") for part in loc)
+
+
+def schema_excerpt(tool: Type[BaseModel], locs: Sequence[Sequence[Any]]) -> Dict[str, Any]:
+    """
+    The resolved sub-schemas for the given error locations, keyed by JSON pointer.
+    A location that leaves the schema (e.g. an unknown key) falls back to its closest known parent,
+    and locations nested in another reported location are dropped.
+    """
+    root = tool_schema(tool)
+    excerpt: Dict[str, Any] = {}
+    for loc in sorted({tuple(loc) for loc in locs}, key=len):
+        loc = list(loc)
+        sub = subschema(root, loc)
+        while sub is None and loc:
+            loc.pop()
+            sub = subschema(root, loc)
+        key = pointer(loc)
+        if any(key == k or key.startswith(k.rstrip("/") + "/") for k in excerpt):
+            continue
+        excerpt[key] = inline_refs(sub, root)
+    return excerpt
+
+
+_SUBSCHEMA_MAPS = ("properties", "$defs", "patternProperties")
+_SUBSCHEMA_LISTS = ("anyOf", "oneOf", "allOf", "prefixItems")
+_SUBSCHEMA_VALUES = ("items", "additionalProperties", "not")
+
+
+def _walk(schema: Any, fn) -> Any:
+    """Copy of `schema` with `fn` applied to every (sub)schema node, leaving property names alone."""
+    if not isinstance(schema, dict):
+        return schema
+    node = {}
+    for k, v in fn(schema).items():
+        if k in _SUBSCHEMA_MAPS and isinstance(v, dict):
+            node[k] = {name: _walk(sub, fn) for name, sub in v.items()}
+        elif k in _SUBSCHEMA_LISTS and isinstance(v, list):
+            node[k] = [_walk(sub, fn) for sub in v]
+        elif k in _SUBSCHEMA_VALUES:
+            node[k] = _walk(v, fn)
+        else:
+            node[k] = v
+    return node
+
+
+def _structure(schema: Any) -> Any:
+    """The validation-relevant part of a schema (annotations like title / description dropped)."""
+    return _walk(schema, lambda s: {k: v for k, v in s.items() if k not in ("title", "description")})
+
+
+def _check_fields(tool: Type[BaseModel], compact: dict) -> None:
+    """
+    Raise if `compact` lost or changed a field of `tool` (or of its nested models): the same properties, the
+    same required fields as the models declare, and each property, with its references resolved, the same as
+    in `tool.model_json_schema()` up to titles and descriptions.
+
+    `compact` is derived from that same schema, so this only guards the compaction code (`compact_tool`)
+    against dropping or rewriting something it shouldn't. It is not a proof that the compact schema accepts
+    the same inputs as the models: whatever pydantic validates beyond its JSON schema (validators, custom
+    types) isn't in either schema.
+    """
+    original = tool_schema(tool)
+    seen, todo = set(), [tool]
+    while todo:
+        model = todo.pop()
+        if not (isinstance(model, type) and issubclass(model, BaseModel)) or model in seen:
+            continue
+        seen.add(model)
+        if model is tool:
+            before, after = original, compact
+        else:
+            before = original.get("$defs", {}).get(model.__name__)
+            after = compact.get("$defs", {}).get(model.__name__)
+        if before is None:
+            # pydantic named the definition differently (e.g. a generic model); nothing to compare with
+            continue
+        fields = {field.alias or name: field for name, field in model.model_fields.items()}
+        properties = (after or {}).get("properties", {})
+        required = {name for name, field in fields.items() if field.is_required()}
+        if after is None or set(properties) != set(fields) or set(after.get("required", [])) != required:
+            raise ValueError(f"Compacting the {tool.__name__} schema changed the fields of {model.__name__}.")
+        for name in fields:
+            if _structure(inline_refs(properties[name], compact)) != \
+                    _structure(inline_refs(before["properties"][name], original)):
+                raise ValueError(f"Compacting the {tool.__name__} schema changed what {model.__name__}.{name} validates.")
+        for field in model.model_fields.values():
+            todo.append(field.annotation)
+            todo.extend(get_args(field.annotation))
+
+
+def _kept_descriptions(descriptions: List[str], budget: int) -> set:
+    """Whole descriptions that fit in `budget` tokens, shortest first (a cut-off description says little)."""
+    kept, used = set(), 0
+    for text in sorted(set(descriptions), key=lambda d: (count_tokens(d), d)):
+        cost = count_tokens(text) * descriptions.count(text)
+        if used + cost > budget:
+            break
+        kept.add(text)
+        used += cost
+    return kept
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def compact_tool(tool: Type[BaseModel], description_budget: Optional[int] = None) -> dict:
+    """
+    OpenAI tool definition for `tool` that spends fewer prompt tokens than `bind_tools([tool])`.
+
+    `bind_tools` inlines every nested model, so the OutputFormat / Moment / BackgroundInfo schemas and
+    their descriptions are repeated wherever they're used. Here nested models stay under `$defs` and
+    are referenced, titles are dropped, and when `description_budget` (tokens) is set only the
+    descriptions that fit in it are kept, shortest first. Validation keywords are left
+    untouched, which `_check_fields` checks against the pydantic schema (a check of this compaction,
+    not a proof that the models accept the same inputs). Cached per (class, budget); treat the
+    result as read-only.
+    """
+    schema = _walk(tool_schema(tool), lambda node: {k: v for k, v in node.items() if k != "title"})
+    # the tool's own description (its docstring) is always kept
+    description = schema.pop("description", "")
+    if description_budget is not None:
+        descriptions: List[str] = []
+
+        def collect(node: dict) -> dict:
+            if "description" in node:
+                descriptions.append(node["description"])
+            return node
+
+        _walk(schema, collect)
+        kept = _kept_descriptions(descriptions, description_budget)
+        schema = _walk(schema, lambda node: {k: v for k, v in node.items() if k != "description" or v in kept})
+    _check_fields(tool, schema)
+    return {
+        "type": "function",
+        "function": {"name": tool.__name__, "description": description, "parameters": schema},
+    }
+
+
+def compact_tools(tools: Sequence[Any], description_budget: Optional[int] = None) -> list:
+    """
+    `compact_tool` for every pydantic tool in `tools` (anything else is passed to `bind_tools` as is).
+    Logs the prompt tokens saved on every request that carries these tools.
+    """
+    compacted = []
+    for tool in tools:
+        if isinstance(tool, type) and issubclass(tool, BaseModel):
+            savings = schema_savings(tool, description_budget)
+            logger.debug(
+                f"{tool.__name__} schema: {savings['default_tokens']} -> {savings['compact_tokens']} tokens"
+                f" ({savings['saved_tokens']} saved per request)"
+            )
+            tool = compact_tool(tool, description_budget)
+        compacted.append(tool)
+    return compacted
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def schema_savings(tool: Type[BaseModel], description_budget: Optional[int] = None) -> Dict[str, int]:
+    """Prompt tokens of the tool definition per request: what `bind_tools` sends vs `compact_tool`."""
+    default = count_tokens(json.dumps(convert_to_openai_tool(tool), separators=(",", ":")))
+    compact = count_tokens(json.dumps(compact_tool(tool, description_budget), separators=(",", ":")))
+    return {"default_tokens": default, "compact_tokens": compact, "saved_tokens": default - compact}
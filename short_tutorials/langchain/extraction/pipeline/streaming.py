@@ -0,0 +1,346 @@
+from contextlib import closing
+from langchain_core.messages import (AIMessage, AIMessageChunk, AnyMessage, ToolCall, message_chunk_to_message)
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Type)
+from pydantic import BaseModel
+import json
+import logging
+
+from pipeline.repair import LocalRepair
+from pipeline.schema import branches
+
+logger = logging.getLogger("extraction")
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamViolation(Exception):
+    """Raised by the incremental parser as soon as the streamed arguments can no longer validate."""
+
+    def __init__(self, path: Tuple[Any, ...], reason: str):
+        self.path = path
+        self.reason = reason
+        pointer = "/" + "/".join(str(p) for p in path)
+        super().__init__(f"{pointer}: {reason}")
+
+
+def _value_kind(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    return "array"
+
+
+def _accepts(schema: dict, value: Any) -> bool:
+    """
+    Whether pydantic (lax mode) could still accept `value` for `schema`.
+    Only the coercions pydantic really refuses count as a violation, e.g. a number for a `str`
+    field, a string for a nested model or a scalar for a list. "42" for an int is fine.
+    """
+    expected = schema.get("type")
+    if expected is None:
+        return True
+    expected = expected if isinstance(expected, list) else [expected]
+    kind = _value_kind(value)
+    for e in expected:
+        if e == kind or (e == "number" and kind == "integer"):
+            return True
+        if e == "integer" and kind == "number" and float(value).is_integer():
+            return True
+        if e in ("integer", "number") and kind == "boolean":
+            return True
+        if e in ("integer", "number") and kind == "string":
+            try:
+                number = float(value.strip())
+            except ValueError:
+                continue
+            if e == "number" or number.is_integer():
+                return True
+        if e == "boolean" and kind in ("string", "integer", "number"):
+            return True
+    return False
+
+
+class _Frame:
+    __slots__ = ("container", "schema", "path", "key", "seen")
+
+    def __init__(self, container, schema: Optional[dict], path: Tuple[Any, ...]):
+        self.container = container
+        self.schema = schema
+        self.path = path
+        self.key: Optional[str] = None
+        self.seen: Set[str] = set()
+
+
+class IncrementalArgsParser:
+    """
+    Incremental JSON parser for one tool call's `args` stream, checked against a JSON schema.
+
+    Feed it the raw argument fragments as they arrive. The value is built up in place
+    (`snapshot()` returns it at any point) and a `StreamViolation` is raised on the first
+    unrecoverable problem: a value of the wrong type, an unknown key when the schema forbids
+    extra keys, or a required key still missing when its object closes.
+
+    `tolerate(schema, value, root)` can whitelist mismatches that are fixed later anyway
+    (e.g. by `LocalRepair`), so those don't cut the stream short.
+    """
+
+    def __init__(self, schema: dict, tolerate: Optional[Callable[[Optional[dict], Any, dict], bool]] = None):
+        self._root_schema = schema
+        self._tolerate = tolerate
+        self._stack: List[_Frame] = []
+        self._root: Any = None
+        self._expect = "value"
+        self._token: Optional[List[str]] = None
+        self._in_string = False
+        self._escape = False
+        self._is_key = False
+
+    def snapshot(self) -> Any:
+        return self._root
+
+    def feed(self, text: str) -> None:
+        for ch in text:
+            if self._in_string:
+                self._feed_string(ch)
+            elif self._token is not None and ch not in ",]}" and ch not in _WHITESPACE:
+                self._token.append(ch)
+            else:
+                if self._token is not None:
+                    self._close_literal()
+                self._feed_structural(ch)
+
+    def _feed_string(self, ch: str) -> None:
+        if self._escape:
+            self._escape = False
+        elif ch == "\\":
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            value = json.loads('"' + "".join(self._token) + '"')
+            self._token = None
+            if self._is_key:
+                self._accept_key(value)
+            else:
+                self._accept_scalar(value)
+            return
+        self._token.append(ch)
+
+    def _feed_structural(self, ch: str) -> None:
+        if ch in _WHITESPACE:
+            return
+        expect = self._expect
+        if ch == '"' and expect in ("key", "key_or_end"):
+            self._in_string, self._is_key, self._token = True, True, []
+        elif ch == ":" and expect == "colon":
+            self._expect = "value"
+        elif ch == "," and expect == "comma_or_end":
+            self._expect = "key" if isinstance(self._stack[-1].container, dict) else "value"
+        elif ch == "}" and expect in ("key_or_end", "comma_or_end") and isinstance(self._stack[-1].container, dict):
+            self._close_object()
+        elif ch == "]" and expect in ("value_or_end", "comma_or_end") and isinstance(self._stack[-1].container, list):
+            self._stack.pop()
+            self._after_value()
+        elif expect in ("value", "value_or_end"):
+            if ch == "{":
+                self._open({})
+                self._expect = "key_or_end"
+            elif ch == "[":
+                self._open([])
+                self._expect = "value_or_end"
+            elif ch == '"':
+                self._in_string, self._is_key, self._token = True, False, []
+            else:
+                self._token = [ch]
+        else:
+            raise StreamViolation(self._path(), f"malformed JSON at {ch!r}")
+
+    def _path(self) -> Tuple[Any, ...]:
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict):
+            return frame.path + ((frame.key,) if frame.key is not None else ())
+        return frame.path + (len(frame.container),)
+
+    def _slot_schema(self) -> Optional[dict]:
+        """Schema of the value that is about to be parsed."""
+        if not self._stack:
+            return self._root_schema
+        frame = self._stack[-1]
+        if frame.schema is None:
+            return None
+        if isinstance(frame.container, dict):
+            properties = frame.schema.get("properties", {})
+            if frame.key in properties:
+                return properties[frame.key]
+            extra = frame.schema.get("additionalProperties")
+            return extra if isinstance(extra, dict) else None
+        items = frame.schema.get("items")
+        return items if isinstance(items, dict) else None
+
+    def _check(self, value: Any, path: Tuple[Any, ...]) -> Optional[dict]:
+        """Raise if `value` can't match the current slot; return the matching branch for containers."""
+        slot = self._slot_schema()
+        options = branches(slot, self._root_schema)
+        if not options:
+            return None
+        for branch in options:
+            if _accepts(branch, value):
+                return branch
+        if self._tolerate is not None and self._tolerate(slot, value, self._root_schema):
+            return None
+        expected = sorted({str(b.get("type")) for b in options})
+        raise StreamViolation(path, f"expected {' or '.join(expected)}, got {_value_kind(value)}")
+
+    def _insert(self, value: Any) -> None:
+        if not self._stack:
+            self._root = value
+            return
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+
+    def _open(self, container) -> None:
+        path = self._path()
+        self._insert(container)
+        branch = self._check(container, path)
+        self._stack.append(_Frame(container, branch, path))
+
+    def _accept_key(self, key: str) -> None:
+        frame = self._stack[-1]
+        schema = frame.schema or {}
+        if schema.get("additionalProperties") is False and key not in schema.get("properties", {}):
+            raise StreamViolation(frame.path + (key,), "unknown key")
+        frame.key = key
+        frame.seen.add(key)
+        self._expect = "colon"
+
+    def _accept_scalar(self, value: Any) -> None:
+        path = self._path()
+        self._insert(value)
+        self._check(value, path)
+        self._after_value()
+
+    def _close_literal(self) -> None:
+        raw = "".join(self._token)
+        self._token = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            raise StreamViolation(self._path(), f"malformed JSON literal {raw!r}")
+        self._accept_scalar(value)
+
+    def _close_object(self) -> None:
+        frame = self._stack.pop()
+        missing = [k for k in (frame.schema or {}).get("required", []) if k not in frame.seen]
+        if missing:
+            raise StreamViolation(frame.path, f"missing required key(s) {missing}")
+        self._after_value()
+
+    def _after_value(self) -> None:
+        self._expect = "comma_or_end" if self._stack else "done"
+
+
+class StreamingToolCallValidator:
+    """
+    Validates streamed tool-call arguments against the tool schemas while they are generated.
+
+    `wrap(runnable)` turns a (tool-bound) chat model into a runnable that streams the response,
+    feeds every `tool_call_chunk` to an `IncrementalArgsParser` and stops pulling tokens at the
+    first unrecoverable violation. The returned AIMessage then carries the arguments parsed so far,
+    so the ValidationNode reports the error and the graph goes straight to the fallback / patch path.
+    Mismatches that `repair` (a `LocalRepair`) can coerce are let through instead.
+    """
+
+    def __init__(self, tools: Sequence[Type[BaseModel]], repair: Optional[LocalRepair] = None):
+        self.schemas: Dict[str, dict] = {
+            tool.__name__: tool.model_json_schema()
+            for tool in tools
+            if isinstance(tool, type) and issubclass(tool, BaseModel)
+        }
+        self.aborted = 0
+        self._tolerate = repair.coercible if repair is not None else None
+
+    def wrap(self, runnable: Runnable) -> Runnable:
+        def _stream(messages: Sequence[AnyMessage], config: RunnableConfig) -> AIMessage:
+            state = _StreamState(self.schemas, self._tolerate)
+            with closing(runnable.stream(messages, config)) as stream:
+                for chunk in stream:
+                    if state.add(chunk):
+                        break
+            return self._finish(state)
+
+        async def _astream(messages: Sequence[AnyMessage], config: RunnableConfig) -> AIMessage:
+            state = _StreamState(self.schemas, self._tolerate)
+            stream = runnable.astream(messages, config)
+            try:
+                async for chunk in stream:
+                    if state.add(chunk):
+                        break
+            finally:
+                await stream.aclose()
+            return self._finish(state)
+
+        return RunnableLambda(_stream, afunc=_astream, name="StreamValidated")
+
+    def _finish(self, state: "_StreamState") -> AIMessage:
+        if state.gathered is None:
+            # the model streamed nothing: route it like a reply without a tool call
+            return AIMessage(content="")
+        if state.violation is None:
+            return message_chunk_to_message(state.gathered)
+        self.aborted += 1
+        index, violation = state.violation
+        logger.debug(f"Aborted tool call stream at {violation}")
+        tool_calls: List[ToolCall] = []
+        for tc in state.gathered.tool_call_chunks:
+            if tc.get("index") == index:
+                args = state.parsers[index].snapshot()
+            else:
+                args = next((c["args"] for c in state.gathered.tool_calls if c.get("id") == tc.get("id")), None)
+            tool_calls.append(ToolCall(name=tc["name"], args=args if isinstance(args, dict) else {}, id=tc["id"]))
+        return AIMessage(
+            content=state.gathered.content,
+            tool_calls=tool_calls,
+            id=state.gathered.id,
+            additional_kwargs={"stream_aborted": str(violation)},
+        )
+
+
+class _StreamState:
+    def __init__(self, schemas: Dict[str, dict], tolerate=None):
+        self._schemas = schemas
+        self._tolerate = tolerate
+        self.gathered: Optional[AIMessageChunk] = None
+        self.parsers: Dict[Any, IncrementalArgsParser] = {}
+        self.violation: Optional[Tuple[Any, StreamViolation]] = None
+
+    def add(self, chunk: AIMessageChunk) -> bool:
+        """Merge the chunk and validate its argument fragments. Returns True once the stream should stop."""
+        self.gathered = chunk if self.gathered is None else self.gathered + chunk
+        for tcc in getattr(chunk, "tool_call_chunks", None) or []:
+            index = tcc.get("index")
+            parser = self.parsers.get(index)
+            if parser is None:
+                name = next((c["name"] for c in self.gathered.tool_call_chunks if c.get("index") == index), None)
+                if name not in self._schemas:
+                    continue
+                parser = self.parsers[index] = IncrementalArgsParser(self._schemas[name], self._tolerate)
+            try:
+                parser.feed(tcc.get("args") or "")
+            except StreamViolation as violation:
+                self.violation = (index, violation)
+                return True
+        return False
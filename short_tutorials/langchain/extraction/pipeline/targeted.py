@@ -0,0 +1,263 @@
+from copy import deepcopy
+from functools import lru_cache
+from langchain_core.messages import (AIMessage, AnyMessage, HumanMessage, ToolCall)
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from langchain_core.runnables.config import patch_config
+from langchain_core.language_models import BaseChatModel
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.prebuilt import ValidationNode
+from typing import (Any, Dict, List, Optional, Sequence, Tuple, Type, Union, get_args, get_origin)
+from pydantic import BaseModel, Field, ValidationError, create_model
+import json
+import logging
+
+from pipeline.cache import ResponseCache
+from pipeline.repair import LocalRepair, MISSING, get_path, set_path
+from pipeline.retry import _bind_validator_with_retries, RetryStrategy
+from pipeline.schema import compact_tools, pointer
+from pipeline.streaming import StreamingToolCallValidator
+from pipeline.telemetry import GraphTelemetry
+
+logger = logging.getLogger("extraction")
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if get_origin(annotation) is Union:
+        options = [a for a in get_args(annotation) if a is not type(None)]
+        if len(options) == 1:
+            return options[0]
+    return annotation
+
+
+def annotation_at(tool: Type[BaseModel], loc: Sequence[Any]) -> Any:
+    """The python type of the value at `loc` inside `tool` (Any once the path leaves the models)."""
+    annotation: Any = tool
+    for part in loc:
+        annotation = _unwrap_optional(annotation)
+        if isinstance(part, str):
+            if not (isinstance(annotation, type) and issubclass(annotation, BaseModel)):
+                return Any
+            field = annotation.model_fields.get(part)
+            if field is None:
+                return Any
+            annotation = field.annotation
+        else:
+            if get_origin(annotation) is not list:
+                return Any
+            annotation = (get_args(annotation) or (Any,))[0]
+    return annotation
+
+
+def failing_subtrees(locs: Sequence[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    """
+    Group error locations into the smallest self-contained subtrees worth regenerating:
+    the deepest list item that contains the error (one KeyMoments entry, one background_details item),
+    or the top-level field when the error isn't inside a list. Nested subtrees are folded into their parent.
+    """
+    subtrees = set()
+    for loc in locs:
+        cut = max((i + 1 for i, part in enumerate(loc) if isinstance(part, int)), default=1)
+        subtrees.add(tuple(loc[:cut]))
+    kept: List[Tuple[Any, ...]] = []
+    for subtree in sorted(subtrees, key=len):
+        if not any(subtree[:len(k)] == k for k in kept):
+            kept.append(subtree)
+    return kept
+
+
+@lru_cache(maxsize=256)
+def _wrapper(tool: Type[BaseModel], shape: Tuple[str, ...], annotation: Any) -> Type[BaseModel]:
+    """A one-field tool that constrains the regenerated value to the subtree's own schema."""
+    name = "_".join(("Regenerate", tool.__name__) + shape)[:64]
+    return create_model(
+        name,
+        __doc__=f"Respond with the corrected value for one part of a {tool.__name__} call.",
+        value=(annotation, Field(..., description="The regenerated value.")),
+    )
+
+
+class TargetedRegeneration:
+    """
+    Fallback that keeps every valid subtree of a tool call and regenerates only the failing ones.
+
+    Each failing subtree becomes its own small request, bound to a one-field tool built from that
+    subtree's type. The requests run in parallel and the answers are merged back into the original
+    arguments, keeping the tool call id, so the default aggregator simply takes the new message.
+
+    When there is nothing to target (no tool call, an unknown tool, or an error on the arguments as a
+    whole) the call is regenerated in full through `regenerate`, the llm bound to the original tools.
+    """
+
+    def __init__(
+            self,
+            llm: BaseChatModel,
+            tools: Sequence[Type[BaseModel]],
+            max_concurrency: int = 8,
+            cache: Optional[ResponseCache] = None,
+            regenerate: Optional[Runnable] = None,
+    ):
+        self.llm = llm
+        self.cache = cache
+        self.regenerate = regenerate or llm.bind_tools(list(tools))
+        self.tools: Dict[str, Type[BaseModel]] = {
+            tool.__name__: tool
+            for tool in tools
+            if isinstance(tool, type) and issubclass(tool, BaseModel)
+        }
+        self.max_concurrency = max_concurrency
+        self._bound: Dict[Type[BaseModel], Runnable] = {}
+
+    def __call__(self, messages: Sequence[AnyMessage], config: Optional[RunnableConfig] = None) -> AIMessage:
+        last = next(m for m in reversed(messages) if m.type == "ai")
+        context = [m for m in messages if m.type not in ("ai", "tool")]
+        requests: List[Tuple[int, Tuple[Any, ...], Type[BaseModel], list]] = []
+        tool_calls = [ToolCall(name=tc["name"], args=deepcopy(tc["args"]), id=tc["id"]) for tc in last.tool_calls]
+        for i, tc in enumerate(tool_calls):
+            tool = self.tools.get(tc["name"])
+            if tool is None:
+                return self._regenerate(messages, config, f"unknown tool {tc['name']}")
+            try:
+                tool.model_validate(tc["args"])
+                continue
+            except ValidationError as e:
+                errors = e.errors()
+            for subtree in failing_subtrees([tuple(err["loc"]) for err in errors]):
+                if not subtree:
+                    return self._regenerate(messages, config, f"invalid {tool.__name__} arguments")
+                requests.append((i, subtree, *self._request(tool, tc["args"], subtree, errors, context)))
+
+        if not requests:
+            return self._regenerate(messages, config, "no tool call to target")
+        logger.debug(f"Regenerating {len(requests)} subtree(s): {[pointer(r[1]) for r in requests]}")
+        outputs = RunnableLambda(self._invoke).batch(
+            [(wrapper, request) for _, _, wrapper, request in requests],
+            config=patch_config(config, max_concurrency=self.max_concurrency),
+            return_exceptions=True,
+        )
+        for (i, subtree, _, _), result in zip(requests, outputs):
+            if isinstance(result, Exception) or not getattr(result, "tool_calls", None):
+                logger.debug(f"Regeneration of {pointer(subtree)} failed: {result!r}")
+                continue
+            value = result.tool_calls[0]["args"].get("value", MISSING)
+            if value is not MISSING:
+                set_path(tool_calls[i]["args"], subtree, value)
+        return AIMessage(content=last.content, tool_calls=tool_calls)
+
+    def _regenerate(self, messages: Sequence[AnyMessage], config: Optional[RunnableConfig], reason: str) -> AIMessage:
+        logger.debug(f"Nothing to target ({reason}), regenerating the whole call")
+        return self.regenerate.invoke(messages, config)
+
+    def _request(self, tool, args: dict, subtree: Tuple[Any, ...], errors: List[dict], context: list):
+        shape = tuple(part for part in subtree if isinstance(part, str))
+        wrapper = _wrapper(tool, shape, annotation_at(tool, subtree))
+        current = get_path(args, subtree)
+        scoped = [
+            f"{pointer(err['loc'])}: {err['msg']}"
+            for err in errors
+            if tuple(err["loc"][:len(subtree)]) == subtree
+        ]
+        prompt = (
+            f"Your previous {tool.__name__} call was mostly valid. Regenerate ONLY the value at "
+            f"`{pointer(subtree)}`; everything else is kept as is.\n\n"
+            f"Current value:\n```json\n{json.dumps(None if current is MISSING else current, default=str)}\n```\n"
+            "Validation errors:\n" + "\n".join(scoped) + "\n\n"
+            f"Respond by calling {wrapper.__name__} with the corrected value."
+        )
+        return wrapper, context + [HumanMessage(content=prompt)]
+
+    def _invoke(self, request: Tuple[Type[BaseModel], list], config: RunnableConfig) -> AIMessage:
+        wrapper, messages = request
+        bound = self._bound.get(wrapper)
+        if bound is None:
+            bound = self.llm.bind_tools([wrapper], tool_choice=wrapper.__name__)
+            if self.cache is not None:
+                bound = self.cache.wrap(bound)
+            self._bound[wrapper] = bound
+        return bound.invoke(messages, config)
+
+
+def bind(
+        llm: BaseChatModel,
+        *,
+        tools: list,
+        tool_choice: Optional[str] = None,
+        max_attempts: int = 3,
+        max_concurrency: int = 8,
+        validate_stream: bool = False,
+        repair: Optional[LocalRepair] = None,
+        hedge: int = 1,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        telemetry: Optional[GraphTelemetry] = None,
+        compact_schema: bool = False,
+        description_budget: Optional[int] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+) -> Runnable[Union[List[AnyMessage], PromptValue], AIMessage]:
+    """
+    Binds a language model to a set of tools with field-level targeted regeneration on retries.
+
+    Where `retry.bind` regenerates the whole call and `patched.bind` asks for a JSONPatch, this
+    strategy keeps every valid subtree and asks the model to regenerate only the failing ones
+    (e.g. one KeyMoments entry or one Member.background_details item), each constrained by that
+    subtree's own schema. The small requests run in parallel and are merged back before validating again.
+
+    Parameters
+    ----------
+    llm : BaseChatModel
+        The language model to be bound with tools.
+    tools : list
+        A list of tools to be bound with the language model.
+    tool_choice : Optional[str], optional
+        Specifies the selected tool if more than one exists. Default is None.
+    max_attempts : int
+        Maximum number of attempts (the first generation plus the targeted rounds). Default is 3.
+    max_concurrency : int
+        Maximum number of subtree requests in flight per retry round. Default is 8.
+    validate_stream : bool
+        Validate tool-call arguments while they stream in (see `pipeline/streaming.py`). Default is False.
+    repair : Optional[LocalRepair]
+        Rule-based repair tried before regenerating any subtree. Default is None.
+    hedge : int
+        Candidate generations per attempt; the first one that validates wins. Default is 1.
+    hedge_delay : Optional[float]
+        Start the extra candidates one by one after this many seconds without an answer
+        instead of all at once. Default is None.
+    cache : Optional[ResponseCache]
+        On-disk response cache for the first generation and the subtree requests. Default is None.
+    telemetry : Optional[GraphTelemetry]
+        Collects per-node timing and retry metrics. Default is None.
+    compact_schema : bool
+        Send the token-compact tool schemas (`pipeline/schema.compact_tool`). Default is False.
+    description_budget : Optional[int]
+        With compact_schema, the token budget for field descriptions. Default is None (keep all).
+    checkpointer : Optional[BaseCheckpointSaver]
+        Durable State checkpoints for runs with a job id, so a rerun resumes
+        (`pipeline/checkpoint.SqliteCheckpointer`). Default is None.
+    Returns
+    -------
+    Runnable[Union[List[AnyMessage], PromptValue], AIMessage]
+        A callable object that integrates the bound language model, validator, and retry strategy.
+    """
+    bound_llm = llm.bind_tools(
+        compact_tools(tools, description_budget) if compact_schema else tools,
+        tool_choice=tool_choice,
+    )
+    retry_strategy = RetryStrategy(
+        max_attempts=max_attempts,
+        fallback=TargetedRegeneration(
+            llm, tools, max_concurrency=max_concurrency, cache=cache, regenerate=bound_llm
+        ),
+        repair=repair,
+        hedge=hedge,
+        hedge_delay=hedge_delay,
+    )
+    return _bind_validator_with_retries(
+        bound_llm,
+        validator=ValidationNode(tools),
+        retry_strategy=retry_strategy,
+        tool_choice=tool_choice,
+        stream_validator=StreamingToolCallValidator(tools, repair) if validate_stream else None,
+        cache=cache,
+        telemetry=telemetry,
+        checkpointer=checkpointer,
+    ).with_config(metadata={"retry_strategy": "targeted"})
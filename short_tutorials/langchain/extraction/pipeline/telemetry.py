@@ -0,0 +1,196 @@
+from collections import Counter, defaultdict
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import (Runnable, RunnableConfig, RunnableLambda)
+from typing import (Any, Callable, Dict, Iterator, List, Tuple, Union)
+import json
+import re
+import threading
+import time
+
+_ERROR_TYPE = re.compile(r"\[type=([a-z_]+),")
+
+NODE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 8, 10)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def series(self) -> Iterator[Tuple[str, float]]:
+        """(le, cumulative count) pairs, prometheus style."""
+        for bound, count in zip(self.buckets, self.counts):
+            yield f"{bound:g}", count
+        yield "+Inf", self.count
+
+
+class GraphTelemetry:
+    """
+    Per-node timing and retry telemetry for the ValidateWithRetries graph.
+
+    Collects wall time per node (count_messages, llm, validator, repair, fallback, finalizer), the
+    exceptions raised per node, the attempts each run needed, validation error types, the JSONPatch
+    operations the model proposed, the patches the tracked `PatchAggregator`s applied and rejected (see
+    `track`), local repairs, cache hits and prompt / completion tokens. Export with `to_prometheus()` or
+    `to_json_lines()`.
+    One instance can be shared by several chains and threads.
+    """
+
+    def __init__(self, namespace: str = "extraction"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.node_seconds: Dict[str, _Histogram] = defaultdict(lambda: _Histogram(NODE_BUCKETS))
+        self.attempts: Dict[str, _Histogram] = defaultdict(lambda: _Histogram(ATTEMPT_BUCKETS))
+        self.validation_errors: Counter = Counter()
+        self.patch_ops: Counter = Counter()
+        self.node_failures: Counter = Counter()
+        self.tokens: Counter = Counter()
+        self.events: Counter = Counter()
+        self._aggregators: List[Any] = []
+
+    def node(self, name: str, node: Union[Runnable, Callable]) -> Runnable:
+        """Wrap a graph node so its wall time and output are recorded under `name`."""
+        runnable = node if isinstance(node, Runnable) else RunnableLambda(node)
+
+        def _run(state: dict, config: RunnableConfig) -> Any:
+            start = time.perf_counter()
+            try:
+                output = runnable.invoke(state, config)
+            except Exception as e:
+                self._fail(name, e)
+                raise
+            finally:
+                self._time(name, time.perf_counter() - start)
+            self._observe(name, state, output)
+            return output
+
+        async def _arun(state: dict, config: RunnableConfig) -> Any:
+            start = time.perf_counter()
+            try:
+                output = await runnable.ainvoke(state, config)
+            except Exception as e:
+                self._fail(name, e)
+                raise
+            finally:
+                self._time(name, time.perf_counter() - start)
+            self._observe(name, state, output)
+            return output
+
+        return RunnableLambda(_run, afunc=_arun, name=name)
+
+    def track(self, aggregator: Any) -> None:
+        """Export the applied / rejected patch counts of `aggregator` (a PatchAggregator, read from its `stats`)."""
+        with self._lock:
+            if not any(a is aggregator for a in self._aggregators):
+                self._aggregators.append(aggregator)
+
+    def record_run(self, attempts: int, ok: bool) -> None:
+        with self._lock:
+            self.attempts["success" if ok else "failure"].observe(attempts)
+
+    def _fail(self, name: str, error: Exception) -> None:
+        with self._lock:
+            self.node_failures[(name, type(error).__name__)] += 1
+
+    def _time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.node_seconds[name].observe(seconds)
+
+    def _observe(self, name: str, state: dict, output: Any) -> None:
+        messages = output.get("messages", []) if isinstance(output, dict) else []
+        if isinstance(messages, dict):
+            # the finalizer replaces the whole message list
+            self.record_run(state.get("attempt_number", 0), ok=True)
+            return
+        with self._lock:
+            for m in messages:
+                if isinstance(m, AIMessage):
+                    self._observe_ai(name, m)
+                elif m.additional_kwargs.get("is_error"):
+                    types = _ERROR_TYPE.findall(m.content) if isinstance(m.content, str) else []
+                    self.validation_errors.update(types or ["no_tool_call" if m.type == "human" else "other"])
+
+    def _observe_ai(self, name: str, message: AIMessage) -> None:
+        if name == "repair":
+            self.events["local_repairs"] += 1
+            return
+        if message.response_metadata.get("cache_hit"):
+            self.events[f"{name}_cache_hits"] += 1
+        else:
+            if message.usage_metadata:
+                self.tokens["prompt"] += message.usage_metadata.get("input_tokens", 0)
+                self.tokens["completion"] += message.usage_metadata.get("output_tokens", 0)
+            if message.additional_kwargs.get("stream_aborted"):
+                self.events["stream_aborts"] += 1
+        for tc in message.tool_calls:
+            patches = tc["args"].get("patches") if isinstance(tc["args"], dict) else None
+            if isinstance(patches, list):
+                self.patch_ops.update(p.get("op", "unknown") for p in patches if isinstance(p, dict))
+
+    def _rows(self) -> List[Tuple[str, str, str, Dict[str, str], float]]:
+        """(metric, type, help, labels, value) rows shared by both exporters."""
+        ns = self.namespace
+        rows = []
+        patches: Counter = Counter()
+        with self._lock:
+            aggregators = list(self._aggregators)
+        for aggregator in aggregators:
+            stats = aggregator.stats
+            patches.update({outcome: stats.get(outcome, 0) for outcome in ("applied", "rejected")})
+        with self._lock:
+            for metric, help_text, histograms, label in (
+                    (f"{ns}_node_seconds", "Wall time per validation graph node.", self.node_seconds, "node"),
+                    (f"{ns}_attempts", "Attempts needed per run.", self.attempts, "outcome"),
+            ):
+                for key, histogram in sorted(histograms.items()):
+                    for le, count in histogram.series():
+                        rows.append((f"{metric}_bucket", "histogram", help_text, {label: key, "le": le}, count))
+                    rows.append((f"{metric}_sum", "histogram", help_text, {label: key}, histogram.sum))
+                    rows.append((f"{metric}_count", "histogram", help_text, {label: key}, histogram.count))
+            for metric, help_text, counter, label in (
+                    (f"{ns}_validation_errors_total", "Validation errors by pydantic error type.",
+                     self.validation_errors, "type"),
+                    (f"{ns}_jsonpatch_ops_proposed_total", "JSONPatch operations proposed by the LLM, by op.",
+                     self.patch_ops, "op"),
+                    (f"{ns}_jsonpatches_total", "JSONPatches applied / rejected by PatchAggregator.",
+                     patches, "outcome"),
+                    (f"{ns}_tokens_total", "LLM tokens (cache hits excluded).", self.tokens, "kind"),
+                    (f"{ns}_events_total", "Stream aborts, local repairs and cache hits.", self.events, "event"),
+            ):
+                for key, value in sorted(counter.items()):
+                    rows.append((metric, "counter", help_text, {label: key}, value))
+            for (node, error), value in sorted(self.node_failures.items()):
+                rows.append((f"{ns}_node_failures_total", "counter", "Exceptions raised by validation graph nodes.",
+                             {"node": node, "error": error}, value))
+        return rows
+
+    def to_prometheus(self) -> str:
+        lines, announced = [], set()
+        for metric, kind, help_text, labels, value in self._rows():
+            family = re.sub(r"_(bucket|sum|count)$", "", metric) if kind == "histogram" else metric
+            if family not in announced:
+                announced.add(family)
+                lines.append(f"# HELP {family} {help_text}")
+                lines.append(f"# TYPE {family} {kind}")
+            rendered = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{metric}{{{rendered}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        stamp = time.time()
+        return "".join(
+            json.dumps({"ts": stamp, "metric": metric, "labels": labels, "value": value}) + "\n"
+            for metric, _, _, labels, value in self._rows()
+        )
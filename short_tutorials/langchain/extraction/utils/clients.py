@@ -0,0 +1,148 @@
+from typing import (TYPE_CHECKING, Any, Dict, Hashable, Optional, Tuple)
+import asyncio
+import httpx
+import threading
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+DEFAULT_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+# httpx.AsyncClient settings that belong to its transport (the connection pool)
+_TRANSPORT_SETTINGS = ("verify", "cert", "http1", "http2", "proxy", "uds", "local_address", "retries", "trust_env")
+
+
+def _freeze(settings: Dict[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+    return tuple(sorted((k, v if isinstance(v, Hashable) else repr(v)) for k, v in settings.items()))
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport with one connection pool per event loop.
+
+    Pooled connections belong to the loop that opened them, so a client shared across `asyncio.run`
+    calls would otherwise hand a new loop connections of a closed one ("Event loop is closed", or a
+    hang). The pools of closed loops are dropped when another loop opens one; `aclose()` closes the
+    running loop's pool.
+    """
+
+    def __init__(self, **settings: Any):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._pools: Dict[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = {}
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                # a closed loop's connections can't be used (or closed) any more
+                for closed in [other for other in self._pools if other.is_closed()]:
+                    del self._pools[closed]
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(**self._settings)
+            return pool
+
+    @property
+    def pools(self) -> int:
+        return len(self._pools)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+
+class ClientRegistry:
+    """
+    Process-wide pool of HTTP clients and chat models, so connections and TLS sessions are reused.
+
+    Every `ChatOpenAI()` otherwise opens its own httpx connection pool, and a model created per call
+    (or per chain) pays a new TCP + TLS handshake each time. Here the sync / async httpx clients are
+    shared per base URL and pool settings, and `chat_model` hands out one ChatOpenAI per model and
+    settings, wired to those clients. Thread-safe. The async clients keep one connection pool per event
+    loop (`LoopLocalTransport`), so a model also works across successive `asyncio.run` calls; `aclose()`
+    closes the pools of the loop it's awaited in.
+    """
+
+    def __init__(self, limits: httpx.Limits = DEFAULT_LIMITS, timeout: httpx.Timeout = DEFAULT_TIMEOUT):
+        self.limits = limits
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sync: Dict[Hashable, httpx.Client] = {}
+        self._async: Dict[Hashable, httpx.AsyncClient] = {}
+        self._models: Dict[Hashable, "ChatOpenAI"] = {}
+
+    def http_client(self, base_url: Optional[str] = None, **settings: Any) -> httpx.Client:
+        key = (base_url, _freeze(settings))
+        with self._lock:
+            client = self._sync.get(key)
+            if client is None or client.is_closed:
+                client = self._sync[key] = httpx.Client(
+                    limits=settings.pop("limits", self.limits), timeout=settings.pop("timeout", self.timeout), **settings
+                )
+            return client
+
+    def http_async_client(self, base_url: Optional[str] = None, **settings: Any) -> httpx.AsyncClient:
+        key = (base_url, _freeze(settings))
+        with self._lock:
+            client = self._async.get(key)
+            if client is None or client.is_closed:
+                transport = {k: settings.pop(k) for k in _TRANSPORT_SETTINGS if k in settings}
+                client = self._async[key] = httpx.AsyncClient(
+                    transport=LoopLocalTransport(limits=settings.pop("limits", self.limits), **transport),
+                    timeout=settings.pop("timeout", self.timeout),
+                    **settings,
+                )
+            return client
+
+    def chat_model(self, model: str = "gpt-4o", **settings: Any) -> "ChatOpenAI":
+        """The shared ChatOpenAI for `model` and `settings` (temperature, streaming, base_url, ...)."""
+        # langchain_openai (and the openai SDK) take a while to import, so only when a model is needed
+        from langchain_openai import ChatOpenAI
+
+        key = (model, _freeze(settings))
+        with self._lock:
+            llm = self._models.get(key)
+        if llm is not None:
+            return llm
+        base_url = settings.get("base_url")
+        llm = ChatOpenAI(
+            model=model,
+            http_client=self.http_client(base_url),
+            http_async_client=self.http_async_client(base_url),
+            **settings,
+        )
+        with self._lock:
+            return self._models.setdefault(key, llm)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"sync_clients": len(self._sync), "async_clients": len(self._async), "models": len(self._models)}
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._sync.values():
+                client.close()
+            self._sync.clear()
+            self._models.clear()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients = list(self._async.values())
+            self._async.clear()
+            self._models.clear()
+        for client in clients:
+            await client.aclose()
+
+
+registry = ClientRegistry()
+
+
+def chat_model(model: str = "gpt-4o", **settings: Any) -> "ChatOpenAI":
+    return registry.chat_model(model, **settings)
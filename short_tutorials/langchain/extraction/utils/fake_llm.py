@@ -0,0 +1,127 @@
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessage, AIMessageChunk, AnyMessage, ToolCall)
+from langchain_core.outputs import (ChatGeneration, ChatGenerationChunk, ChatResult)
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+from typing import (Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union)
+import json
+import threading
+import time
+
+# A scripted turn: (tool name, args), a ready AIMessage, or a callable that builds either from the prompt.
+Turn = Union[Tuple[str, dict], AIMessage, Callable[[Sequence[AnyMessage]], Union[Tuple[str, dict], AIMessage]]]
+
+
+def patch_last_call(patches: List[dict], reasoning: str = "Fix the reported fields.") -> Callable:
+    """A turn answering with a PatchFunctionParameters call against the last tool call in the prompt."""
+
+    def _turn(messages: Sequence[AnyMessage]) -> Tuple[str, dict]:
+        last = next(
+            tc["id"]
+            for m in reversed(messages) if m.type == "ai"
+            for tc in m.tool_calls if tc["name"] != "PatchFunctionParameters"
+        )
+        return "PatchFunctionParameters", {"tool_call_id": last, "reasoning": reasoning, "patches": patches}
+
+    return _turn
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline chat model that replays a script of canned tool calls, for benchmarks and local runs.
+
+    Every call (invoke or stream) takes the next turn of `script`, wrapping around at the end, and
+    sleeps `latency` seconds first to stand in for the network. `bind_tools` works like the OpenAI
+    model (tools are converted to their function schema), so the retry graphs, stream validation and
+    the response cache all run unchanged. Streaming sends the arguments in `chunk_size` character
+    `tool_call_chunks`. Call ids are `call_<n>`, counted per model instance.
+    """
+
+    script: List[Any]
+    latency: float = 0.0
+    chunk_size: int = 16
+    _calls: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": "scripted", "script": len(self.script)}
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls = 0
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any) -> Runnable:
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        if tool_choice is not None:
+            kwargs["tool_choice"] = {"type": "function", "function": {"name": tool_choice}}
+        return self.bind(tools=formatted, **kwargs)
+
+    def _next(self, messages: Sequence[AnyMessage]) -> AIMessage:
+        with self._lock:
+            n = self._calls
+            self._calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        turn = self.script[n % len(self.script)]
+        if callable(turn) and not isinstance(turn, AIMessage):
+            turn = turn(messages)
+        if isinstance(turn, AIMessage):
+            return turn
+        name, args = turn
+        input_tokens = sum(len(str(m.content)) // 4 for m in messages)
+        output_tokens = len(json.dumps(args)) // 4
+        return AIMessage(
+            content="",
+            tool_calls=[ToolCall(name=name, args=json.loads(json.dumps(args)), id=f"call_{n}")],
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _generate(
+            self,
+            messages: List[AnyMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next(messages))])
+
+    def _stream(
+            self,
+            messages: List[AnyMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._next(messages)
+        if message.content or not message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=message.content))
+        for index, tc in enumerate(message.tool_calls):
+            raw = json.dumps(tc["args"])
+            for start in range(0, max(len(raw), 1), self.chunk_size):
+                first = start == 0
+                yield ChatGenerationChunk(message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[{
+                        "name": tc["name"] if first else None,
+                        "args": raw[start:start + self.chunk_size],
+                        "id": tc["id"] if first else None,
+                        "index": index,
+                    }],
+                ))
+        if message.usage_metadata:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
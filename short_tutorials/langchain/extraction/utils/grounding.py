@@ -0,0 +1,119 @@
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import (Dict, List, NamedTuple, Optional, Sequence, Union)
+import re
+
+_WORD = re.compile(r"\w+")
+_ID_BITS = 21
+_ELLIPSIS = re.compile(r"\.\.\.+|…")
+
+
+def tokens(text: str) -> List[str]:
+    """Normalized words: casefolded, punctuation / quotes / speaker colons dropped."""
+    return _WORD.findall(text.casefold())
+
+
+class Match(NamedTuple):
+    score: float
+    start: int
+    end: int
+
+
+class QuoteIndex:
+    """
+    Positional word n-gram index over one transcript, for checking that extracted quotes are really in it.
+
+    Built once per transcript (O(words)). `match(quote)` looks up every n-gram of the quote and votes for
+    the transcript offset it implies; the best offset's share of the quote's n-grams is the score
+    (1.0 = verbatim, lower = paraphrased or partly invented). The cost is linear in the quote length,
+    independent of the transcript size: n-grams with more than `max_postings` occurrences carry no
+    position information and are skipped.
+    """
+
+    def __init__(self, text: str, n: int = 3, max_postings: int = 64):
+        self.n = n
+        self.max_postings = max_postings
+        self._vocab: Dict[str, int] = {}
+        words = tokens(text)
+        ids = array("l", (self._vocab.setdefault(w, len(self._vocab)) for w in words))
+        # n-gram -> its only position, or an array of positions once it repeats (most n-grams are unique)
+        self._postings: Dict[int, Union[int, array]] = {}
+        for i in range(len(ids) - n + 1):
+            key = self._key(ids[i:i + n])
+            posting = self._postings.get(key)
+            if posting is None:
+                self._postings[key] = i
+            elif isinstance(posting, int):
+                self._postings[key] = array("l", (posting, i))
+            else:
+                posting.append(i)
+        self._ids = ids
+        # short quotes (fewer than n words) fall back to a scan of the normalized text
+        self._text = " " + " ".join(words) + " "
+
+    @staticmethod
+    def _key(ids: Sequence[int]) -> int:
+        key = 0
+        for i in ids:
+            key = (key << _ID_BITS) | i
+        return key
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def match(self, quote: str) -> Optional[Match]:
+        words = tokens(quote)
+        if not words:
+            return None
+        if len(words) < self.n:
+            found = self._text.find(" " + " ".join(words) + " ")
+            return Match(1.0, -1, -1) if found >= 0 else Match(0.0, -1, -1)
+        ids = [self._vocab.get(w, -1) for w in words]
+        votes: Counter = Counter()
+        grams = len(ids) - self.n + 1
+        informative = grams
+        for j in range(grams):
+            gram = ids[j:j + self.n]
+            if -1 in gram:
+                continue
+            posting = self._postings.get(self._key(gram))
+            if posting is None:
+                continue
+            if isinstance(posting, int):
+                votes[posting - j] += 1
+                continue
+            if len(posting) > self.max_postings:
+                informative -= 1
+                continue
+            for position in posting:
+                votes[position - j] += 1
+        if informative == 0:
+            # nothing but very common phrases, e.g. "yeah yeah yeah"
+            found = self._text.find(" " + " ".join(words) + " ")
+            return Match(1.0 if found >= 0 else 0.0, -1, -1)
+        if not votes:
+            return Match(0.0, -1, -1)
+        start, count = max(votes.items(), key=lambda kv: (kv[1], -kv[0]))
+        return Match(count / informative, start, start + len(ids))
+
+    def score(self, quote: str) -> float:
+        match = self.match(quote)
+        return 0.0 if match is None else match.score
+
+    def ungrounded(self, text: str, threshold: float = 0.6) -> List[str]:
+        """
+        The parts of `text` that aren't in the transcript. A citation may stitch several spans
+        together with an ellipsis ("... I said ... you said ..."), each span is checked on its own.
+        """
+        return [
+            span.strip()
+            for span in _ELLIPSIS.split(text)
+            if tokens(span) and self.score(span) < threshold
+        ]
+
+
+@lru_cache(maxsize=4)
+def index_for(transcript: str) -> QuoteIndex:
+    """The QuoteIndex of a transcript, built once and reused by every validation against it."""
+    return QuoteIndex(transcript)
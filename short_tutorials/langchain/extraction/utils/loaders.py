@@ -0,0 +1,243 @@
+from pathlib import Path
+from typing import (Callable, Collection, Dict, Iterable, Iterator, Optional, Tuple, Union)
+import gzip
+import io
+import json
+import re
+
+Turn = Tuple[str, str]
+
+UNKNOWN_SPEAKER = "Unknown"
+BUFFER_SIZE = 1024 * 1024
+
+# "Pete: text", "PETE: text", ">> Pete: text", "[Pete] text", "- Pete: text"
+_PLAIN = re.compile(r"^\s*(?:>>\s*|-\s*)?(?:\[(?P<bracketed>[^\]]{1,48})\]|(?P<name>[^\W\d][\w .'-]{0,47}?)\s*:)\s*(?P<text>.*)$")
+# labels shaped like a speaker that usually aren't one ("Note: ...", "[Laughter]"); interview labels like
+# "Q:" / "A:" / "Question:" are speakers here (pass `speakers` / `aliases` to treat them otherwise)
+_NOT_SPEAKERS = frozenset((
+    "note", "notes", "nb", "ps", "fyi", "re", "subject", "date", "time", "location", "agenda", "summary", "recap",
+    "update", "todo", "to do", "action item", "action items", "next steps", "example", "warning", "tip", "edit",
+    "source", "link", "result", "results", "step", "laughter", "laughs", "music", "applause", "inaudible",
+    "crosstalk", "silence", "pause", "noise", "background noise",
+))
+# lowercase words that can still be part of a name ("Ludwig van Beethoven")
+_NAME_PARTICLES = frozenset(("de", "da", "del", "della", "der", "di", "du", "la", "le", "van", "von", "bin", "al", "el"))
+_TIMING = re.compile(r"-->")
+_VTT_VOICE = re.compile(r"<v(?:\.[\w.-]+)?\s+(?P<name>[^>]+)>(?P<text>.*?)(?:</v>|$)")
+_TAG = re.compile(r"</?[^>]+>")
+_JSON_SPEAKER = ("speaker", "name", "role", "author", "user")
+_JSON_TEXT = ("text", "content", "utterance", "message", "transcript")
+
+
+def normalize_speaker(name: str, aliases: Optional[Dict[str, str]] = None) -> str:
+    """Tidy a speaker label: markers and extra spaces dropped, all-caps / lowercase names title-cased, aliases applied."""
+    name = " ".join(name.strip(" \t>-[]()\"'").split())
+    if not name:
+        return UNKNOWN_SPEAKER
+    if name.isupper() or name.islower():
+        name = name.title()
+    if aliases:
+        name = aliases.get(name.casefold(), name)
+    return name
+
+
+def _speaker(match: "re.Match", speakers: Optional[Collection[str]] = None) -> Optional[str]:
+    """
+    The speaker label of a `_PLAIN` match, or None when the prefix is ordinary text. With `speakers`
+    (casefolded labels) only those count; otherwise common non-speaker labels and prefixes mixing
+    capitalized and lowercase words ("Action items: ...") are rejected.
+    """
+    name = match["bracketed"] or match["name"]
+    label = " ".join(name.split()).casefold()
+    if speakers is not None:
+        return name if label in speakers else None
+    if label in _NOT_SPEAKERS:
+        return None
+    words = name.split()
+    if not name.islower() and any(w.islower() and w not in _NAME_PARTICLES for w in words):
+        return None
+    return name
+
+
+def merge_turns(turns: Iterable[Turn], max_chars: int = 8000) -> Iterator[Turn]:
+    """Join consecutive turns of the same speaker into one (up to `max_chars`, so a monologue can't grow unbounded)."""
+    speaker, parts, size = None, [], 0
+    for next_speaker, text in turns:
+        if parts and (next_speaker != speaker or size + len(text) > max_chars):
+            yield speaker, " ".join(parts)
+            parts, size = [], 0
+        speaker = next_speaker
+        parts.append(text)
+        size += len(text) + 1
+    if parts:
+        yield speaker, " ".join(parts)
+
+
+def read_lines(path: Union[str, Path]) -> Iterator[str]:
+    """Lines of a text file (or a .gz of one), read through a large buffer, newlines stripped."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        handle = io.TextIOWrapper(io.BufferedReader(gzip.open(path, "rb"), BUFFER_SIZE), encoding="utf-8", errors="replace")
+    else:
+        handle = open(path, encoding="utf-8", errors="replace", buffering=BUFFER_SIZE)
+    with handle:
+        for line in handle:
+            yield line.rstrip("\r\n").lstrip("\ufeff")
+
+
+def parse_plain(lines: Iterable[str], speakers: Optional[Collection[str]] = None) -> Iterator[Turn]:
+    """'Speaker: text' lines; a line without a speaker continues the previous turn."""
+    speaker = None
+    for line in lines:
+        if not line.strip():
+            continue
+        match = _PLAIN.match(line)
+        name = _speaker(match, speakers) if match else None
+        if name:
+            speaker = name
+            text = match["text"].strip()
+            if text:
+                yield speaker, text
+        else:
+            yield speaker or UNKNOWN_SPEAKER, line.strip()
+
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[Turn]:
+    """One turn per line: an object with a speaker and a text field (speaker/name/role, text/content/...) or a pair."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record, list) and len(record) == 2:
+            yield str(record[0]), str(record[1])
+            continue
+        if not isinstance(record, dict):
+            raise ValueError(f"line {number}: expected an object or a [speaker, text] pair, got {type(record).__name__}")
+        speaker = next((record[k] for k in _JSON_SPEAKER if record.get(k)), UNKNOWN_SPEAKER)
+        text = next((record[k] for k in _JSON_TEXT if record.get(k)), None)
+        if text is None:
+            raise ValueError(f"line {number}: no text field (one of {', '.join(_JSON_TEXT)})")
+        yield str(speaker), str(text)
+
+
+def _cues(lines: Iterable[str]) -> Iterator[list]:
+    """Blank-line separated blocks of an SRT / VTT file (a cue, or a header / NOTE / STYLE block)."""
+    block: list = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _cue_text(block: list) -> Optional[list]:
+    for i, line in enumerate(block):
+        if _TIMING.search(line):
+            return block[i + 1:]
+    return None
+
+
+def parse_srt(lines: Iterable[str], speakers: Optional[Collection[str]] = None) -> Iterator[Turn]:
+    """SubRip cues; speakers come from 'Speaker:' / '[Speaker]' prefixes, unlabelled lines keep the last speaker."""
+    speaker = None
+    for block in _cues(lines):
+        text_lines = _cue_text(block)
+        if not text_lines:
+            continue
+        for line in text_lines:
+            line = _TAG.sub("", line).strip()
+            if not line:
+                continue
+            match = _PLAIN.match(line)
+            name = _speaker(match, speakers) if match else None
+            if name:
+                speaker = name
+                line = match["text"].strip()
+            if line:
+                yield speaker or UNKNOWN_SPEAKER, line
+
+
+def parse_vtt(lines: Iterable[str], speakers: Optional[Collection[str]] = None) -> Iterator[Turn]:
+    """WebVTT cues; speakers come from <v Speaker> voice tags (or the same prefixes as SRT)."""
+    speaker = None
+    for block in _cues(lines):
+        if block[0].startswith(("WEBVTT", "NOTE", "STYLE", "REGION")):
+            continue
+        text_lines = _cue_text(block)
+        if not text_lines:
+            continue
+        for line in text_lines:
+            voices = list(_VTT_VOICE.finditer(line))
+            if voices:
+                for voice in voices:
+                    speaker = voice["name"]
+                    text = _TAG.sub("", voice["text"]).strip()
+                    if text:
+                        yield speaker, text
+                continue
+            line = _TAG.sub("", line).strip()
+            match = _PLAIN.match(line)
+            name = _speaker(match, speakers) if match else None
+            if name:
+                speaker = name
+                line = match["text"].strip()
+            if line:
+                yield speaker or UNKNOWN_SPEAKER, line
+
+
+PARSERS: Dict[str, Callable[[Iterable[str]], Iterator[Turn]]] = {
+    "jsonl": parse_jsonl,
+    "srt": parse_srt,
+    "vtt": parse_vtt,
+    "txt": parse_plain,
+}
+# the formats whose speakers come from "Speaker:" / "[Speaker]" prefixes
+_LABELLED = ("srt", "vtt", "txt")
+
+
+def detect_format(path: Union[str, Path]) -> str:
+    suffixes = [s.lstrip(".").lower() for s in Path(path).suffixes if s != ".gz"]
+    suffix = suffixes[-1] if suffixes else "txt"
+    if suffix in ("json", "ndjson"):
+        return "jsonl"
+    return suffix if suffix in PARSERS else "txt"
+
+
+def load_turns(
+        path: Union[str, Path],
+        format: Optional[str] = None,
+        merge: bool = True,
+        aliases: Optional[Dict[str, str]] = None,
+        speakers: Optional[Collection[str]] = None,
+) -> Iterator[Turn]:
+    """
+    Stream the (speaker, text) turns of a transcript file, lazily.
+
+    `format` is one of "jsonl", "srt", "vtt" or "txt" ("Speaker: text" lines), detected from the suffix
+    when left out; `.gz` files are decompressed on the fly. Speakers are normalized (see
+    `normalize_speaker`, `aliases` maps casefolded labels to names) and, with `merge`, consecutive turns
+    of the same speaker are joined. In text / SRT / VTT files a "Label:" or "[Label]" prefix starts a
+    new turn unless it looks like ordinary text ("Note:", "Action items:"); pass `speakers` (the raw
+    labels) to accept exactly those. Only the current line / cue is held in memory, so multi-GB
+    archives can go straight into `iter_chunks` (utils/transcript.py) / the extraction chains.
+    """
+    format = format or detect_format(path)
+    parser = PARSERS[format]
+    known = {" ".join(s.split()).casefold() for s in speakers} if speakers is not None else None
+    # a transcript has a handful of distinct labels, normalize each one once
+    normalized: Dict[str, str] = {}
+
+    def _normalized(raw: Iterator[Turn]) -> Iterator[Turn]:
+        for speaker, text in raw:
+            name = normalized.get(speaker)
+            if name is None:
+                name = normalized[speaker] = normalize_speaker(speaker, aliases)
+            yield name, " ".join(text.split())
+
+    lines = read_lines(path)
+    turns = _normalized(parser(lines, speakers=known) if format in _LABELLED else parser(lines))
+    return merge_turns(turns) if merge else turns
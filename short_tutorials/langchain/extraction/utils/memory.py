@@ -0,0 +1,113 @@
+from langchain_core.language_models import BaseChatModel
+from typing import (Dict, List, Optional, Tuple)
+import threading
+
+from utils.tokens import count_tokens
+
+SUMMARY_PROMPT = """You keep a running summary of a chat between a user and an assistant.
+
+Current summary:
+{summary}
+
+New lines of the conversation:
+{lines}
+
+Rewrite the summary so it also covers the new lines. Keep names, facts, decisions and open questions, drop small talk.
+Answer with the summary only, in at most {words} words."""
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+class ConversationMemory:
+    """
+    Chat history with a token budget, for long-running chat loops (run_1 in main.py).
+
+    The last `keep_turns` turns are kept verbatim. Older turns are rolled into a running summary,
+    `roll_turns` at a time: only the rolled turns and the current summary go to the summarizer, never
+    the whole history. When the verbatim turns go over `max_tokens` turns are rolled early.
+
+    `messages()` returns the summary (as a system message) followed by the verbatim turns. Put it
+    right after the chain's fixed system prompt: the prefix (system prompt + summary) then only changes
+    once per roll, so the provider's prompt cache keeps hitting in between.
+
+    Without an `llm` the summary is extractive: the rolled lines, clipped, oldest dropped first.
+    """
+
+    def __init__(
+            self,
+            llm: Optional[BaseChatModel] = None,
+            keep_turns: int = 8,
+            max_tokens: int = 2000,
+            roll_turns: Optional[int] = None,
+            summary_tokens: int = 400,
+            model: str = "gpt-4o",
+    ):
+        self.llm = llm
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.roll_turns = roll_turns or max(1, keep_turns // 2)
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self.summary = ""
+        # (role, content, tokens) so a turn is only ever counted once
+        self._turns: List[Tuple[str, str, int]] = []
+        self._lock = threading.Lock()
+        self._stats = {"turns": 0, "rolled_turns": 0, "summaries": 0}
+
+    def add(self, role: str, content: str) -> None:
+        with self._lock:
+            self._turns.append((role, content, count_tokens(content, self.model)))
+            self._stats["turns"] += 1
+            while len(self._turns) > 1 and (
+                    len(self._turns) > self.keep_turns + self.roll_turns - 1
+                    or sum(t[2] for t in self._turns) > self.max_tokens
+            ):
+                # a full block goes at once, unless the token budget forces a roll before the block fills up
+                rolled = self._turns[:min(self.roll_turns, len(self._turns) - 1)]
+                self._turns = self._turns[len(rolled):]
+                self.summary = self._summarize(rolled)
+                self._stats["rolled_turns"] += len(rolled)
+                self._stats["summaries"] += 1
+
+    def add_user(self, content: str) -> None:
+        self.add("user", content)
+
+    def add_ai(self, content: str) -> None:
+        self.add("assistant", content)
+
+    def messages(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            history = [(role, content) for role, content, _ in self._turns]
+            if self.summary:
+                history.insert(0, ("system", SUMMARY_PREFIX + self.summary))
+            return history
+
+    def tokens(self) -> int:
+        """Prompt tokens of `messages()` (summary + verbatim turns)."""
+        with self._lock:
+            summary = count_tokens(SUMMARY_PREFIX + self.summary, self.model) if self.summary else 0
+            return summary + sum(t[2] for t in self._turns)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self._turns = []
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "verbatim_turns": len(self._turns)}
+
+    def _summarize(self, rolled: List[Tuple[str, str, int]]) -> str:
+        lines = [f"{role}: {content}" for role, content, _ in rolled]
+        if self.llm is not None:
+            response = self.llm.invoke(SUMMARY_PROMPT.format(
+                summary=self.summary or "(empty)",
+                lines="\n".join(lines),
+                words=int(self.summary_tokens * 0.75),
+            ))
+            return str(response.content).strip()
+        kept = (self.summary.splitlines() if self.summary else []) + [line[:200] for line in lines]
+        while len(kept) > 1 and count_tokens("\n".join(kept), self.model) > self.summary_tokens:
+            kept.pop(0)
+        return "\n".join(kept)
@@ -0,0 +1,268 @@
+from pathlib import Path
+from typing import (Any, Dict, Iterable, List, Optional, Sequence, Union)
+import json
+import sqlite3
+import threading
+import time
+
+from extractor import InsightfulQuote, Member, Moment, TranscriptSummary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    created REAL NOT NULL,
+    title TEXT,
+    location TEXT,
+    duration TEXT,
+    overall_summary TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    summary_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT COLLATE NOCASE,
+    role TEXT COLLATE NOCASE,
+    age INTEGER,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS professions (
+    member_id INTEGER NOT NULL,
+    profession TEXT COLLATE NOCASE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quotes (
+    summary_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    speaker TEXT COLLATE NOCASE,
+    quote TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moments (
+    summary_id INTEGER NOT NULL,
+    topic TEXT COLLATE NOCASE,
+    kind TEXT NOT NULL,
+    quote TEXT,
+    description TEXT,
+    preference TEXT,
+    preference_sources TEXT
+);
+DROP INDEX IF EXISTS summaries_source;
+CREATE UNIQUE INDEX IF NOT EXISTS summaries_unique_source ON summaries(source);
+CREATE INDEX IF NOT EXISTS members_summary ON members(summary_id, position);
+CREATE INDEX IF NOT EXISTS members_name ON members(name);
+CREATE INDEX IF NOT EXISTS professions_profession ON professions(profession, member_id);
+CREATE INDEX IF NOT EXISTS quotes_summary ON quotes(summary_id, position);
+CREATE INDEX IF NOT EXISTS quotes_speaker ON quotes(speaker);
+CREATE INDEX IF NOT EXISTS moments_topic ON moments(topic, kind);
+"""
+
+# before `source` was unique, a rerun appended its summaries again: keep only the newest one per source
+_STALE = "SELECT id FROM summaries WHERE source IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM summaries GROUP BY source)"
+DEDUPLICATE = f"""
+DELETE FROM professions WHERE member_id IN (SELECT id FROM members WHERE summary_id IN ({_STALE}));
+DELETE FROM members WHERE summary_id IN ({_STALE});
+DELETE FROM quotes WHERE summary_id IN ({_STALE});
+DELETE FROM moments WHERE summary_id IN ({_STALE});
+DELETE FROM summaries WHERE id IN ({_STALE});
+"""
+
+# the rows of the summary stored for a source, deleted before it's replaced
+_OF_SOURCE = "SELECT id FROM summaries WHERE source = ?"
+REPLACE = (
+    f"DELETE FROM professions WHERE member_id IN (SELECT id FROM members WHERE summary_id IN ({_OF_SOURCE}))",
+    f"DELETE FROM members WHERE summary_id IN ({_OF_SOURCE})",
+    f"DELETE FROM quotes WHERE summary_id IN ({_OF_SOURCE})",
+    f"DELETE FROM moments WHERE summary_id IN ({_OF_SOURCE})",
+    "DELETE FROM summaries WHERE source = ?",
+)
+
+MOMENT_KINDS = ("happy", "tense", "sad")
+
+
+class ResultStore:
+    """
+    Queryable store of extracted TranscriptSummary objects (SQLite, one file).
+
+    Every summary is flattened into normalized tables: members (+ their professions), insightful quotes
+    and key moments get a row each, with indexed columns for the usual filters (speaker, profession,
+    member name, topic) and the sub-model's JSON (or all its fields) next to them, so reads only decode
+    the rows they return.
+    `get` puts a whole summary back together. `source` is unique: appending a summary for a source that is
+    already stored replaces it (and its members, quotes and moments), so rerunning a job doesn't duplicate it.
+
+    Writes are buffered and go to disk `batch_size` summaries per transaction (`append` / `extend`,
+    `flush`, a read or leaving the `with` block writes the rest). Ids are handed out by the store, so use one
+    writer per file; any number of readers can use it at the same time (WAL).
+    """
+
+    def __init__(self, path: str = ".cache/results.sqlite", batch_size: int = 500):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'summaries_unique_source'"
+        ).fetchone() and self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'summaries'").fetchone():
+            self._conn.executescript("BEGIN;" + DEDUPLICATE + "COMMIT;")
+        self._conn.executescript(SCHEMA)
+        self._next_summary = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM summaries").fetchone()[0]
+        self._next_member = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM members").fetchone()[0]
+        self._rows: Dict[str, List[tuple]] = {table: [] for table in ("summaries", "members", "professions", "quotes", "moments")}
+        self._pending = 0
+        self._sources: set = set()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM summaries", ())[0][0]
+
+    def append(self, summary: Union[TranscriptSummary, dict], source: Optional[str] = None) -> int:
+        """Queue one summary (a model, or the tool call args), replacing the one stored for `source`; returns its id."""
+        if isinstance(summary, dict):
+            summary = TranscriptSummary.model_validate(summary)
+        with self._lock:
+            if source is not None and source in self._sources:
+                # the queued summary of this source is replaced too
+                self._write()
+            summary_id = self._next_summary
+            self._next_summary += 1
+            self._flatten(summary_id, summary, source)
+            self._pending += 1
+            if source is not None:
+                self._sources.add(source)
+            if self._pending >= self.batch_size:
+                self._write()
+        return summary_id
+
+    def extend(
+            self, summaries: Iterable[Union[TranscriptSummary, dict]], sources: Optional[Sequence[Optional[str]]] = None
+    ) -> List[int]:
+        """`append` every summary, with its source from `sources` (one per summary; default none)."""
+        summaries = list(summaries)
+        return [self.append(summary, source) for summary, source in zip(summaries, sources or [None] * len(summaries))]
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def _flatten(self, summary_id: int, summary: TranscriptSummary, source: Optional[str]) -> None:
+        metadata = summary.metadata
+        rest = summary.model_dump(mode="json", exclude={"participants", "insightful_quotes"})
+        self._rows["summaries"].append((
+            summary_id, source, time.time(), metadata.title, metadata.location.content, metadata.duration,
+            summary.overall_summary, json.dumps(rest, separators=(",", ":")),
+        ))
+        for position, member in enumerate(summary.participants):
+            member_id = self._next_member
+            self._next_member += 1
+            self._rows["members"].append((
+                member_id, summary_id, position, member.name.content, member.role, member.age, member.model_dump_json(),
+            ))
+            professions = {str(p).strip() for info in member.background_details for p in info.professions}
+            self._rows["professions"].extend((member_id, p) for p in professions if p)
+        for position, quote in enumerate(summary.insightful_quotes):
+            self._rows["quotes"].append((summary_id, position, quote.speaker, quote.quote.content, quote.model_dump_json()))
+        for key_moments in summary.key_moments:
+            for kind in MOMENT_KINDS:
+                for moment in getattr(key_moments, f"{kind}_moments"):
+                    # moments stay in the summary's JSON too, so only their fields are stored here
+                    self._rows["moments"].append((
+                        summary_id, key_moments.topic, kind, moment.quote, moment.description,
+                        moment.expressed_preference.content, moment.expressed_preference.sources,
+                    ))
+
+    def _write(self) -> None:
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            for sql in REPLACE:
+                self._conn.executemany(sql, [(source,) for source in self._sources])
+            for table, rows in self._rows.items():
+                if rows:
+                    marks = ", ".join("?" * len(rows[0]))
+                    self._conn.executemany(f"INSERT INTO {table} VALUES ({marks})", rows)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        for rows in self._rows.values():
+            rows.clear()
+        self._sources.clear()
+        self._pending = 0
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        with self._lock:
+            # queued summaries are written first, so reads always see everything appended
+            self._write()
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, summary_id: int) -> Optional[TranscriptSummary]:
+        rows = self._query("SELECT data FROM summaries WHERE id = ?", (summary_id,))
+        if not rows:
+            return None
+        data = json.loads(rows[0][0])
+        data["participants"] = [
+            json.loads(row[0])
+            for row in self._query("SELECT data FROM members WHERE summary_id = ? ORDER BY position", (summary_id,))
+        ]
+        data["insightful_quotes"] = [
+            json.loads(row[0])
+            for row in self._query("SELECT data FROM quotes WHERE summary_id = ? ORDER BY position", (summary_id,))
+        ]
+        return TranscriptSummary.model_validate(data)
+
+    def quotes(self, speaker: Optional[str] = None, limit: int = -1) -> List[InsightfulQuote]:
+        """Insightful quotes, optionally only those of `speaker` (case-insensitive)."""
+        if speaker is None:
+            rows = self._query("SELECT data FROM quotes LIMIT ?", (limit,))
+        else:
+            rows = self._query("SELECT data FROM quotes WHERE speaker = ? LIMIT ?", (speaker, limit))
+        return [InsightfulQuote.model_validate_json(row[0]) for row in rows]
+
+    def members(self, profession: Optional[str] = None, name: Optional[str] = None, limit: int = -1) -> List[Member]:
+        """Participants, filtered by one of their professions and / or their name (case-insensitive)."""
+        sql, clauses, params = "SELECT data FROM members m", [], []
+        if profession is not None:
+            clauses.append("m.id IN (SELECT member_id FROM professions WHERE profession = ?)")
+            params.append(profession)
+        if name is not None:
+            clauses.append("m.name = ?")
+            params.append(name)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self._query(sql + " ORDER BY m.id LIMIT ?", (*params, limit))
+        return [Member.model_validate_json(row[0]) for row in rows]
+
+    def moments(self, topic: Optional[str] = None, kind: Optional[str] = None, limit: int = -1) -> List[Moment]:
+        """Key moments, filtered by topic and / or kind ("happy", "tense", "sad")."""
+        sql, clauses, params = "SELECT quote, description, preference, preference_sources FROM moments", [], []
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self._query(sql + " LIMIT ?", (*params, limit))
+        return [
+            Moment(quote=quote, description=description, expressed_preference={"content": content, "sources": sources})
+            for quote, description, content, sources in rows
+        ]
+
+    def professions(self) -> Dict[str, int]:
+        """Profession -> number of members with it."""
+        rows = self._query("SELECT profession, COUNT(*) FROM professions GROUP BY profession ORDER BY 2 DESC", ())
+        return dict(rows)
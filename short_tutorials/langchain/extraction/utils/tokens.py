@@ -0,0 +1,25 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # the BPE files are downloaded on first use, offline boxes fall back to the estimate
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Prompt tokens for `text` (tiktoken when available, ~4 characters per token otherwise)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
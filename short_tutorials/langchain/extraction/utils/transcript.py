@@ -1,3 +1,7 @@
+from typing import Iterable, Iterator, List, Tuple
+
+from utils.tokens import count_tokens
+
 transcript = [
     (
         "Pete",
@@ -71,4 +75,34 @@ transcript = [
     ),
 ]
 
-formatted = "\n".join(f"{x[0]}: {x[1]}" for x in transcript)
\ No newline at end of file
+
+
+def format_turns(turns: Iterable[Tuple[str, str]]) -> str:
+    return "\n".join(f"{speaker}: {text}" for speaker, text in turns)
+
+
+def iter_chunks(turns: Iterable[Tuple[str, str]], max_tokens: int, model: str = "gpt-4o") -> Iterator[List[Tuple[str, str]]]:
+    """
+    Split a transcript on speaker-turn boundaries into chunks of at most `max_tokens` prompt tokens, lazily
+    (`turns` can be a stream from utils/loaders.py). A turn is never cut in half; a single turn longer
+    than the budget becomes a chunk of its own.
+    """
+    current: List[Tuple[str, str]] = []
+    used = 0
+    for turn in turns:
+        cost = count_tokens(f"{turn[0]}: {turn[1]}\n", model)
+        if current and used + cost > max_tokens:
+            yield current
+            current, used = [], 0
+        current.append(turn)
+        used += cost
+    if current:
+        yield current
+
+
+def chunk_turns(turns: Iterable[Tuple[str, str]], max_tokens: int, model: str = "gpt-4o") -> List[List[Tuple[str, str]]]:
+    """All the chunks of `iter_chunks`, as a list."""
+    return list(iter_chunks(turns, max_tokens, model))
+
+
+formatted = format_turns(transcript)
\ No newline at end of file
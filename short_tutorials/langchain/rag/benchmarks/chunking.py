@@ -0,0 +1,138 @@
+"""
+Chunking sweep: chunk size x overlap x splitter, measured on a synthetic corpus with labeled questions.
+
+Every page of the corpus (benchmarks/fixtures.py) holds a few facts, each with a question that names
+its entity. For every combination, a fresh index is built with HashingEmbeddings (deterministic and
+offline) and each question is searched: recall@k is the share of questions whose whole fact sentence
+is in one of the top k chunks, so chunking that cuts facts apart shows up as a miss. Also reported: the
+chunk count, the tokens that would be sent to the embedding API, the bytes on disk of the Chroma index,
+the build time and the median query latency. Sizes are in tokens of --tokenizer (tiktoken's gpt-4o
+encoding, as in rag.py; "words" counts words and punctuation, for machines without the tiktoken files);
+overlaps are fractions of the chunk size. The row marked "*" is rag.py's setting.
+
+    python3 -m benchmarks.chunking
+    python3 -m benchmarks.chunking --sizes 100 200 --overlaps 0 0.5 --splitters recursive token --k 4 --json
+"""
+from typing import Callable, List, Optional
+import argparse
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from langchain_text_splitters import (CharacterTextSplitter, RecursiveCharacterTextSplitter, TextSplitter,
+                                      TokenTextSplitter)
+
+from benchmarks.common import report
+from benchmarks.fixtures import page_text, questions
+from index import ChunkIndex, document_hash
+from local_embeddings import HashingEmbeddings
+
+SPLITTERS = ("recursive", "sentence", "paragraph", "token")
+CURRENT = ("recursive", 100, 0.5)
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def tokenizer(name: str) -> Callable[[str], int]:
+    if name == "words":
+        return lambda text: len(_WORDS.findall(text))
+    import tiktoken
+
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def splitter(kind: str, size: int, overlap: int, length: Callable[[str], int]) -> TextSplitter:
+    if kind == "recursive":
+        return RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap, length_function=length)
+    if kind == "sentence":
+        return RecursiveCharacterTextSplitter(
+            separators=["\n\n", ". ", " ", ""], chunk_size=size, chunk_overlap=overlap, length_function=length
+        )
+    if kind == "paragraph":
+        return CharacterTextSplitter(separator="\n\n", chunk_size=size, chunk_overlap=overlap, length_function=length)
+    if kind == "token":
+        return TokenTextSplitter(model_name="gpt-4o", chunk_size=size, chunk_overlap=overlap)
+    raise ValueError(f"unknown splitter {kind}, expected one of {', '.join(SPLITTERS)}")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+
+
+def measure(docs: List[Document], kind: str, size: int, overlap: float, length: Callable[[str], int], k: int) -> dict:
+    split = splitter(kind, size, int(size * overlap), length)
+    directory = tempfile.mkdtemp()
+    try:
+        config = {"splitter": kind, "chunk_size": size, "chunk_overlap": overlap}
+        index = ChunkIndex(directory, HashingEmbeddings(), split, config, collection_name="sweep")
+        chunks: List[Document] = []
+        start = time.perf_counter()
+        for doc in docs:
+            pieces = split.split_documents([doc])
+            index.replace(doc.metadata["source"], document_hash([doc]), pieces)
+            chunks.extend(pieces)
+        build = time.perf_counter() - start
+        index.save()
+
+        top1, topk = 0, 0
+        latencies = []
+        labeled = questions(len(docs))
+        for fact in labeled:
+            start = time.perf_counter()
+            found = index.vectorstore.similarity_search(fact.question, k=k)
+            latencies.append(time.perf_counter() - start)
+            sentence = _normalize(fact.sentence.rstrip("."))
+            ranks = [rank for rank, doc in enumerate(found) if sentence in _normalize(doc.page_content)]
+            top1 += bool(ranks and ranks[0] == 0)
+            topk += bool(ranks)
+        row = {
+            "splitter": kind, "size": size, "overlap": overlap,
+            "current": "*" if (kind, size, overlap) == CURRENT else "",
+            "chunks": len(chunks), "embed_tokens": sum(length(chunk.page_content) for chunk in chunks),
+            "index_kb": _bytes(directory) / 1024, "build_s": build,
+            "query_ms": statistics.median(latencies) * 1e3,
+            "recall@1": top1 / len(labeled),
+        }
+        if k != 1:
+            row[f"recall@{k}"] = topk / len(labeled)
+        return row
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=40, help="Pages in the corpus (3 questions each).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.0, 0.1, 0.25, 0.5])
+    parser.add_argument("--splitters", nargs="+", default=["recursive", "sentence"], choices=SPLITTERS)
+    parser.add_argument("--tokenizer", default="tiktoken", choices=["tiktoken", "words"])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+    if "token" in args.splitters and args.tokenizer != "tiktoken":
+        parser.error("the token splitter needs --tokenizer tiktoken")
+
+    length = tokenizer(args.tokenizer)
+    docs = []
+    for page in range(args.pages):
+        title, text = page_text(page)
+        docs.append(Document(page_content=text, metadata={"source": f"page-{page}", "title": title}))
+    rows = [
+        measure(docs, kind, size, overlap, length, args.k)
+        for kind in args.splitters for size in args.sizes for overlap in args.overlaps
+    ]
+    report(f"chunking sweep: {args.pages} pages, {len(questions(args.pages))} questions, {args.tokenizer} tokens",
+           rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
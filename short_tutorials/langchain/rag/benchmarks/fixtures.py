@@ -0,0 +1,111 @@
+"""
+A synthetic corpus for the benchmarks: deterministic pages of filler text, each with a few facts about
+made-up entities and a question per fact, served from local files or a local HTTP server.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple
+
+_SYLLABLES = ["ka", "lo", "mi", "ren", "to", "sha", "vel", "quo", "ni", "dar", "ex", "ju", "bra", "tor", "pi", "lum"]
+_VERBS = [("designed", "Who designed"), ("repaired", "Who repaired"), ("mapped", "Who mapped"), ("audited", "Who audited")]
+
+
+def _word(rng: random.Random, syllables: Tuple[int, int] = (2, 3)) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(*syllables)))
+
+
+_VOCABULARY = [_word(random.Random(i)) for i in range(2000)]
+
+
+class Fact(NamedTuple):
+    page: int
+    entity: str
+    sentence: str
+    question: str
+
+
+def page_facts(page: int, facts: int = 3) -> List[Fact]:
+    rng = random.Random(f"facts-{page}")
+    result = []
+    for n in range(facts):
+        entity = f"{_word(rng, (3, 4))}{page}x{n}".capitalize()
+        person = f"{_word(rng).capitalize()} {_word(rng).capitalize()}"
+        city = _word(rng).capitalize()
+        verb, question = rng.choice(_VERBS)
+        result.append(Fact(page, entity, f"The {entity} was {verb} by {person} in {city}.", f"{question} the {entity}?"))
+    return result
+
+
+def page_text(page: int, paragraphs: int = 8, words: int = 120, facts: int = 3) -> Tuple[str, str]:
+    """(title, text) of a page: `paragraphs` of filler with the facts spread over them."""
+    rng = random.Random(f"page-{page}")
+    body = [" ".join(rng.choice(_VOCABULARY) for _ in range(words)) + "." for _ in range(paragraphs)]
+    for fact in page_facts(page, facts):
+        p = rng.randrange(paragraphs)
+        sentences = body[p].split(". ")
+        sentences.insert(rng.randrange(len(sentences) + 1), fact.sentence.rstrip("."))
+        body[p] = ". ".join(sentences)
+    return f"Page {page}", "\n\n".join(body)
+
+
+def page_html(page: int, **kwargs) -> str:
+    title, text = page_text(page, **kwargs)
+    paragraphs = "".join(f"<p>{paragraph}</p>\n" for paragraph in text.split("\n\n"))
+    return f'<html lang="en"><head><title>{title}</title></head><body>\n{paragraphs}</body></html>\n'
+
+
+def questions(pages: int, facts: int = 3) -> List[Fact]:
+    return [fact for page in range(pages) for fact in page_facts(page, facts)]
+
+
+def write_corpus(directory: str, pages: int, **kwargs) -> List[str]:
+    """Write `pages` HTML pages to `directory`; returns their paths."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for page in range(pages):
+        path = Path(directory) / f"page-{page}.html"
+        path.write_text(page_html(page, **kwargs), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+@contextmanager
+def serve(latency: float = 0.0, **kwargs) -> Iterator[str]:
+    """
+    A local HTTP server standing in for the web: /page/<n>.html is page n, rendered on request (so the
+    corpus size costs no memory), after `latency` seconds. Yields the base URL.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            try:
+                page = int(self.path.rsplit("/", 1)[-1].removesuffix(".html"))
+            except ValueError:
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            body = page_html(page, **kwargs).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
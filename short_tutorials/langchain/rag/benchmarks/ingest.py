@@ -0,0 +1,114 @@
+"""
+Sequential vs pipelined ingest (ingest.py) of a synthetic corpus into a fresh index.
+
+The pages come from a local HTTP server (or files, with --files) with --fetch-latency per request, and
+are embedded by HashingEmbeddings taking --embed-latency per call plus --embed-per-text per text, to
+stand in for the web and the embedding API. "sequential" is what setup_retriever used to do: fetch
+every page, split them all, then embed and insert. "pipelined" also lists the throughput of each stage.
+A second pipelined run over the same pages shows the cost of an unchanged corpus.
+
+    python3 -m benchmarks.ingest
+    python3 -m benchmarks.ingest --pages 20000 --skip-sequential --json
+"""
+from typing import List, Optional
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.common import report
+from benchmarks.fixtures import serve, write_corpus
+from index import ChunkIndex, chunk_ids
+from ingest import Fetcher, Ingest
+from local_embeddings import HashingEmbeddings
+
+CONFIG = {"splitter": "RecursiveCharacterTextSplitter", "chunk_size": 400, "chunk_overlap": 50}
+
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=CONFIG["chunk_size"], chunk_overlap=CONFIG["chunk_overlap"])
+
+
+def _index(directory: str, args: argparse.Namespace) -> ChunkIndex:
+    embedding = HashingEmbeddings(latency=args.embed_latency, latency_per_text=args.embed_per_text)
+    return ChunkIndex(directory, embedding, _splitter, CONFIG, batch_size=args.embed_batch)
+
+
+def sequential(sources: List[str], args: argparse.Namespace) -> dict:
+    directory = tempfile.mkdtemp()
+    try:
+        index = _index(directory, args)
+        fetch = Fetcher()
+        start = time.perf_counter()
+        docs = [doc for source in sources for doc in fetch(source)]
+        splits = _splitter().split_documents(docs)
+        # what Chroma.from_documents does: embed and insert every chunk, in batches
+        for start_at in range(0, len(splits), args.embed_batch):
+            batch = splits[start_at:start_at + args.embed_batch]
+            index.add(list(zip(chunk_ids(f"batch-{start_at}", batch), batch)))
+        elapsed = time.perf_counter() - start
+        fetch.close()
+        return {"run": "sequential", "pages": len(sources), "chunks": len(splits),
+                "embed_calls": index.embedding.calls, "seconds": elapsed, "pages_per_s": len(sources) / elapsed}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def pipelined(sources: List[str], args: argparse.Namespace) -> List[dict]:
+    directory = tempfile.mkdtemp()
+    rows = []
+    try:
+        index = _index(directory, args)
+        for run in ("pipelined", "pipelined, unchanged"):
+            ingest = Ingest(
+                index, splitter=_splitter, fetch_workers=args.fetch_workers, split_workers=args.split_workers,
+                embed_workers=args.embed_workers, embed_batch=args.embed_batch,
+            )
+            calls = index.embedding.calls
+            start = time.perf_counter()
+            stats = ingest.run(iter(sources))
+            elapsed = time.perf_counter() - start
+            rows.append({"run": run, "pages": len(sources), "chunks": index.stats["chunks"],
+                         "embed_calls": index.embedding.calls - calls, "seconds": elapsed,
+                         "pages_per_s": len(sources) / elapsed})
+            if run == "pipelined":
+                rows.extend({"run": f"  {stage}", **{k: v for k, v in stage_stats.items() if k != "chars"}}
+                            for stage, stage_stats in stats.items())
+        return rows
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--files", action="store_true", help="Read the pages from local files instead of HTTP.")
+    parser.add_argument("--fetch-latency", type=float, default=0.02, help="Seconds per HTTP request.")
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="Seconds per embedding call.")
+    parser.add_argument("--embed-per-text", type=float, default=0.0002, help="Seconds per embedded text.")
+    parser.add_argument("--fetch-workers", type=int, default=16)
+    parser.add_argument("--split-workers", type=int, default=None)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--embed-batch", type=int, default=256)
+    parser.add_argument("--skip-sequential", action="store_true", help="Only run the pipeline (for large --pages).")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    corpus = tempfile.mkdtemp() if args.files else None
+    try:
+        with serve(latency=args.fetch_latency) as base:
+            sources = write_corpus(corpus, args.pages) if corpus else [f"{base}/page/{n}.html" for n in range(args.pages)]
+            rows = [] if args.skip_sequential else [sequential(sources, args)]
+            rows += pipelined(sources, args)
+    finally:
+        if corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+    report(f"ingest of {args.pages} pages ({'files' if args.files else 'http'})", rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
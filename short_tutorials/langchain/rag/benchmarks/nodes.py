@@ -0,0 +1,127 @@
+"""
+Per-call overhead of the RAG graph nodes: built on every call (as before) vs built once (rag.py).
+
+The models are replaced by an instant fake chat model and hub.pull by a stub that takes --hub-latency
+seconds, so what is measured is everything around the model call: building prompts, structured-output
+parsers and chains, and pulling rlm/rag-prompt. Also lists the one-time setup of each node and what a
+pull costs from the hub, from the disk cache, from memory, and when the hub is unreachable.
+
+    python3 -m benchmarks.nodes
+    python3 -m benchmarks.nodes --hub-latency 0.3 --repeat 200 --json
+"""
+from typing import Any, List, Optional
+import argparse
+import shutil
+import tempfile
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolCall
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from benchmarks.common import report, summarize, timings
+from prompt_hub import HubPromptCache
+from rag import GRADE_PROMPT, AgentState, Generate, Grade, GradeDocuments, Rewrite
+
+RAG_PROMPT = ChatPromptTemplate.from_messages([(
+    "human",
+    "You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer "
+    "the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep "
+    "the answer concise.\nQuestion: {question} \nContext: {context} \nAnswer:",
+)])
+RAG_PROMPT.metadata = {"lc_hub_owner": "rlm", "lc_hub_repo": "rag-prompt", "lc_hub_commit_hash": "50442af1"}
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers instantly: a Grade tool call when tools are bound, a short text otherwise."""
+
+    def _generate(self, messages: List[Any], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if kwargs.get("tools"):
+            message = AIMessage(content="", tool_calls=[ToolCall(name="Grade", args={"binary_score": "yes"}, id="call_0")])
+        else:
+            message = AIMessage(content="Prompt engineering is the design of model inputs.")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self, tools: list, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+
+def bench(args: argparse.Namespace) -> List[dict]:
+    llm = FakeChatModel()
+    state = AgentState(messages=[HumanMessage(content="What is prompt engineering?"), AIMessage(content="Some context.")])
+    inputs = {"question": state["messages"][0].content, "context": state["messages"][-1].content}
+
+    def hub_pull(name: str):
+        time.sleep(args.hub_latency)
+        return RAG_PROMPT
+
+    # what the node functions did on every call before
+    def grade_per_call():
+        prompt = PromptTemplate(template=GRADE_PROMPT.template, input_variables=["context", "question"])
+        (prompt | llm.with_structured_output(Grade)).invoke(inputs)
+
+    def generate_per_call():
+        (hub_pull("rlm/rag-prompt") | llm | StrOutputParser()).invoke(inputs)
+
+    def rewrite_per_call():
+        llm.invoke([HumanMessage(content=f"Rephrase this question: {inputs['question']}")])
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        hub = HubPromptCache(cache_dir, fetch=hub_pull)
+        rows = []
+        nodes = {
+            "grade_documents": (grade_per_call, lambda: GradeDocuments(llm=llm)),
+            "generate": (generate_per_call, lambda: Generate(hub=hub, llm=llm)),
+            "rewrite": (rewrite_per_call, lambda: Rewrite(llm=llm)),
+        }
+        for name, (per_call, build) in nodes.items():
+            start = time.perf_counter()
+            node = build()
+            setup = time.perf_counter() - start
+            before = summarize(timings(per_call, args.repeat if name != "generate" else max(args.repeat // 20, 3)))
+            after = summarize(timings(lambda: node(state), args.repeat))
+            rows.append({
+                "node": name, "setup_ms": setup * 1e3, "per_call_before_ms": before["median_ms"],
+                "per_call_after_ms": after["median_ms"], "saved_ms": before["median_ms"] - after["median_ms"],
+            })
+
+        shutil.rmtree(cache_dir)
+        warm = HubPromptCache(cache_dir, fetch=hub_pull)
+        pulls = [
+            ("hub (cold cache)", HubPromptCache(cache_dir, fetch=hub_pull)),
+            ("disk cache", warm),
+            ("memory", warm),
+            ("hub unreachable, expired", HubPromptCache(cache_dir, ttl=0, fetch=_offline)),
+        ]
+        for name, cache in pulls:
+            start = time.perf_counter()
+            cache.pull("rlm/rag-prompt")
+            rows.append({"node": f"pull rlm/rag-prompt: {name}", "per_call_after_ms": (time.perf_counter() - start) * 1e3})
+        return rows
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _offline(name: str):
+    raise ConnectionError("no network")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--hub-latency", type=float, default=0.2, help="Seconds per hub.pull round trip.")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table.")
+    args = parser.parse_args(argv)
+    report(f"RAG node overhead around an instant model ({args.repeat} calls)", bench(args), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+
+logger = logging.getLogger("rag")
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def document_hash(docs: Sequence[Document]) -> str:
+    """Hash of everything a source's documents contribute to the index: text and metadata."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(doc.page_content.encode("utf-8", "surrogatepass"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def chunk_ids(source: str, chunks: Sequence[Document]) -> List[str]:
+    """Content-addressed ids: the same chunk text of a source keeps its id (repeats get a suffix)."""
+    seen: Dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        base = content_hash(f"{source}\0{chunk.page_content}")[:32]
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        ids.append(base if count == 0 else f"{base}-{count}")
+    return ids
+
+
+def embedding_id(embedding: Embeddings) -> str:
+    model = getattr(embedding, "model", None) or getattr(embedding, "model_name", None)
+    return f"{type(embedding).__name__}/{model}" if model else type(embedding).__name__
+
+
+class ChunkIndex:
+    """
+    Persistent Chroma collection that is updated incrementally instead of rebuilt on every start.
+
+    Next to the Chroma files, `manifest.json` records the configuration (embedding model, splitter
+    settings) and, per source, the hash of its documents, when they were fetched and the ids of its
+    chunks, which are content hashes. `update` only splits sources whose hash changed and only embeds
+    the chunks whose ids aren't in the index yet; chunks that disappeared are deleted. A different
+    embedding model or splitter configuration drops the collection and starts over.
+
+    `splitter` can be a zero-argument factory, so opening an up to date index doesn't even build the
+    tokenizer. `stats` counts what this instance embedded, deleted and skipped.
+    """
+
+    def __init__(
+            self,
+            persist_directory: str,
+            embedding: Embeddings,
+            splitter: Union[TextSplitter, Callable[[], TextSplitter]],
+            splitter_config: Dict[str, object],
+            collection_name: str = "rag-chroma",
+            batch_size: int = 256,
+    ):
+        Path(persist_directory).mkdir(parents=True, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.embedding = embedding
+        self.batch_size = batch_size
+        self._splitter = splitter
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(persist_directory, "manifest.json")
+        self.config = {
+            "version": MANIFEST_VERSION,
+            "collection": collection_name,
+            "embedding": embedding_id(embedding),
+            "splitter": splitter_config,
+        }
+        self.vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embedding,
+            persist_directory=persist_directory,
+        )
+        self.documents: Dict[str, dict] = {}
+        self._stats = {"embedded": 0, "deleted": 0, "unchanged_sources": 0, "changed_sources": 0, "failed_sources": 0, "rebuilds": 0}
+        manifest = self._load()
+        if manifest is not None and manifest.get("config") == self.config:
+            self.documents = manifest["documents"]
+        elif manifest is not None or self.vectorstore._collection.count():
+            # built with another model / splitter: those vectors can't be mixed with new ones
+            self.vectorstore.delete_collection()
+            self.vectorstore = Chroma(
+                collection_name=collection_name,
+                embedding_function=embedding,
+                persist_directory=persist_directory,
+            )
+            self._stats["rebuilds"] += 1
+            self._save()
+
+    @property
+    def splitter(self) -> TextSplitter:
+        if not isinstance(self._splitter, TextSplitter):
+            self._splitter = self._splitter()
+        return self._splitter
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "sources": len(self.documents), "chunks": sum(len(d["chunks"]) for d in self.documents.values())}
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self) -> None:
+        # write-then-rename, so a crash never leaves a half written manifest behind
+        tmp = f"{self._manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"config": self.config, "documents": self.documents}, f)
+        os.replace(tmp, self._manifest_path)
+
+    def stale(self, sources: Iterable[str], max_age: Optional[float] = None) -> List[str]:
+        """The sources that have to be fetched: not indexed yet, or (with `max_age`) fetched longer ago than that."""
+        now = time.time()
+        with self._lock:
+            return [
+                source for source in sources
+                if source not in self.documents
+                or (max_age is not None and now - self.documents[source]["fetched"] > max_age)
+            ]
+
+    def unchanged(self, source: str, digest: str) -> bool:
+        """True when `source` is indexed with this document hash (it is then marked as fetched now)."""
+        with self._lock:
+            entry = self.documents.get(source)
+            if entry is None or entry["hash"] != digest:
+                return False
+            entry["fetched"] = time.time()
+            self._stats["unchanged_sources"] += 1
+            return True
+
+    def update(self, docs: Iterable[Document]) -> Dict[str, int]:
+        """
+        Bring the index up to date with freshly fetched documents (grouped by their `source` metadata).
+        A source that fails (e.g. an embedding error) is logged and keeps its indexed chunks; it isn't
+        marked as fetched, so it is tried again on the next update.
+        """
+        grouped: Dict[str, List[Document]] = {}
+        for doc in docs:
+            grouped.setdefault(str(doc.metadata.get("source", "")), []).append(doc)
+        totals = {"embedded": 0, "deleted": 0}
+        for source, source_docs in grouped.items():
+            digest = document_hash(source_docs)
+            if self.unchanged(source, digest):
+                continue
+            try:
+                added, deleted = self.replace(source, digest, self.splitter.split_documents(source_docs))
+            except Exception as e:
+                logger.warning("could not update %s, keeping its indexed chunks: %s", source, e)
+                with self._lock:
+                    self._stats["failed_sources"] += 1
+                continue
+            totals["embedded"] += added
+            totals["deleted"] += deleted
+        self.save()
+        return totals
+
+    def replace(self, source: str, digest: str, chunks: Sequence[Document]) -> Tuple[int, int]:
+        """
+        Make `chunks` the content of `source`: embed the ones not in the index, delete the ones gone.
+        Returns (embedded, deleted). The manifest is saved by the caller (`update`) or with `save`.
+        If this fails, the new chunks added so far are deleted again (see `discard`).
+        """
+        ids, new, stale = self.diff(source, chunks)
+        # the chunks handed to Chroma so far, including a batch that fails partway
+        attempted = 0
+        try:
+            for start in range(0, len(new), self.batch_size):
+                attempted = start + self.batch_size
+                self.add(new[start:attempted])
+            self.commit(source, digest, ids, len(new), stale)
+        except BaseException:
+            self.discard([i for i, _ in new[:attempted]])
+            raise
+        return len(new), len(stale)
+
+    def diff(self, source: str, chunks: Sequence[Document]) -> Tuple[List[str], List[Tuple[str, Document]], List[str]]:
+        """(ids of all `chunks`, the (id, chunk) pairs not in the index yet, the ids of the source that are gone)."""
+        ids = chunk_ids(source, chunks)
+        with self._lock:
+            old = set(self.documents.get(source, {}).get("chunks", ()))
+        new = [(i, chunk) for i, chunk in zip(ids, chunks) if i not in old]
+        return ids, new, list(old - set(ids))
+
+    def add(self, new: Sequence[Tuple[str, Document]], vectors: Optional[Sequence[Sequence[float]]] = None) -> None:
+        """Insert chunks, embedding them unless their `vectors` were computed already (e.g. by ingest.Ingest)."""
+        if not new:
+            return
+        if vectors is None:
+            self.vectorstore.add_texts(
+                texts=[chunk.page_content for _, chunk in new],
+                metadatas=[chunk.metadata for _, chunk in new],
+                ids=[i for i, _ in new],
+            )
+        else:
+            self.vectorstore._collection.upsert(
+                ids=[i for i, _ in new],
+                embeddings=[list(vector) for vector in vectors],
+                documents=[chunk.page_content for _, chunk in new],
+                metadatas=[chunk.metadata for _, chunk in new],
+            )
+
+    def discard(self, ids: Sequence[str]) -> None:
+        """
+        Delete chunks that were added but not committed to the manifest: nothing would ever delete them
+        otherwise, and they'd keep turning up in retrieval after their page changed.
+        """
+        if not ids:
+            return
+        try:
+            self.vectorstore.delete(ids=list(ids))
+        except Exception as e:
+            logger.warning("could not delete %d uncommitted chunks: %s", len(ids), e)
+
+    def commit(self, source: str, digest: str, ids: List[str], embedded: int, stale: Sequence[str]) -> None:
+        """Once the new chunks of `source` are added: delete its stale chunks and record it in the manifest."""
+        if stale:
+            self.vectorstore.delete(ids=list(stale))
+        with self._lock:
+            self.documents[source] = {"hash": digest, "fetched": time.time(), "chunks": ids}
+            self._stats["changed_sources"] += 1
+            self._stats["embedded"] += embedded
+            self._stats["deleted"] += len(stale)
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Delete the chunks of every source not in `keep`; returns the number of chunks deleted."""
+        keep = set(keep)
+        with self._lock:
+            gone = [source for source in self.documents if source not in keep]
+            ids = [i for source in gone for i in self.documents.pop(source)["chunks"]]
+        if ids:
+            self.vectorstore.delete(ids=ids)
+        with self._lock:
+            self._stats["deleted"] += len(ids)
+            if gone:
+                self._save()
+        return len(ids)
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
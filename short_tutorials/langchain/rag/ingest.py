@@ -0,0 +1,362 @@
+"""
+Pipelined ingest into a ChunkIndex: fetch -> split -> embed -> upsert.
+
+The stages run at the same time, connected by bounded queues: pages are fetched by a pool of threads
+(http(s) through one pooled client, file:// URLs or local paths), split in a process pool, embedded in
+batches of up to `embed_batch` texts by `embed_workers` concurrent calls, and inserted into Chroma in
+batches of `upsert_batch` rows. A full queue blocks the stage feeding it (backpressure), so memory
+stays bounded by the queue sizes however many sources there are, and `sources` can be a generator.
+
+Pages whose hash is in the manifest are dropped after the fetch; only their new chunks are embedded
+(see index.ChunkIndex). A source is committed to the manifest once all its chunks are inserted, so an
+interrupted ingest resumes where it stopped; chunks of a batch that failed before its sources were committed
+are deleted again. A page that can't be fetched is logged and skipped.
+
+    Ingest(index, splitter=factory).run(urls)    # -> per stage: items, items/s, ...
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from index import ChunkIndex, document_hash
+
+logger = logging.getLogger("rag")
+
+_DONE = object()
+STAGES = ("fetch", "split", "embed", "upsert")
+
+
+def parse_html(source: str, html: str) -> Document:
+    """The text of a page with the metadata WebBaseLoader gives it, so both loaders index the same documents."""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": source}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html_tag := soup.find("html"):
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return Document(page_content=soup.get_text(), metadata=metadata)
+
+
+class Fetcher:
+    """Loads a source: an http(s) URL (one pooled client for all of them), a file:// URL or a local path."""
+
+    def __init__(self, max_connections: int = 16, timeout: float = 30.0):
+        self.client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            follow_redirects=True,
+            headers={"User-Agent": os.environ.get("USER_AGENT", "rag-tutorial")},
+        )
+
+    def __call__(self, source: str) -> List[Document]:
+        url = urlparse(source)
+        if url.scheme in ("http", "https"):
+            response = self.client.get(source)
+            response.raise_for_status()
+            text, html = response.text, "html" in response.headers.get("content-type", "")
+        else:
+            path = Path(unquote(url.path) if url.scheme == "file" else source)
+            text, html = path.read_text(encoding="utf-8"), path.suffix in (".html", ".htm")
+        return [parse_html(source, text) if html else Document(page_content=text, metadata={"source": source})]
+
+    def close(self) -> None:
+        self.client.close()
+
+
+# split in worker processes: the splitter is built once per worker, from a picklable factory
+_worker_splitter: Optional[TextSplitter] = None
+
+
+def _init_worker(factory: Callable[[], TextSplitter]) -> None:
+    global _worker_splitter
+    _worker_splitter = factory()
+
+
+def _split(docs: List[Document]) -> List[Document]:
+    return _worker_splitter.split_documents(docs)
+
+
+class _Job(NamedTuple):
+    source: str
+    digest: str
+    ids: List[str]
+    new: List[Tuple[str, Document]]
+    stale: List[str]
+
+
+class Ingest:
+    """
+    Parameters:
+        index: The ChunkIndex to bring up to date; its embedding model does the embedding.
+        splitter: Zero-argument factory of the text splitter; it has to be picklable (a module level
+            function) when `split_workers` isn't 0.
+        fetch: Source -> documents. Defaults to a Fetcher with `fetch_workers` connections.
+        fetch_workers: Threads fetching pages.
+        split_workers: Processes splitting pages (None: one per CPU); 0 splits in a thread instead,
+            which is cheaper for a handful of pages.
+        embed_workers: Concurrent embedding calls.
+        embed_batch: Texts per embedding call. A batch is sent early when a worker is idle and nothing
+            is waiting, so a slow fetch doesn't hold back the chunks already split.
+        upsert_batch: Rows per insert.
+        queue_size: Capacity of each queue between stages.
+        save_every: Committed sources between manifest saves.
+    """
+
+    def __init__(
+            self,
+            index: ChunkIndex,
+            splitter: Optional[Callable[[], TextSplitter]] = None,
+            fetch: Optional[Callable[[str], List[Document]]] = None,
+            fetch_workers: int = 16,
+            split_workers: Optional[int] = None,
+            embed_workers: int = 4,
+            embed_batch: int = 256,
+            upsert_batch: int = 512,
+            queue_size: int = 64,
+            save_every: int = 500,
+    ):
+        if split_workers != 0 and splitter is None:
+            raise ValueError("splitting in worker processes needs a picklable `splitter` factory")
+        self.index = index
+        self.splitter = splitter
+        self.fetch = fetch
+        self.fetch_workers = fetch_workers
+        self.split_workers = (os.cpu_count() or 1) if split_workers is None else split_workers
+        self.embed_workers = embed_workers
+        self.embed_batch = embed_batch
+        self.upsert_batch = upsert_batch
+        self.queue_size = queue_size
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._started = 0.0
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: items (pages, pages, texts, rows), items/s over the time the stage was producing, counters."""
+        with self._lock:
+            result = {}
+            for stage in STAGES:
+                stats = dict(self._stats.get(stage, {"items": 0, "last": self._started}))
+                seconds = stats.pop("last") - self._started
+                result[stage] = {**stats, "seconds": seconds, "per_s": stats["items"] / seconds if seconds > 0 else 0.0}
+            return result
+
+    def _record(self, stage: str, items: int = 1, **counters: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(stage, {"items": 0})
+            stats["items"] += items
+            for name, value in counters.items():
+                stats[name] = stats.get(name, 0) + value
+            stats["last"] = time.perf_counter()
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        """Blocks while `q` is full (backpressure); False when the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _guard(self, stage: Callable[..., None], *args: Any) -> None:
+        try:
+            stage(*args)
+        except BaseException as e:
+            with self._lock:
+                self._error = self._error or e
+            self._stop.set()
+
+    def run(self, sources: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Ingest `sources` (a URL or path each) and return the per-stage stats; the first stage error is raised."""
+        self._stop.clear()
+        self._error = None
+        self._stats = {}
+        self._started = time.perf_counter()
+        fetcher = None
+        if self.fetch is None:
+            self.fetch = fetcher = Fetcher(max_connections=self.fetch_workers)
+        pool = None
+        if self.split_workers:
+            # spawn: forking a process that runs threads (httpx, chroma) can deadlock the children
+            pool = ProcessPoolExecutor(
+                self.split_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.splitter,),
+            )
+        embedders = ThreadPoolExecutor(self.embed_workers, thread_name_prefix="embed")
+        sources_q, docs_q, jobs_q, vectors_q = (queue.Queue(self.queue_size) for _ in range(4))
+        self._fetching = self.fetch_workers
+        threads = [
+            *(threading.Thread(target=self._guard, args=(self._fetch_stage, sources_q, docs_q), daemon=True)
+              for _ in range(self.fetch_workers)),
+            threading.Thread(target=self._guard, args=(self._split_stage, docs_q, jobs_q, pool), daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed_stage, jobs_q, vectors_q, embedders), daemon=True),
+            threading.Thread(target=self._guard, args=(self._upsert_stage, vectors_q), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._guard(self._feed, sources, sources_q)
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            embedders.shutdown(cancel_futures=True)
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if fetcher is not None:
+                fetcher.close()
+                self.fetch = None
+            self.index.save()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _feed(self, sources: Iterable[str], outbox: queue.Queue) -> None:
+        for source in sources:
+            if not self._put(outbox, source):
+                return
+        for _ in range(self.fetch_workers):
+            self._put(outbox, _DONE)
+
+    def _fetch_stage(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        while (source := self._get(inbox)) is not _DONE:
+            try:
+                docs = self.fetch(source)
+            except Exception as e:  # one broken page shouldn't stop the ingest; it stays stale and is retried next run
+                logger.warning("could not fetch %s: %s", source, e)
+                self._record("fetch", items=0, failed=1)
+                continue
+            self._record("fetch", chars=sum(len(doc.page_content) for doc in docs))
+            if not self._put(outbox, (source, docs)):
+                return
+        with self._lock:
+            self._fetching -= 1
+            last = self._fetching == 0
+        if last:
+            self._put(outbox, _DONE)
+
+    def _split_stage(self, inbox: queue.Queue, outbox: queue.Queue, pool: Optional[ProcessPoolExecutor]) -> None:
+        # splits run in the pool while this thread dispatches the next ones; results go out in order
+        pending: Deque[Tuple[str, str, Any]] = deque()
+        in_flight = max(2 * self.split_workers, 1)
+
+        def forward() -> bool:
+            source, digest, result = pending.popleft()
+            chunks = result.result() if isinstance(result, Future) else result
+            ids, new, stale = self.index.diff(source, chunks)
+            self._record("split", chunks=len(chunks))
+            return self._put(outbox, _Job(source, digest, ids, new, stale))
+
+        while (item := self._get(inbox)) is not _DONE:
+            source, docs = item
+            digest = document_hash(docs)
+            if self.index.unchanged(source, digest):
+                self._record("split", items=0, unchanged=1)
+                continue
+            pending.append((source, digest, pool.submit(_split, docs) if pool else self.index.splitter.split_documents(docs)))
+            while pending and (len(pending) >= in_flight or not isinstance(pending[0][2], Future) or pending[0][2].done()):
+                if not forward():
+                    return
+        while pending:
+            if not forward():
+                return
+        self._put(outbox, _DONE)
+
+    def _embed(self, jobs: List[_Job]) -> List[Tuple[_Job, List[List[float]]]]:
+        texts = [chunk.page_content for job in jobs for _, chunk in job.new]
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.embed_batch):
+            vectors.extend(self.index.embedding.embed_documents(texts[start:start + self.embed_batch]))
+        self._record("embed", items=len(texts), calls=-(-len(texts) // self.embed_batch))
+        result, offset = [], 0
+        for job in jobs:
+            result.append((job, vectors[offset:offset + len(job.new)]))
+            offset += len(job.new)
+        return result
+
+    def _embed_stage(self, inbox: queue.Queue, outbox: queue.Queue, embedders: ThreadPoolExecutor) -> None:
+        pending: Deque[Future] = deque()
+        batch: List[_Job] = []
+        size = 0
+
+        def forward(limit: int) -> bool:
+            while pending and (len(pending) > limit or pending[0].done()):
+                if not self._put(outbox, pending.popleft().result()):
+                    return False
+            return True
+
+        while (job := self._get(inbox)) is not _DONE:
+            batch.append(job)
+            size += len(job.new)
+            if size >= self.embed_batch or (inbox.empty() and len(pending) < self.embed_workers):
+                pending.append(embedders.submit(self._embed, batch))
+                batch, size = [], 0
+            if not forward(self.embed_workers):
+                return
+        if batch:
+            pending.append(embedders.submit(self._embed, batch))
+        if forward(0):
+            self._put(outbox, _DONE)
+
+    def _upsert_stage(self, inbox: queue.Queue) -> None:
+        rows: List[Tuple[_Job, List[List[float]]]] = []
+        committed = 0
+
+        def flush() -> None:
+            nonlocal committed
+            new = [pair for job, _ in rows for pair in job.new]
+            vectors = [vector for _, job_vectors in rows for vector in job_vectors]
+            attempted, recorded = 0, 0
+            try:
+                for start in range(0, len(new), self.upsert_batch):
+                    attempted = start + self.upsert_batch
+                    self.index.add(new[start:attempted], vectors[start:attempted])
+                for job, _ in rows:
+                    self.index.commit(job.source, job.digest, job.ids, len(job.new), job.stale)
+                    recorded += 1
+            except BaseException:
+                # chunks in Chroma but not in the manifest would never be deleted
+                added = {i for i, _ in new[:attempted]}
+                self.index.discard([i for job, _ in rows[recorded:] for i, _ in job.new if i in added])
+                raise
+            self._record("upsert", items=len(new), sources=len(rows), deleted=sum(len(job.stale) for job, _ in rows))
+            if committed // self.save_every != (committed + len(rows)) // self.save_every:
+                self.index.save()
+            committed += len(rows)
+            rows.clear()
+
+        while (embedded := self._get(inbox)) is not _DONE:
+            rows.extend(embedded)
+            if sum(len(job.new) for job, _ in rows) >= self.upsert_batch or inbox.empty():
+                flush()
+        if rows and not self._stop.is_set():
+            flush()
@@ -0,0 +1,49 @@
+import hashlib
+import re
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for OpenAIEmbeddings: the words and word pairs of a text are hashed
+    into `size` buckets (signed, so collisions cancel out rather than pile up) and the counts normalized.
+    Texts sharing words end up close, which is enough to compare chunkings and to exercise the index and
+    the ingest pipeline. `latency` seconds are slept per call, `latency_per_text` per text, to stand in
+    for the round trip of an embedding API.
+    """
+
+    def __init__(self, size: int = 384, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.model = f"hashing-{size}"
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        words = _TOKEN.findall(text.lower())
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.size] += 1.0 if digest >> 63 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        if self.latency or self.latency_per_text:
+            time.sleep(self.latency + self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.load import dumpd, load
+
+logger = logging.getLogger("rag")
+
+CACHE_FORMAT = 1
+
+
+def _hub_pull(name: str) -> Any:
+    from langchain import hub
+
+    return hub.pull(name)
+
+
+class HubPromptCache:
+    """
+    On-disk cache of LangChain hub prompts, so pulling one costs a network round trip once per `ttl`.
+
+    Every version is kept in `<path>/<owner>__<repo>/<commit>.json`, the commit being the hub's commit
+    hash (or a hash of the prompt), and `latest.json` next to it says which one `owner/repo` resolved to
+    and when. A pinned name (`owner/repo:commit`) is read from its version file and never expires. When
+    the hub can't be reached, an expired prompt is used anyway (with a warning, and for another `ttl`)
+    rather than failing. Prompts are also kept in memory for `ttl`, so a node pulling its prompt per
+    call doesn't even read the disk.
+
+    Parameters:
+        path: Directory of the cache.
+        ttl: Seconds after which `owner/repo` is pulled again.
+        fetch: Name -> prompt; `langchain.hub.pull` by default.
+    """
+
+    def __init__(self, path: str = os.path.join(".cache", "hub"), ttl: float = 24 * 3600,
+                 fetch: Optional[Callable[[str], Any]] = None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.fetch = fetch or _hub_pull
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Tuple[Any, float]] = {}
+        self._stats = {"memory": 0, "disk": 0, "pulled": 0, "stale": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _read(self, file: Path) -> Optional[dict]:
+        try:
+            entry = json.loads(file.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry if entry.get("format") == CACHE_FORMAT else None
+
+    def _write(self, file: Path, entry: dict) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"format": CACHE_FORMAT, **entry}))
+        os.replace(tmp, file)
+
+    @staticmethod
+    def _load(entry: dict) -> Any:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # langchain_core.load is marked beta
+            return load(entry["prompt"])
+
+    def pull(self, name: str) -> Any:
+        """The prompt `name` (`owner/repo` or `owner/repo:commit`), from memory, disk or the hub."""
+        repo, _, pinned = name.partition(":")
+        with self._lock:
+            if name in self._memory:
+                prompt, loaded = self._memory[name]
+                if pinned or time.monotonic() - loaded < self.ttl:
+                    self._stats["memory"] += 1
+                    return prompt
+        directory = self.path / repo.replace("/", "__")
+        latest = self._read(directory / "latest.json")
+        commit = pinned or (latest or {}).get("commit")
+        entry = self._read(directory / f"{commit}.json") if commit else None
+        fresh = entry is not None and (pinned or time.time() - latest["fetched"] < self.ttl)
+        if fresh:
+            prompt, source = self._load(entry), "disk"
+        else:
+            try:
+                prompt, source = self.fetch(name), "pulled"
+            except Exception as e:
+                if entry is None:
+                    raise
+                logger.warning("could not pull %s (%s), using the version cached %.0f hours ago",
+                               name, e, (time.time() - latest["fetched"]) / 3600)
+                prompt, source = self._load(entry), "stale"
+            else:
+                serialized = dumpd(prompt)
+                commit = pinned or (getattr(prompt, "metadata", None) or {}).get("lc_hub_commit_hash") or \
+                    hashlib.sha256(json.dumps(serialized, sort_keys=True).encode()).hexdigest()[:12]
+                self._write(directory / f"{commit}.json", {"name": repo, "commit": commit, "prompt": serialized})
+                if not pinned:
+                    self._write(directory / "latest.json", {"commit": commit, "fetched": time.time()})
+        with self._lock:
+            self._stats[source] += 1
+            self._memory[name] = (prompt, time.monotonic())
+        return prompt
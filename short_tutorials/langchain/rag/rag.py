@@ -1,47 +1,90 @@
-import getpass, os
-from typing import Annotated, Sequence, Literal
+import getpass, logging, os, sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Annotated, Literal, Optional, Sequence
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.tools.retriever import create_retriever_tool
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langgraph.graph.message import add_messages
-from langchain import hub
+import httpx
 
+from index import ChunkIndex
+from ingest import Ingest
+from prompt_hub import HubPromptCache
 
-# Document retrieval setup
-def setup_retriever():
-    urls = [
-        "https://lilianweng.github.io/posts/2023-06-23-agent/",
-        "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
-        "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
-    ]
-    docs = [item for url in urls for item in WebBaseLoader(url).load()]
-
-    doc_splits = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4o",
-        chunk_size=100,
-        chunk_overlap=50
-    ).split_documents(docs)
-
-    vectorstore = Chroma.from_documents(
-        documents=doc_splits,
-        collection_name="rag-chroma",
-        embedding=OpenAIEmbeddings()
+sys.path.append(str(Path(__file__).resolve().parents[2] / "shared"))
+from embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger("rag")
+
+URLS = [
+    "https://lilianweng.github.io/posts/2023-06-23-agent/",
+    "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
+    "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
+]
+SPLITTER = {"splitter": "RecursiveCharacterTextSplitter", "encoder": "gpt-4o", "chunk_size": 100, "chunk_overlap": 50}
+
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name=SPLITTER["encoder"],
+        chunk_size=SPLITTER["chunk_size"],
+        chunk_overlap=SPLITTER["chunk_overlap"]
     )
 
+
+# Document retrieval setup
+def setup_retriever(
+        urls: Sequence[str] = URLS,
+        persist_directory: str = ".cache/chroma",
+        max_age: Optional[float] = 24 * 3600,
+        embedding: Optional[Embeddings] = None,
+):
+    """
+    Open the persistent index in `persist_directory`, fetching (see ingest.Ingest) only the urls that aren't
+    indexed yet or were fetched more than `max_age` seconds ago (None: never refetch). A refetched page that didn't
+    change costs no embedding calls; a changed one only embeds its new chunks (see index.ChunkIndex), and
+    chunk texts embedded before (e.g. before a rebuild) come from the shared embedding cache.
+
+    A source that can't be refreshed (fetch or embedding error) is logged and keeps its indexed chunks and its
+    fetch time, so it's tried again on the next start; only an index with nothing in it yet makes this raise.
+    """
+    index = ChunkIndex(persist_directory, embedding or CachedEmbeddings(OpenAIEmbeddings()), _splitter, SPLITTER, collection_name="rag-chroma")
+    index.prune(urls)
+    stale = index.stale(urls, max_age)
+    if stale:
+        # a process pool only pays off for more than a handful of pages
+        try:
+            Ingest(index, splitter=_splitter, split_workers=0 if len(stale) < 32 else None).run(stale)
+        except Exception as e:
+            # the sources Ingest committed before the error are up to date; the others stay stale
+            if not index.stats["sources"]:
+                raise
+            logger.warning("could not refresh the index, using the persisted one: %s", e)
+
     return create_retriever_tool(
-        vectorstore.as_retriever(),
+        index.vectorstore.as_retriever(),
         "retrieve_blog_posts",
         "Search and return information about Lilian Weng blog posts on LLM agents, prompt engineering, and adversarial attacks."
     )
 
 
+# Shared chat models: one pooled HTTP client per process, so the graph nodes reuse connections and TLS sessions
+_http_client = httpx.Client(limits=httpx.Limits(max_connections=32, max_keepalive_connections=16), timeout=120.0)
+
+
+@lru_cache(maxsize=None)
+def chat_model(model: str, streaming: bool = True) -> ChatOpenAI:
+    return ChatOpenAI(temperature=0, model=model, streaming=streaming, http_client=_http_client)
+
+
 # Agent State
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -53,62 +96,67 @@ class Grade(BaseModel):
     binary_score: str = Field(description="Relevance score 'yes' or 'no'")
 
 
-# Decision functions
-def grade_documents(state: AgentState) -> Literal["generate", "rewrite"]:
-    """
-    Determines whether the retrieved documents are relevant to the question.
+GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
+    Here is the retrieved document: \n\n {context} \n\n
+    Here is the user question: {question} \n
+    If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+    Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
+    input_variables=["context", "question"],
+)
 
-    Args:
-        state (messages): The current state
 
-    Returns:
-        str: A decision for whether the documents are relevant or not
-    """
+# Graph nodes: each builds its model, prompt and parser once, so a call only pays for the model call.
+# `llm` replaces the default OpenAI model (e.g. with a fake one in benchmarks/nodes.py).
+class GradeDocuments:
+    """Decision function: whether the retrieved documents are relevant to the question."""
 
-    # LLM with tool and validation
-    model = ChatOpenAI(temperature=0, model="gpt-4-0125-preview", streaming=True)
-    llm_with_tool = model.with_structured_output(Grade)
-
-    # Prompt
-    prompt = PromptTemplate(
-        template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
-        Here is the retrieved document: \n\n {context} \n\n
-        Here is the user question: {question} \n
-        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
-        input_variables=["context", "question"],
-    )
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        # LLM with tool and validation
+        self.chain = GRADE_PROMPT | (llm or chat_model("gpt-4-0125-preview")).with_structured_output(Grade)
 
-    # create invokable chain
-    chain = prompt | llm_with_tool
+    def __call__(self, state: AgentState) -> Literal["generate", "rewrite"]:
+        """
+        Determines whether the retrieved documents are relevant to the question.
 
-    # Invoke the chain with inputs (question = first_message, doc or context = last_message) to get results
-    scored_result = chain.invoke({"question": state["messages"][0].content, "context": state["messages"][-1].content})
-    score = scored_result.binary_score
+        Args:
+            state (messages): The current state
 
-    if score == "yes":
-        return "generate"
-    else:
-        return "rewrite"
+        Returns:
+            str: A decision for whether the documents are relevant or not
+        """
+        # Invoke the chain with inputs (question = first_message, doc or context = last_message) to get results
+        scored_result = self.chain.invoke({"question": state["messages"][0].content, "context": state["messages"][-1].content})
+        return "generate" if scored_result.binary_score == "yes" else "rewrite"
 
 
-def agent(state: AgentState, tools):
-    return {"messages": [ChatOpenAI(temperature=0, model="gpt-4-turbo").bind_tools(tools).invoke(state["messages"])]}
+class Agent:
+    def __init__(self, tools: list, llm: Optional[BaseChatModel] = None):
+        self.llm = (llm or chat_model("gpt-4-turbo", streaming=False)).bind_tools(tools)
 
+    def __call__(self, state: AgentState):
+        return {"messages": [self.llm.invoke(state["messages"])]}
 
-def rewrite(state: AgentState):
-    model = ChatOpenAI(temperature=0, model="gpt-4-0125-preview", streaming=True)
-    msg = [HumanMessage(content=f"Rephrase this question: {state['messages'][0].content}")]
-    return {"messages": [model.invoke(msg)]}
 
+class Rewrite:
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        self.llm = llm or chat_model("gpt-4-0125-preview")
 
-def generate(state: AgentState):
-    prompt = hub.pull("rlm/rag-prompt")
-    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, streaming=True)
-    response = (prompt | llm | StrOutputParser()).invoke(
-        {"context": state["messages"][-1].content, "question": state["messages"][0].content}
-    )
-    return {"messages": [response]}
+    def __call__(self, state: AgentState):
+        msg = [HumanMessage(content=f"Rephrase this question: {state['messages'][0].content}")]
+        return {"messages": [self.llm.invoke(msg)]}
+
+
+class Generate:
+    """Answers from the retrieved context with the hub's rlm/rag-prompt, pulled through the local cache."""
+
+    def __init__(self, hub: Optional[HubPromptCache] = None, llm: Optional[BaseChatModel] = None,
+                 prompt: str = "rlm/rag-prompt"):
+        self.chain = (hub or HubPromptCache()).pull(prompt) | (llm or chat_model("gpt-3.5-turbo")) | StrOutputParser()
+
+    def __call__(self, state: AgentState):
+        response = self.chain.invoke({"context": state["messages"][-1].content, "question": state["messages"][0].content})
+        return {"messages": [response]}
 
 
 # Main entry point
@@ -130,13 +178,13 @@ if __name__ == "__main__":
     # Example usage of the system
     state = AgentState(messages=[HumanMessage(content=question)])
 
-    action = grade_documents(state)
+    action = GradeDocuments()(state)
     if action == "generate":
-        state = generate(state)
+        state = Generate()(state)
     elif action == "rewrite":
-        state = rewrite(state)
+        state = Rewrite()(state)
     else:
-        state = agent(state, tools)
+        state = Agent(tools)(state)
 
     # Output the resulting state
     print(state)
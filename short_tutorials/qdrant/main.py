@@ -1,3 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
 from datasets import load_dataset
 import pandas as pd
 from langchain.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
@@ -9,6 +13,9 @@ from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_cohere import CohereEmbeddings
 from langchain_community.vectorstores import Qdrant
 
+sys.path.append(str(Path(__file__).resolve().parents[1] / "shared"))
+from embedding_cache import CachedEmbeddings
+
 def get_dataset(name: str):
     d = load_dataset(name)
     print(f"{'='*30}")
@@ -40,8 +47,6 @@ def print_q(txt: str):
     print(f"{'=' * 30}")
 
 if __name__ == "__main__":
-    import os
-
     # Load the environment variables
     keys = check_vars()
 
@@ -62,7 +67,8 @@ if __name__ == "__main__":
         texts.append(text.strip())
         metadatas.append({"question": entry.question, "answer": entry.answer})
 
-    embeddings = CohereEmbeddings(model="embed-multilingual-v3.0")
+    # the train split is embedded on every run: only the first run (or new entries) reach Cohere
+    embeddings = CachedEmbeddings(CohereEmbeddings(model="embed-multilingual-v3.0"))
 
     facts_store = Qdrant.from_texts(
         texts, embeddings, metadatas,
@@ -73,6 +79,8 @@ if __name__ == "__main__":
     )
 
 
+    print_q(f"embedding cache: {embeddings.cache.stats}")
+
     q = facts_store.similarity_search("How do I format the disk?")
     print_q(q)
 
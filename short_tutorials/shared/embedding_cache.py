@@ -0,0 +1,256 @@
+"""
+Local cache of embedding vectors, shared by the tutorials that embed the same text on every run.
+
+Vectors are keyed by (model, input type, sha256 of the text), so a query embedding never answers for a
+document one (Cohere embeds them differently) and two models never share vectors. They live in one
+memory-mapped array per dimension and dtype (float16 by default: half the disk, and far more precise
+than a nearest-neighbour search needs), with the key -> row index, last use and sizes in SQLite. When the
+arrays outgrow `max_bytes`, the least recently used vectors are evicted and their rows reused.
+
+    CachedEmbeddings(OpenAIEmbeddings())             # any langchain Embeddings
+    embed_haystack_documents(doc_embedder, docs)     # a haystack document embedder
+
+The tutorials import it with `sys.path.append(<path of this directory>)`. One process per cache
+directory: the arrays aren't locked across processes.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # the haystack tutorial doesn't install langchain
+    Embeddings = object
+
+DEFAULT_PATH = os.path.join(".cache", "embeddings")
+_GROW_ROWS = 1024
+
+
+def model_id(embeddings: Any) -> str:
+    """The class, model and output size of an embeddings object: what its vectors depend on."""
+    parts = [type(embeddings).__name__]
+    for attr in ("model", "model_name", "dimensions"):
+        value = getattr(embeddings, attr, None)
+        if value is not None:
+            parts.append(str(value))
+    return "/".join(parts)
+
+
+class EmbeddingCache:
+    """
+    Parameters:
+        path: Directory of the SQLite index and the vector arrays.
+        max_bytes: Size of the vector arrays above which the least recently used vectors are evicted.
+        dtype: "float16" or "float32", what the vectors are stored as (they are returned as float lists).
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = 512 * 2 ** 20, dtype: str = "float16"):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"dtype must be float16 or float32, not {dtype}")
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._arrays: Dict[int, np.memmap] = {}
+        self._rows: Dict[int, int] = {}
+        self._tick = 0
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0}
+        self._by_model: Dict[str, List[int]] = {}
+        self._db = sqlite3.connect(os.path.join(path, f"index-{dtype}.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " key BLOB PRIMARY KEY, dim INTEGER NOT NULL, row INTEGER NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_used ON vectors (used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free (dim INTEGER NOT NULL, row INTEGER NOT NULL)")
+        self._tick = self._db.execute("SELECT COALESCE(MAX(used), 0) FROM vectors").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, input_type: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{input_type}\0{text}".encode("utf-8", "surrogatepass")).digest()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dim), 0) FROM vectors"
+            ).fetchone()
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "vectors": count,
+                "bytes": size * self.dtype.itemsize,
+                "by_model": {
+                    model: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+                    for model, (hits, misses) in self._by_model.items()
+                },
+            }
+
+    def _array(self, dim: int, rows: int = 0) -> np.memmap:
+        """The array of `dim` wide vectors, grown (and remapped) to hold at least `rows` rows."""
+        array = self._arrays.get(dim)
+        if array is not None and array.shape[0] >= rows:
+            return array
+        file = os.path.join(self.path, f"vectors-{dim}-{self.dtype.name}.bin")
+        row_bytes = dim * self.dtype.itemsize
+        size = os.path.getsize(file) if os.path.exists(file) else 0
+        if size < rows * row_bytes or size == 0:
+            capacity = max(rows, size // row_bytes * 2, _GROW_ROWS)
+            with open(file, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            size = capacity * row_bytes
+        if array is not None:
+            array.flush()
+        array = np.memmap(file, dtype=self.dtype, mode="r+", shape=(size // row_bytes, dim))
+        self._arrays[dim] = array
+        return array
+
+    def _next_row(self, dim: int) -> int:
+        if dim not in self._rows:
+            self._rows[dim] = self._db.execute(
+                "SELECT COALESCE(MAX(row) + 1, 0) FROM (SELECT row FROM vectors WHERE dim = ?"
+                " UNION ALL SELECT row FROM free WHERE dim = ?)", (dim, dim)
+            ).fetchone()[0]
+        self._rows[dim] += 1
+        return self._rows[dim] - 1
+
+    def get_many(self, model: str, input_type: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """The cached vector of each text, None for the ones not cached."""
+        keys = [self.key(model, input_type, text) for text in texts]
+        with self._lock:
+            found: Dict[bytes, Tuple[int, int]] = {}
+            for start in range(0, len(keys), 500):
+                batch = list(set(keys[start:start + 500]))
+                marks = ",".join("?" * len(batch))
+                found.update(
+                    (key, (dim, row))
+                    for key, dim, row in self._db.execute(f"SELECT key, dim, row FROM vectors WHERE key IN ({marks})", batch)
+                )
+            self._tick += 1
+            self._db.executemany("UPDATE vectors SET used = ? WHERE key = ?", [(self._tick, key) for key in found])
+            result = []
+            for key in keys:
+                if key in found:
+                    dim, row = found[key]
+                    result.append(self._array(dim)[row].astype(np.float32).tolist())
+                else:
+                    result.append(None)
+            hits = sum(vector is not None for vector in result)
+            counts = self._by_model.setdefault(model, [0, 0])
+            counts[0] += hits
+            counts[1] += len(keys) - hits
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+            self._db.commit()
+        return result
+
+    def put_many(self, model: str, input_type: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        with self._lock:
+            self._tick += 1
+            for text, vector in zip(texts, vectors):
+                key = self.key(model, input_type, text)
+                dim = len(vector)
+                if self._db.execute("SELECT 1 FROM vectors WHERE key = ?", (key,)).fetchone():
+                    continue
+                free = self._db.execute("SELECT rowid, row FROM free WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+                if free:
+                    self._db.execute("DELETE FROM free WHERE rowid = ?", (free[0],))
+                    row = free[1]
+                else:
+                    row = self._next_row(dim)
+                self._array(dim, row + 1)[row] = np.asarray(vector, dtype=self.dtype)
+                self._db.execute("INSERT INTO vectors (key, dim, row, used) VALUES (?, ?, ?, ?)", (key, dim, row, self._tick))
+            self._evict()
+            for array in self._arrays.values():
+                array.flush()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        size = self._db.execute("SELECT COALESCE(SUM(dim), 0) FROM vectors").fetchone()[0] * self.dtype.itemsize
+        if size <= self.max_bytes:
+            return
+        # evict down to 90% of the budget, so the next few misses don't each trigger an eviction
+        target = size - int(self.max_bytes * 0.9)
+        evicted, freed = [], 0
+        for key, dim, row in self._db.execute("SELECT key, dim, row FROM vectors ORDER BY used"):
+            if freed >= target:
+                break
+            evicted.append((key, dim, row))
+            freed += dim * self.dtype.itemsize
+        self._db.executemany("DELETE FROM vectors WHERE key = ?", [(key,) for key, _, _ in evicted])
+        self._db.executemany("INSERT INTO free (dim, row) VALUES (?, ?)", [(dim, row) for _, dim, row in evicted])
+        self._stats["evicted"] += len(evicted)
+
+    def embed(
+            self, model: str, input_type: str, texts: Sequence[str], compute: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """The vectors of `texts`, calling `compute` once, with the distinct texts that aren't cached."""
+        vectors = self.get_many(model, input_type, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            self.put_many(model, input_type, missing, [computed[text] for text in missing])
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def close(self) -> None:
+        with self._lock:
+            for array in self._arrays.values():
+                array.flush()
+            self._arrays.clear()
+            self._db.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a langchain Embeddings object: documents and queries are looked up in the cache first and only
+    the misses reach the wrapped model.
+    """
+
+    def __init__(self, embeddings: Any, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model = model_id(embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embed(self.model, "document", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.embed(self.model, "query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+def embed_haystack_documents(embedder: Any, documents: List[Any], cache: Optional[EmbeddingCache] = None) -> List[Any]:
+    """
+    Set the `embedding` of haystack documents with a (warmed up) SentenceTransformersDocumentEmbedder, or
+    any document embedder with the same `run(documents=...)`; only the cache misses reach `embedder`.
+    The cached text is what the embedder embeds: the `meta_fields_to_embed` and the content, with the
+    prefix, suffix and separator in the model id.
+    """
+    cache = cache or EmbeddingCache()
+    fields = getattr(embedder, "meta_fields_to_embed", None) or []
+    separator = getattr(embedder, "embedding_separator", "\n")
+    model = "/".join([model_id(embedder), repr(getattr(embedder, "prefix", "")), repr(getattr(embedder, "suffix", "")), repr(separator)])
+    texts = [
+        separator.join([str(doc.meta[field]) for field in fields if doc.meta.get(field) is not None] + [doc.content or ""])
+        for doc in documents
+    ]
+    by_text = {}
+    for text, doc in zip(texts, documents):
+        by_text.setdefault(text, doc)
+
+    def compute(missing: List[str]) -> List[List[float]]:
+        embedded = embedder.run(documents=[by_text[text] for text in missing])["documents"]
+        return [list(doc.embedding) for doc in embedded]
+
+    for doc, vector in zip(documents, cache.embed(model, "document", texts, compute)):
+        doc.embedding = vector
+    return documents